@@ -2,7 +2,7 @@ import os
 from pathlib import Path
 from pydantic import HttpUrl, Field
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Optional, List, Dict, Any
 
 
 class Settings(BaseSettings):
@@ -13,6 +13,135 @@ class Settings(BaseSettings):
   MILVUS_URL: str
   MISTRAL_API_KEY: str
   OPENAI_API_KEY: str
+  # Bulk import (object storage usada pelo Milvus; sem bucket, usa insert em lotes grandes + flush)
+  MILVUS_BULK_BUCKET: Optional[str] = Field(default=None)
+  MILVUS_BULK_MINIO_ENDPOINT: str = Field(default="localhost:9000")
+  MILVUS_BULK_MINIO_ACCESS_KEY: str = Field(default="minioadmin")
+  MILVUS_BULK_MINIO_SECRET_KEY: str = Field(default="minioadmin")
+  MILVUS_BULK_MINIO_SECURE: bool = Field(default=False)
+  MILVUS_BULK_ROWS_PER_FILE: int = Field(default=100000)
+  MILVUS_BULK_INSERT_BATCH: int = Field(default=2000)
+  # Chunking: "structured" (tokens, páginas em sequência, headings e tabelas do markdown)
+  # ou "legacy" (split_text por página, em caracteres)
+  INGEST_CHUNKER: str = Field(default="structured")
+  INGEST_CHUNK_TOKENS: int = Field(default=256)
+  INGEST_CHUNK_OVERLAP_TOKENS: int = Field(default=48)
+  # Quase-duplicatas na ingestão (MinHash LSH sobre shingles de palavras): cabeçalhos, rodapés e avisos
+  # repetidos viram um único chunk, que registra arquivo/página das outras ocorrências
+  INGEST_DEDUP_ENABLED: bool = Field(default=True)
+  INGEST_DEDUP_THRESHOLD: float = Field(default=0.9)  # Jaccard estimado
+  INGEST_DEDUP_NUM_PERM: int = Field(default=128)
+  INGEST_DEDUP_SHINGLE_SIZE: int = Field(default=3)
+  INGEST_DEDUP_MAX_OCCURRENCES: int = Field(default=200)
+  # Extração da camada de texto de PDFs: faixas de páginas em paralelo (None = número de CPUs)
+  INGEST_PDF_WORKERS: Optional[int] = Field(default=None)
+  INGEST_PDF_PAGES_PER_TASK: int = Field(default=50)
+  # Jobs de ingestão: store SQLite (fila, status e checkpoints por arquivo), artefatos para retomar
+  # e intervalo do SSE de progresso
+  INGEST_JOBS_DB_PATH: str = Field(default="/tmp/ingestion_jobs.db")
+  INGEST_JOBS_DIR: str = Field(default="/tmp/ingestion_jobs")
+  INGEST_JOBS_EVENTS_INTERVAL: float = Field(default=1.0)
+  # Workers (python -m app.worker): espera entre consultas à fila vazia, lease de um job em execução
+  # (vencido, outro worker retoma o job) e intervalo de renovação do lease
+  INGEST_WORKER_POLL_INTERVAL: float = Field(default=1.0)
+  INGEST_WORKER_LEASE_SECONDS: float = Field(default=120)
+  INGEST_WORKER_HEARTBEAT_INTERVAL: float = Field(default=15)
+  # Jobs de ingestão na fila acima dos quais o POST /milvus/insert responde 429 (e o Retry-After, em s)
+  INGEST_MAX_QUEUED_JOBS: int = Field(default=100)
+  INGEST_QUEUE_RETRY_AFTER: int = Field(default=30)
+  # Admissão por rota: até `limit` requisições em andamento, `queue` esperando por até `timeout` s;
+  # acima disso, 429 com Retry-After
+  ADMISSION_LIMITS: Dict[str, Dict[str, float]] = Field(default_factory=lambda: {
+    "/chat/ask": {"limit": 32, "queue": 64, "timeout": 10},
+    "/milvus/insert": {"limit": 4, "queue": 16, "timeout": 5},
+    "/download_files": {"limit": 4, "queue": 16, "timeout": 5},
+    "/scraping": {"limit": 4, "queue": 8, "timeout": 30},
+  })
+  # Chamadas simultâneas à OpenAI por processo; ingestão e OCR não usam as vagas reservadas ao chat
+  OPENAI_MAX_CONCURRENCY: int = Field(default=16)
+  OPENAI_INTERACTIVE_RESERVED: int = Field(default=4)
+  MISTRAL_MAX_CONCURRENCY: int = Field(default=4)
+  # Gateway dos provedores: URLs alternativas (ex.: servidor falso local), pool de conexões e timeout
+  OPENAI_BASE_URL: Optional[str] = Field(default=None)
+  MISTRAL_SERVER_URL: Optional[str] = Field(default=None)
+  PROVIDER_MAX_CONNECTIONS: int = Field(default=32)
+  PROVIDER_TIMEOUT: float = Field(default=120)
+  # Limites por modelo (requisições e tokens por minuto); a fração PROVIDER_BATCH_RESERVE de cada
+  # bucket só é consumida pelo chat
+  PROVIDER_RATE_LIMITS: Dict[str, Dict[str, float]] = Field(default_factory=lambda: {
+    "text-embedding-3-large": {"rpm": 3000, "tpm": 1000000},
+    "gpt-4.1-mini-2025-04-14": {"rpm": 500, "tpm": 200000},
+    "gpt-4o-mini-2024-07-18": {"rpm": 500, "tpm": 200000},
+    "mistral-ocr-latest": {"rpm": 60},
+  })
+  PROVIDER_BATCH_RESERVE: float = Field(default=0.2)
+  # Retry central (429, 5xx, timeout, conexão): tentativas extras e backoff exponencial com jitter (s)
+  PROVIDER_MAX_RETRIES: int = Field(default=4)
+  PROVIDER_BACKOFF_BASE: float = Field(default=0.5)
+  PROVIDER_BACKOFF_MAX: float = Field(default=30)
+  # Circuit breaker por provedor/modelo: abre com `ERROR_RATE` de falhas (5xx, timeout, conexão) em pelo
+  # menos `MIN_CALLS` chamadas dos últimos `WINDOW` s e recusa chamadas por `OPEN_SECONDS`
+  PROVIDER_BREAKER_WINDOW: float = Field(default=30)
+  PROVIDER_BREAKER_MIN_CALLS: int = Field(default=10)
+  PROVIDER_BREAKER_ERROR_RATE: float = Field(default=0.5)
+  PROVIDER_BREAKER_OPEN_SECONDS: float = Field(default=30)
+  # Hedge: segunda requisição depois do quantil das latências recentes do modelo (limitado a
+  # [MIN_DELAY, MAX_DELAY]; DEFAULT_DELAY enquanto há menos de MIN_SAMPLES amostras)
+  PROVIDER_HEDGE_QUANTILE: float = Field(default=0.95)
+  PROVIDER_HEDGE_MIN_SAMPLES: int = Field(default=20)
+  PROVIDER_HEDGE_DEFAULT_DELAY: float = Field(default=0.5)
+  PROVIDER_HEDGE_MIN_DELAY: float = Field(default=0.05)
+  PROVIDER_HEDGE_MAX_DELAY: float = Field(default=2.0)
+  # Residência de coleções: orçamento de memória dos query nodes e coleções sempre carregadas
+  MILVUS_LOAD_BUDGET_MB: float = Field(default=4096)
+  MILVUS_ROW_SIZE_BYTES: int = Field(default=14336)
+  MILVUS_PINNED_COLLECTIONS: List[str] = Field(default_factory=list)
+  # Layout de armazenamento: "collection" (uma coleção por pasta) ou "partitioned"
+  # (uma coleção compartilhada por perfil de vetor, com partition key por empresa/grupo/pasta)
+  MILVUS_STORAGE_LAYOUT: str = Field(default="collection")
+  MILVUS_SHARED_COLLECTION: str = Field(default="documents_text_embedding_3_large")
+  MILVUS_PARTITION_KEY_PARTITIONS: int = Field(default=64)
+  MILVUS_TENANT_REGISTRY_PATH: str = Field(default="/tmp/milvus_tenants.json")
+  # Busca full-text (campo esparso BM25 gerado pelo Milvus, requer Milvus 2.5+; ignorado no Milvus Lite)
+  MILVUS_FULL_TEXT_SEARCH: bool = Field(default=True)
+  # Campos com mmap na criação da coleção (ex.: ["text", "vector"]): ficam em disco, paginados
+  # pelo SO, e a coleção carregada ocupa menos memória (reduza MILVUS_ROW_SIZE_BYTES de acordo)
+  MILVUS_MMAP_FIELDS: List[str] = Field(default_factory=list)
+  # Recuperação do chat: "dense" (só vetor) ou "hybrid" (vetor + BM25, fundidos no servidor)
+  CHAT_RETRIEVAL_MODE: str = Field(default="hybrid")
+  CHAT_HYBRID_RANKER: str = Field(default="rrf")  # "rrf" ou "weighted"
+  CHAT_HYBRID_RRF_K: int = Field(default=60)
+  CHAT_HYBRID_WEIGHTS: List[float] = Field(default_factory=lambda: [0.7, 0.3])  # [denso, BM25]
+  CHAT_HYBRID_LIMIT: int = Field(default=10)
+  # Busca em duas fases: a busca devolve só id, score, arquivo e página; o `text` é lido
+  # depois (get por id) só para os trechos que passaram no corte
+  CHAT_DEFERRED_TEXT_FETCH: bool = Field(default=True)
+  # Ajustes por coleção, ex.: {"_camara_": {"mode": "dense"}, "_prefeitura_": {"ranker": "weighted"}}
+  CHAT_RETRIEVAL_OVERRIDES: Dict[str, Dict[str, Any]] = Field(default_factory=dict)
+  # Busca em várias coleções na mesma pergunta: prazo (s) por coleção, trechos no ranking global e limite de coleções
+  CHAT_FEDERATED_DEADLINE: float = Field(default=2.0)
+  CHAT_FEDERATED_LIMIT: int = Field(default=12)
+  CHAT_FEDERATED_MAX_COLLECTIONS: int = Field(default=10)
+  # Montagem do contexto do prompt: orçamento de tokens e limiar de quase-duplicatas
+  CHAT_CONTEXT_TOKEN_BUDGET: int = Field(default=3000)
+  CHAT_CONTEXT_DEDUP_THRESHOLD: float = Field(default=0.9)
+  # Histórico do chat: orçamento de tokens, trocas mantidas literais e resumo das anteriores
+  CHAT_HISTORY_TOKEN_BUDGET: int = Field(default=2000)
+  CHAT_HISTORY_KEEP_TURNS: int = Field(default=3)
+  CHAT_HISTORY_SUMMARY_MAX_TOKENS: int = Field(default=300)
+  CHAT_HISTORY_SUMMARY_MODEL: str = Field(default="gpt-4.1-mini-2025-04-14")
+  # Conversas guardadas no servidor (por conversation_id) e resumos em cache
+  CHAT_CONVERSATION_MAX: int = Field(default=1000)
+  CHAT_CONVERSATION_TTL: float = Field(default=86400)
+  # Cache das embeddings das perguntas do chat
+  CHAT_EMBEDDING_CACHE_SIZE: int = Field(default=1024)
+  CHAT_EMBEDDING_CACHE_TTL: float = Field(default=3600)
+  # Hedge da embedding da pergunta (segunda requisição depois do p95 recente; ver PROVIDER_HEDGE_*)
+  CHAT_EMBEDDING_HEDGE: bool = Field(default=True)
+  # Cache semântico de respostas (por coleção)
+  CHAT_ANSWER_CACHE_THRESHOLD: float = Field(default=0.95)
+  CHAT_ANSWER_CACHE_SIZE: int = Field(default=256)
+  CHAT_ANSWER_CACHE_TTL: float = Field(default=86400)
   class Config:
       env_file = Path(__file__).resolve().parent.parent.parent / ".env"
       env_file_encoding = 'utf-8'
@@ -0,0 +1,312 @@
+"""
+Controle de admissão da API e orçamento de chamadas à OpenAI.
+
+- RouteLimiter: requisições simultâneas por rota, com fila de espera limitada e prazo;
+  com a fila cheia (ou o prazo vencido) responde 429 na hora, com Retry-After.
+- AdmissionMiddleware: aplica os limitadores de ADMISSION_LIMITS por caminho e segura a
+  vaga até o fim da resposta, inclusive do streaming do /chat/ask.
+- OutboundBudget: chamadas simultâneas à OpenAI no processo, com o chat (INTERACTIVE) na
+  frente da ingestão e do OCR (BATCH), que também não usam as vagas reservadas ao chat.
+"""
+import math
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from enum import IntEnum
+from typing import Any, Dict, List, Optional
+from fastapi.responses import JSONResponse
+from app.core.logging import logging
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, route: str, reason: str, retry_after: int):
+        super().__init__(f"{route}: {reason}")
+        self.route = route
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def too_many_requests(retry_after: int, reason: str) -> JSONResponse:
+    return JSONResponse(
+        content={
+            "status": "error",
+            "message": "Servidor ocupado, tente novamente em instantes.",
+            "reason": reason,
+        },
+        status_code=429,
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+class RouteLimiter:
+    """
+    Até `limit` requisições da rota em andamento; as seguintes esperam numa fila de
+    até `queue` posições por no máximo `timeout` segundos. O Retry-After é o tempo
+    estimado para a fila andar, pela média móvel da duração das requisições.
+    """
+
+    def __init__(self, route: str, limit: int, queue: int, timeout: float):
+        self.route = route
+        self.limit = max(1, int(limit))
+        self.queue = max(0, int(queue))
+        self.timeout = float(timeout)
+        self._semaphore = asyncio.Semaphore(self.limit)
+        self._service_seconds: Optional[float] = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected: Counter = Counter()
+
+    def retry_after(self) -> int:
+        service = self._service_seconds or 1.0
+        return max(1, math.ceil(service * (self.waiting + 1) / self.limit))
+
+    def reject(self, reason: str) -> AdmissionRejected:
+        self.rejected[reason] += 1
+        logger.warning(f"Requisição rejeitada em {self.route} ({reason}): {self.in_flight} em andamento, {self.waiting} na fila")
+        return AdmissionRejected(self.route, reason, self.retry_after())
+
+    @asynccontextmanager
+    async def slot(self):
+        # contadores próprios: o semáforo só é decrementado quando o acquire roda
+        if self.in_flight + self.waiting >= self.limit + self.queue:
+            raise self.reject("queue_full")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise self.reject("timeout") from None
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        self.admitted += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+            elapsed = time.perf_counter() - started
+            self._service_seconds = elapsed if self._service_seconds is None else 0.8 * self._service_seconds + 0.2 * elapsed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "queue": self.queue,
+            "timeout": self.timeout,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "avg_seconds": round(self._service_seconds, 3) if self._service_seconds is not None else None,
+        }
+
+
+class AdmissionController:
+    """Limitadores por rota (ADMISSION_LIMITS) e rejeições feitas pelas próprias rotas (ex.: fila de jobs cheia)."""
+
+    def __init__(self, limits: Dict[str, Dict[str, float]]):
+        self.limiters = {route: RouteLimiter(route, **config) for route, config in limits.items()}
+        self.backlog_rejected: Counter = Counter()
+
+    def match(self, path: str) -> Optional[RouteLimiter]:
+        for route, limiter in self.limiters.items():
+            if path == route or path.startswith(route.rstrip("/") + "/"):
+                return limiter
+        return None
+
+    def reject_backlog(self, route: str) -> None:
+        self.backlog_rejected[route] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "routes": {route: limiter.stats() for route, limiter in self.limiters.items()},
+            "backlog_rejected": dict(self.backlog_rejected),
+        }
+
+
+class AdmissionMiddleware:
+    """Middleware ASGI: segura uma vaga do limitador da rota durante toda a resposta."""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        limiter = None
+        if scope["type"] == "http" and scope["method"] != "OPTIONS":
+            limiter = self.controller.match(scope["path"])
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            async with limiter.slot():
+                await self.app(scope, receive, send)
+        except AdmissionRejected as e:
+            await too_many_requests(e.retry_after, e.reason)(scope, receive, send)
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # chat: embeddings das perguntas, respostas e resumo do histórico
+    BATCH = 1  # ingestão e OCR
+
+
+class _Grant:
+    __slots__ = ("notify", "granted", "cancelled")
+
+    def __init__(self, notify):
+        self.notify = notify
+        self.granted = False
+        self.cancelled = False
+
+
+class OutboundBudget:
+    """
+    Semáforo com prioridade para as chamadas à OpenAI, usado tanto de código async
+    (chat) quanto de threads (embeddings da ingestão, OCR). As vagas livres vão
+    primeiro para quem espera com prioridade INTERACTIVE, e BATCH só ocupa até
+    `limit - reserved_interactive` vagas, então uma rajada de ingestão não toma o
+    orçamento do chat. O orçamento é por processo: a ingestão roda nos workers,
+    onde o limite de BATCH é o que vale.
+    """
+
+    def __init__(self, limit: int, reserved_interactive: int):
+        self.limit = max(1, limit)
+        self.batch_limit = max(1, self.limit - reserved_interactive)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._waiters: List = []
+        self._sequence = itertools.count()
+        self._stats = {
+            priority: {"acquired": 0, "waiting": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+            for priority in Priority
+        }
+
+    def _capacity(self, priority: Priority) -> int:
+        return self.limit if priority == Priority.INTERACTIVE else self.batch_limit
+
+    def _try_take(self, priority: Priority) -> bool:
+        # só entra direto se ninguém de prioridade igual ou maior estiver esperando
+        if self._waiters and self._waiters[0][0] <= priority:
+            return False
+        if self._in_use >= self._capacity(priority):
+            return False
+        self._in_use += 1
+        return True
+
+    def _dispatch(self) -> None:
+        while self._waiters:
+            priority, _, grant = self._waiters[0]
+            if grant.cancelled:
+                heapq.heappop(self._waiters)
+                continue
+            if self._in_use >= self._capacity(priority):
+                break
+            heapq.heappop(self._waiters)
+            self._in_use += 1
+            grant.granted = True
+            grant.notify()
+
+    def _enqueue(self, priority: Priority, notify) -> _Grant:
+        grant = _Grant(notify)
+        heapq.heappush(self._waiters, (priority, next(self._sequence), grant))
+        self._stats[priority]["waiting"] += 1
+        return grant
+
+    def _record(self, priority: Priority, started: float, waited: bool) -> None:
+        elapsed = time.perf_counter() - started
+        stats = self._stats[priority]
+        stats["acquired"] += 1
+        if waited:
+            stats["waiting"] -= 1
+        stats["wait_seconds"] += elapsed
+        stats["max_wait_seconds"] = max(stats["max_wait_seconds"], elapsed)
+
+    def release(self) -> None:
+        with self._lock:
+            self._in_use -= 1
+            self._dispatch()
+
+    def acquire(self, priority: Priority) -> None:
+        started = time.perf_counter()
+        with self._lock:
+            if self._try_take(priority):
+                self._record(priority, started, waited=False)
+                return
+            event = threading.Event()
+            self._enqueue(priority, event.set)
+        event.wait()
+        with self._lock:
+            self._record(priority, started, waited=True)
+
+    async def acquire_async(self, priority: Priority) -> None:
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        with self._lock:
+            if self._try_take(priority):
+                self._record(priority, started, waited=False)
+                return
+            grant = self._enqueue(priority, notify)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = grant.granted
+                grant.cancelled = True
+                self._stats[priority]["waiting"] -= 1
+            if granted:
+                # a vaga chegou junto com o cancelamento: devolve
+                self.release()
+            raise
+        with self._lock:
+            self._record(priority, started, waited=True)
+
+    @contextmanager
+    def slot(self, priority: Priority):
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self, priority: Priority):
+        await self.acquire_async(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "batch_limit": self.batch_limit,
+                "in_use": self._in_use,
+                **{
+                    priority.name.lower(): {
+                        "acquired": stats["acquired"],
+                        "waiting": stats["waiting"],
+                        "avg_wait_ms": round(stats["wait_seconds"] / stats["acquired"] * 1000, 2) if stats["acquired"] else None,
+                        "max_wait_ms": round(stats["max_wait_seconds"] * 1000, 2),
+                    }
+                    for priority, stats in self._stats.items()
+                },
+            }
+
+
+admission = AdmissionController(settings.ADMISSION_LIMITS)
+openai_budget = OutboundBudget(settings.OPENAI_MAX_CONCURRENCY, settings.OPENAI_INTERACTIVE_RESERVED)
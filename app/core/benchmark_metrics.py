@@ -0,0 +1,98 @@
+"""
+Mede o custo da instrumentação Prometheus (app.core.metrics): tempo de um bloco
+`timed(...)` (histograma com rótulos) e de um contador com rótulos, comparados a um
+bloco vazio, no modo de um processo e no multiprocesso (PROMETHEUS_MULTIPROC_DIR,
+valores em arquivos mmap), e o tempo de gerar a resposta do /metrics. Exemplo:
+
+    python -m app.core.benchmark_metrics --iterations 200000
+
+Uma resposta do chat registra umas 6 observações (recuperação, embedding, busca,
+get dos textos, primeiro token e total) e um arquivo ingerido algumas dezenas; o
+custo por requisição é essa contagem vezes o custo de uma observação.
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+import multiprocessing
+from contextlib import nullcontext
+from typing import Any, Dict
+
+# observações de uma resposta do chat (ver o docstring)
+CHAT_OBSERVATIONS = 6
+
+
+def _per_call_ns(run, iterations: int) -> float:
+    started = time.perf_counter()
+    run(iterations)
+    return (time.perf_counter() - started) / iterations * 1e9
+
+
+def measure(iterations: int) -> Dict[str, Any]:
+    # importado aqui: no modo multiprocesso a variável de ambiente precisa valer antes do import
+    from prometheus_client import CollectorRegistry, Counter, Histogram
+    from app.core.metrics import LATENCY_BUCKETS, render_metrics, timed
+
+    registry = CollectorRegistry()
+    histogram = Histogram("benchmark_seconds", "Benchmark", ["stage", "outcome"], buckets=LATENCY_BUCKETS, registry=registry)
+    counter = Counter("benchmark_total", "Benchmark", ["stage"], registry=registry)
+
+    def bare(n):
+        for _ in range(n):
+            with nullcontext():
+                time.perf_counter()
+
+    def observed(n):
+        for _ in range(n):
+            with timed(histogram, stage="search"):
+                pass
+
+    def counted(n):
+        for _ in range(n):
+            counter.labels("search").inc()
+
+    bare(1000), observed(1000), counted(1000)
+    baseline = _per_call_ns(bare, iterations)
+    histogram_ns = _per_call_ns(observed, iterations) - baseline
+    counter_ns = _per_call_ns(counted, iterations)
+
+    # resposta do /metrics com as métricas da aplicação (no multiprocesso, lendo os arquivos)
+    started = time.perf_counter()
+    for _ in range(100):
+        render_metrics()
+    render_ms = (time.perf_counter() - started) / 100 * 1000
+
+    return {
+        "timed_histogram_ns": round(histogram_ns, 1),
+        "labeled_counter_ns": round(counter_ns, 1),
+        "chat_request_overhead_us": round(CHAT_OBSERVATIONS * histogram_ns / 1000, 2),
+        "render_ms": round(render_ms, 3),
+    }
+
+
+def _measure_multiprocess(directory: str, iterations: int, queue) -> None:
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = directory
+    queue.put(measure(iterations))
+
+
+def benchmark(iterations: int) -> Dict[str, Any]:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    with tempfile.TemporaryDirectory() as directory:
+        process = context.Process(target=_measure_multiprocess, args=(directory, iterations, queue))
+        process.start()
+        multiprocess = queue.get()
+        process.join()
+    return {"iterations": iterations, "single_process": measure(iterations), "multiprocess": multiprocess}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Custo das métricas Prometheus por observação.")
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+    print(json.dumps(benchmark(args.iterations), indent=2))
+
+
+if __name__ == "__main__":
+    main()
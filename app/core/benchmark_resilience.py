@@ -0,0 +1,181 @@
+"""
+Mede o hedge das embeddings das perguntas e o circuit breaker do gateway contra o
+servidor falso (app.core.fake_provider), rodando no mesmo processo:
+
+- cauda lenta: uma fração das requisições demora `--slow-latency`; compara p50/p95/p99
+  das embeddings sem e com hedge e quantas requisições extras o hedge custou;
+- queda do provedor: o servidor passa a responder 500 em todas as requisições; mostra
+  as chamadas falhando (com retry) até o circuito abrir, depois falhando na hora sem
+  chegar ao provedor, e a volta quando o servidor se recupera. Exemplo:
+
+    python -m app.core.benchmark_resilience --queries 500 --slow-rate 0.03 --slow-latency 1.0
+
+O esperado é o p99 com hedge perto do atraso do hedge (p95 recente) em vez da
+latência da cauda, com poucos por cento de requisições extras. Com `--slow-rate` de
+5% ou mais o próprio p95 cai na cauda e o hedge quase não dispara.
+"""
+import json
+import time
+import asyncio
+import argparse
+import threading
+import statistics
+from typing import Any, Dict, List
+import uvicorn
+from app.core.logging import configure_logging
+from app.core.admission import Priority
+from app.core.fake_provider import FakeProvider
+from app.core.providers import OPENAI, CircuitOpenError, ProviderGateway
+from app.config.settings import settings
+from app.modules.milvus.utils.embbeding import EMBEDDING_MODEL
+
+
+def _start_server(provider: FakeProvider, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(provider.create_app(), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def _quantiles(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    quantiles = statistics.quantiles(ordered, n=100) if len(ordered) > 1 else ordered * 99
+    return {
+        "p50_ms": round(quantiles[49] * 1000, 1),
+        "p95_ms": round(quantiles[94] * 1000, 1),
+        "p99_ms": round(quantiles[98] * 1000, 1),
+        "max_ms": round(ordered[-1] * 1000, 1),
+    }
+
+
+async def _embed(gateway: ProviderGateway, text: str, hedge: bool) -> float:
+    started = time.perf_counter()
+    # vetores curtos: o servidor falso roda neste processo e a serialização de 3072
+    # dimensões pesaria mais que a latência simulada
+    await gateway.embed_async([text], EMBEDDING_MODEL, Priority.INTERACTIVE, hedge=hedge, dimensions=64)
+    return time.perf_counter() - started
+
+
+async def _tail(provider: FakeProvider, queries: int, concurrency: int, hedge: bool) -> Dict[str, Any]:
+    gateway = ProviderGateway()
+    before = provider.requests["embeddings"]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index: int) -> float:
+        async with semaphore:
+            return await _embed(gateway, f"pergunta {index} sobre o edital", hedge)
+
+    latencies = await asyncio.gather(*(one(index) for index in range(queries)))
+    usage = gateway.stats()["usage"][f"{OPENAI}/{EMBEDDING_MODEL}/interactive"]
+    upstream = provider.requests["embeddings"] - before
+    return {
+        **_quantiles(latencies),
+        "hedge_delay_ms": round(gateway.hedge_delay(OPENAI, EMBEDDING_MODEL) * 1000, 1) if hedge else None,
+        "hedged": usage["hedged"],
+        "hedge_wins": usage["hedge_wins"],
+        "upstream_requests": upstream,
+        "extra_requests_pct": round((upstream - queries) / queries * 100, 1),
+    }
+
+
+async def _outage(provider: FakeProvider, seconds: float, open_seconds: float) -> Dict[str, Any]:
+    gateway = ProviderGateway()
+    breaker = gateway.breaker(OPENAI, EMBEDDING_MODEL)
+    # aquece o modelo com o provedor no ar
+    for index in range(5):
+        await _embed(gateway, f"aquecimento {index}", hedge=False)
+
+    provider.error_rate = 1.0
+    before = provider.requests["embeddings"]
+    outcomes: Dict[str, List[float]] = {"error": [], "short_circuited": []}
+    started = time.perf_counter()
+    opened_after = None
+    index = 0
+    while time.perf_counter() - started < seconds:
+        call_started = time.perf_counter()
+        try:
+            await _embed(gateway, f"queda {index}", hedge=False)
+        except CircuitOpenError:
+            outcomes["short_circuited"].append(time.perf_counter() - call_started)
+        except Exception:
+            outcomes["error"].append(time.perf_counter() - call_started)
+        if opened_after is None and breaker.state != breaker.CLOSED:
+            opened_after = time.perf_counter() - started
+        index += 1
+        await asyncio.sleep(0.005)
+    upstream = provider.requests["embeddings"] - before
+
+    # o provedor volta; o circuito só aceita a chamada de teste depois de `open_seconds`
+    provider.error_rate = 0.0
+    recovering = time.perf_counter()
+    while True:
+        try:
+            await _embed(gateway, "recuperação", hedge=False)
+            break
+        except CircuitOpenError as e:
+            await asyncio.sleep(min(max(e.retry_after, 0.05), 0.5))
+    recovered_after = time.perf_counter() - recovering
+
+    def mean_ms(values: List[float]):
+        return round(statistics.mean(values) * 1000, 2) if values else None
+
+    return {
+        "calls": index,
+        "failed_upstream": len(outcomes["error"]),
+        "failed_upstream_avg_ms": mean_ms(outcomes["error"]),
+        "short_circuited": len(outcomes["short_circuited"]),
+        "short_circuited_avg_ms": mean_ms(outcomes["short_circuited"]),
+        "upstream_requests": upstream,
+        "opened_after_s": round(opened_after, 2) if opened_after is not None else None,
+        "open_seconds": open_seconds,
+        "recovered_after_s": round(recovered_after, 2),
+        "circuit": breaker.stats(),
+    }
+
+
+def benchmark(args) -> Dict[str, Any]:
+    settings.OPENAI_BASE_URL = f"http://127.0.0.1:{args.port}/v1"
+    settings.PROVIDER_MAX_RETRIES = args.max_retries
+    settings.PROVIDER_BACKOFF_BASE = args.backoff
+    settings.PROVIDER_BREAKER_OPEN_SECONDS = args.open_seconds
+    provider = FakeProvider(args.latency, slow_rate=args.slow_rate, slow_latency=args.slow_latency)
+    server = _start_server(provider, args.port)
+    try:
+        tail = {
+            mode: asyncio.run(_tail(provider, args.queries, args.concurrency, hedge=mode == "hedged"))
+            for mode in ("plain", "hedged")
+        }
+        provider.slow_rate = 0.0
+        outage = asyncio.run(_outage(provider, args.outage_seconds, args.open_seconds))
+    finally:
+        server.should_exit = True
+    return {
+        "latency_ms": args.latency * 1000,
+        "slow_rate": args.slow_rate,
+        "slow_latency_ms": args.slow_latency * 1000,
+        "queries": args.queries,
+        "tail": tail,
+        "outage": outage,
+    }
+
+
+def main():
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Hedge das embeddings e circuit breaker contra o servidor falso com falhas injetadas.")
+    parser.add_argument("--port", type=int, default=8098)
+    parser.add_argument("--queries", type=int, default=500, help="Embeddings de perguntas por modo")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.02, help="Latência normal do provedor (s)")
+    parser.add_argument("--slow-rate", type=float, default=0.03, help="Fração das requisições na cauda lenta")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="Latência da cauda lenta (s)")
+    parser.add_argument("--outage-seconds", type=float, default=2.0, help="Duração da queda simulada")
+    parser.add_argument("--open-seconds", type=float, default=3.0, help="PROVIDER_BREAKER_OPEN_SECONDS durante o teste")
+    parser.add_argument("--max-retries", type=int, default=1, help="PROVIDER_MAX_RETRIES durante o teste")
+    parser.add_argument("--backoff", type=float, default=0.05, help="PROVIDER_BACKOFF_BASE durante o teste")
+    args = parser.parse_args()
+    print(json.dumps(benchmark(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
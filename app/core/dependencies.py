@@ -1,12 +1,14 @@
 from fastapi import Depends
-from pymilvus import MilvusClient
-from app.config.settings import settings
+from pymilvus import MilvusClient, AsyncMilvusClient
+from app.core.milvus_connection import milvus_manager
 
 def get_milvus_client() -> MilvusClient:
     """
-    Cria (ou recupera) a instância de MilvusClient,
-    apontando para a URL configurada em settings.MILVUS_URL.
+    Recupera a instância compartilhada de MilvusClient,
+    aberta no lifespan da aplicação e apontando para settings.MILVUS_URL.
     """
-    # settings.MILVUS_URL pode ser algo como "tcp://localhost:19530"
-    client = MilvusClient(uri=settings.MILVUS_URL)
-    return client
\ No newline at end of file
+    return milvus_manager.client
+
+def get_async_milvus_client() -> AsyncMilvusClient:
+    """Recupera a instância compartilhada de AsyncMilvusClient."""
+    return milvus_manager.async_client
@@ -0,0 +1,213 @@
+"""
+Servidor falso da OpenAI e da Mistral para testar o gateway dos provedores sem rede
+nem custo. Implementa o suficiente dos SDKs usados pela aplicação:
+
+- OpenAI: POST /v1/embeddings e POST /v1/chat/completions (com e sem stream);
+- Mistral: POST /v1/files, GET /v1/files/{id}/url e POST /v1/ocr (uma página de
+  markdown por página do PDF enviado).
+
+Latência, limite de requisições por minuto (429 com Retry-After), taxa de erros 500 e
+uma cauda lenta (fração das requisições com latência maior) são configuráveis, e podem
+ser trocados com o servidor no ar por POST /faults (ex.: {"error_rate": 1} simula uma
+queda do provedor e {"error_rate": 0} a volta). Exemplo:
+
+    python -m app.core.fake_provider --port 8099 --latency 0.05 --rpm 600 --error-rate 0.02
+    python -m app.core.fake_provider --port 8099 --latency 0.05 --slow-rate 0.05 --slow-latency 1.5
+    OPENAI_BASE_URL=http://localhost:8099/v1 MISTRAL_SERVER_URL=http://localhost:8099 uvicorn app.main:app
+"""
+import json
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import argparse
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List
+import fitz  # PyMuPDF
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANSWER = "Resposta gerada pelo servidor falso a partir do contexto recebido."
+
+
+class FakeProvider:
+    FAULTS = ("latency", "rpm", "error_rate", "slow_rate", "slow_latency")
+
+    def __init__(self, latency: float = 0.0, rpm: int = 0, error_rate: float = 0.0,
+                 slow_rate: float = 0.0, slow_latency: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.rpm = rpm
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self._random = random.Random(seed)
+        self._window: Deque[float] = deque()
+        self._files: Dict[str, bytes] = {}
+        self.requests: Counter = Counter()
+
+    async def admit(self, route: str):
+        """Resposta de erro (429 ou 500) para esta requisição, ou None para seguir."""
+        self.requests[route] += 1
+        now = time.monotonic()
+        while self._window and now - self._window[0] > 60:
+            self._window.popleft()
+        if self.rpm and len(self._window) >= self.rpm:
+            self.requests["429"] += 1
+            retry_after = max(1, int(60 - (now - self._window[0])) + 1)
+            return JSONResponse({"error": {"message": "Rate limit", "type": "rate_limit"}}, 429, headers={"Retry-After": str(retry_after)})
+        self._window.append(now)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.requests["500"] += 1
+            return JSONResponse({"error": {"message": "Falha injetada", "type": "server_error"}}, 500)
+        latency = self.latency
+        if self.slow_rate and self._random.random() < self.slow_rate:
+            self.requests["slow"] += 1
+            latency = self.slow_latency
+        if latency:
+            await asyncio.sleep(latency)
+        return None
+
+    def faults(self) -> Dict[str, float]:
+        return {name: getattr(self, name) for name in self.FAULTS}
+
+    @staticmethod
+    def vector(text: str, dimensions: int) -> List[float]:
+        seed = int.from_bytes(hashlib.md5(text.encode("utf-8")).digest()[:8], "big")
+        rng = random.Random(seed)
+        values = [rng.uniform(-1, 1) for _ in range(dimensions)]
+        norm = sum(value * value for value in values) ** 0.5
+        return [value / norm for value in values]
+
+    def create_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/v1/embeddings")
+        async def embeddings(request: Request):
+            body = await request.json()
+            error = await self.admit("embeddings")
+            if error is not None:
+                return error
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            dimensions = body.get("dimensions") or 3072
+            tokens = sum(len(text) // 4 + 1 for text in inputs)
+            return {
+                "object": "list",
+                "model": body["model"],
+                "data": [
+                    {"object": "embedding", "index": index, "embedding": self.vector(text, dimensions)}
+                    for index, text in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            }
+
+        @app.post("/v1/chat/completions")
+        async def completions(request: Request):
+            body = await request.json()
+            error = await self.admit("chat")
+            if error is not None:
+                return error
+            prompt_tokens = len(json.dumps(body["messages"], ensure_ascii=False)) // 4
+            words = ANSWER.split(" ")
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words), "total_tokens": prompt_tokens + len(words)}
+            base = {"id": f"chatcmpl-{uuid.uuid4().hex}", "created": int(time.time()), "model": body["model"]}
+            if not body.get("stream"):
+                return {
+                    **base,
+                    "object": "chat.completion",
+                    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": ANSWER}}],
+                    "usage": usage,
+                }
+
+            include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+            async def stream():
+                for index, word in enumerate(words):
+                    content = word if index == 0 else f" {word}"
+                    chunk = {**base, "object": "chat.completion.chunk",
+                             "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}]}
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                    await asyncio.sleep(0)
+                last = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+                yield f"data: {json.dumps(last)}\n\n"
+                if include_usage:
+                    yield f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(stream(), media_type="text/event-stream")
+
+        @app.post("/v1/files")
+        async def upload(request: Request):
+            body = await request.body()
+            error = await self.admit("files")
+            if error is not None:
+                return error
+            # o multipart não é interpretado: o PDF é localizado pelos marcadores dentro do corpo
+            start, end = body.find(b"%PDF"), body.rfind(b"%%EOF")
+            content = body[start:end + 5] if start >= 0 and end >= 0 else b""
+            file_id = uuid.uuid4().hex
+            self._files[file_id] = content
+            return {
+                "id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": f"{file_id}.pdf", "purpose": "ocr", "sample_type": "ocr_input", "source": "upload",
+            }
+
+        @app.get("/v1/files/{file_id}/url")
+        async def signed_url(file_id: str, request: Request):
+            error = await self.admit("files")
+            if error is not None:
+                return error
+            return {"url": f"{request.base_url}fake/{file_id}"}
+
+        @app.post("/v1/ocr")
+        async def ocr(request: Request):
+            body = await request.json()
+            error = await self.admit("ocr")
+            if error is not None:
+                return error
+            file_id = body["document"]["document_url"].rsplit("/", 1)[-1]
+            content = self._files.get(file_id, b"")
+            with fitz.open(stream=content, filetype="pdf") as doc:
+                page_count = doc.page_count
+            return {
+                "model": body["model"],
+                "pages": [
+                    {"index": index, "markdown": f"# Página {index + 1}\n\nTexto reconhecido pelo OCR falso.",
+                     "images": [], "dimensions": {"dpi": 200, "height": 2200, "width": 1700}}
+                    for index in range(page_count)
+                ],
+                "usage_info": {"pages_processed": page_count, "doc_size_bytes": len(content)},
+            }
+
+        @app.get("/stats")
+        async def stats() -> Dict[str, Any]:
+            return dict(self.requests)
+
+        @app.post("/faults")
+        async def set_faults(request: Request) -> Dict[str, float]:
+            body = await request.json()
+            for name in self.FAULTS:
+                if name in body:
+                    setattr(self, name, type(getattr(self, name))(body[name]))
+            return self.faults()
+
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor falso da OpenAI e da Mistral para testes locais.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="Latência de cada resposta (s)")
+    parser.add_argument("--rpm", type=int, default=0, help="Requisições por minuto antes de responder 429 (0 = sem limite)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fração das requisições respondidas com 500")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fração das requisições com a latência da cauda lenta")
+    parser.add_argument("--slow-latency", type=float, default=0.0, help="Latência da cauda lenta (s)")
+    args = parser.parse_args()
+    provider = FakeProvider(args.latency, args.rpm, args.error_rate, args.slow_rate, args.slow_latency)
+    uvicorn.run(provider.create_app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
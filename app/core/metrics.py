@@ -0,0 +1,152 @@
+"""
+Métricas Prometheus de cada etapa do pipeline, expostas em GET /metrics (API) e,
+nos workers, em `python -m app.worker --metrics-port 9100`:
+
+- scraping: GET da página e HEAD de verificação dos links;
+- downloads: bytes, duração e vazão por arquivo (links da ingestão e API de download);
+- extração de texto: segundos e páginas por motor (camada de texto, Mistral, Tesseract,
+  OpenAI, docx, planilhas);
+- embeddings: chamadas (batches), textos, tokens e latência por prioridade;
+- Milvus: latência de inserts e buscas;
+- chat: tempo até o primeiro token, recuperação do contexto e tempo total.
+
+Só contadores e histogramas, para funcionar no modo multiprocesso do prometheus_client:
+com PROMETHEUS_MULTIPROC_DIR definido (o mesmo diretório, vazio na partida, para a API
+e os workers), o /metrics soma os valores de todos os processos da máquina.
+"""
+import os
+import time
+import asyncio
+import functools
+from contextlib import contextmanager
+from typing import Callable
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from app.core.logging import logging
+
+logger = logging.getLogger(__name__)
+
+# chamadas de rede e do Milvus (ms a dezenas de s) e etapas de arquivo inteiro (s a minutos)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+FILE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+THROUGHPUT_BUCKETS = (1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7, 1e8)
+
+SCRAPE_FETCH_SECONDS = Histogram(
+    "scrape_fetch_seconds", "GET da página no scraping", ["outcome"], buckets=LATENCY_BUCKETS
+)
+SCRAPE_VERIFY_SECONDS = Histogram(
+    "scrape_verify_seconds", "HEAD de verificação do Content-Type de um link", ["outcome"], buckets=LATENCY_BUCKETS
+)
+SCRAPE_LINKS = Counter("scrape_links_total", "Links candidatos a download por resultado", ["result"])
+
+DOWNLOAD_SECONDS = Histogram(
+    "download_seconds", "Download de um arquivo", ["source", "outcome"], buckets=FILE_BUCKETS
+)
+DOWNLOAD_BYTES = Counter("download_bytes_total", "Bytes baixados", ["source"])
+DOWNLOAD_THROUGHPUT = Histogram(
+    "download_throughput_bytes_per_second", "Vazão de cada download", ["source"], buckets=THROUGHPUT_BUCKETS
+)
+
+OCR_SECONDS = Histogram(
+    "ocr_seconds", "Extração de texto de um arquivo por motor", ["engine", "outcome"], buckets=FILE_BUCKETS
+)
+OCR_PAGES = Counter("ocr_pages_total", "Páginas extraídas por motor", ["engine"])
+
+EMBEDDING_SECONDS = Histogram(
+    "embedding_seconds", "Chamada de embeddings (fila, retries e hedge incluídos)", ["priority", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+EMBEDDING_BATCHES = Counter("embedding_batches_total", "Chamadas de embeddings", ["priority"])
+EMBEDDING_TEXTS = Counter("embedding_texts_total", "Textos enviados para embeddings", ["priority"])
+EMBEDDING_TOKENS = Counter("embedding_tokens_total", "Tokens enviados para embeddings", ["priority"])
+
+MILVUS_INSERT_SECONDS = Histogram(
+    "milvus_insert_seconds", "Insert de um lote no Milvus", ["mode", "outcome"], buckets=LATENCY_BUCKETS
+)
+MILVUS_INSERT_ROWS = Counter("milvus_insert_rows_total", "Linhas inseridas no Milvus", ["mode"])
+MILVUS_SEARCH_SECONDS = Histogram(
+    "milvus_search_seconds", "Buscas no Milvus (dense, hybrid e get dos textos)", ["kind", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+
+CHAT_RETRIEVAL_SECONDS = Histogram(
+    "chat_retrieval_seconds", "Embedding da pergunta e busca do contexto", ["outcome"], buckets=LATENCY_BUCKETS
+)
+CHAT_TTFT_SECONDS = Histogram(
+    "chat_ttft_seconds", "Tempo até o primeiro token da resposta do chat", buckets=LATENCY_BUCKETS
+)
+CHAT_TOTAL_SECONDS = Histogram(
+    "chat_total_seconds", "Tempo total de uma resposta do chat", ["outcome"], buckets=LATENCY_BUCKETS
+)
+
+
+def _outcome(error: BaseException) -> str:
+    return "cancelled" if isinstance(error, (asyncio.CancelledError, GeneratorExit)) else "error"
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels):
+    """Observa a duração do bloco em `histogram`, com o rótulo `outcome` (ok, error ou cancelled)."""
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException as e:
+        outcome = _outcome(e)
+        raise
+    finally:
+        histogram.labels(**labels, outcome=outcome).observe(time.perf_counter() - started)
+
+
+def observe_extraction(engine: str) -> Callable:
+    """Decorator dos extratores do OCRService: segundos por arquivo e páginas devolvidas pelo motor."""
+    def decorator(extract: Callable) -> Callable:
+        @functools.wraps(extract)
+        def wrapper(*args, **kwargs):
+            with timed(OCR_SECONDS, engine=engine):
+                pages = extract(*args, **kwargs)
+            OCR_PAGES.labels(engine).inc(len(pages))
+            return pages
+        return wrapper
+    return decorator
+
+
+def observe_embedding(priority: str, texts: int, tokens: int) -> None:
+    EMBEDDING_BATCHES.labels(priority).inc()
+    EMBEDDING_TEXTS.labels(priority).inc(texts)
+    EMBEDDING_TOKENS.labels(priority).inc(tokens)
+
+
+def observe_download(source: str, size: int, seconds: float) -> None:
+    """Bytes e vazão de um download concluído (a duração vai em `timed(DOWNLOAD_SECONDS, ...)`)."""
+    DOWNLOAD_BYTES.labels(source).inc(size)
+    if seconds > 0:
+        DOWNLOAD_THROUGHPUT.labels(source).observe(size / seconds)
+
+
+def _registry() -> CollectorRegistry:
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    # modo multiprocesso: lê os arquivos de todos os processos a cada coleta
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_metrics() -> bytes:
+    """Métricas no formato de texto do Prometheus."""
+    return generate_latest(_registry())
+
+
+def serve_metrics(port: int, addr: str = "0.0.0.0") -> None:
+    """Servidor HTTP das métricas para processos sem a API (workers)."""
+    start_http_server(port, addr, registry=_registry())
+    logger.info(f"Métricas Prometheus em http://{addr}:{port}/metrics")
+
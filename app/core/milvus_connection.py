@@ -0,0 +1,124 @@
+import time
+import asyncio
+import threading
+from typing import Optional, Dict, Any
+from pymilvus import MilvusClient, AsyncMilvusClient, connections
+from app.core.logging import logging
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MilvusConnectionManager:
+    """
+    Mantém as conexões Milvus da aplicação: um MilvusClient síncrono, um
+    AsyncMilvusClient e a conexão ORM "default" (usada por Collection/utility),
+    todos apontando para settings.MILVUS_URL.
+    Aberto/fechado pelo lifespan do FastAPI, com health check periódico e reconexão.
+    """
+
+    def __init__(self, uri: str, health_check_interval: float = 30):
+        self.uri = uri
+        self.health_check_interval = health_check_interval
+        self._client: Optional[MilvusClient] = None
+        self._async_client: Optional[AsyncMilvusClient] = None
+        self._lock = threading.Lock()
+        self._monitor_task: Optional[asyncio.Task] = None
+        self._healthy = False
+        self._last_check: Optional[float] = None
+        self._last_error: Optional[str] = None
+        self._reconnects = 0
+
+    @property
+    def client(self) -> MilvusClient:
+        """Cliente síncrono compartilhado (conecta na primeira chamada)."""
+        if self._client is None:
+            self.connect()
+        return self._client
+
+    @property
+    def async_client(self) -> AsyncMilvusClient:
+        """Cliente assíncrono compartilhado; deve ser usado dentro do event loop da aplicação."""
+        if self._async_client is None:
+            self._async_client = AsyncMilvusClient(uri=self.uri)
+        return self._async_client
+
+    def connect(self) -> None:
+        with self._lock:
+            if self._client is not None:
+                return
+            self._client = MilvusClient(uri=self.uri)
+            connections.connect(alias="default", uri=self.uri)
+            self._healthy = True
+            logger.info("Conectado ao Milvus em %s", self.uri)
+
+    def disconnect(self) -> None:
+        with self._lock:
+            if self._client is not None:
+                try:
+                    self._client.close()
+                except Exception as e:
+                    logger.warning("Erro ao fechar o cliente Milvus: %s", e)
+                self._client = None
+            connections.disconnect("default")
+
+    def reconnect(self) -> None:
+        logger.warning("Reconectando ao Milvus em %s", self.uri)
+        self.disconnect()
+        self.connect()
+        self._reconnects += 1
+
+    def ping(self) -> bool:
+        """Health check barato: lista as coleções usando o cliente compartilhado."""
+        try:
+            self.client.list_collections()
+            self._healthy = True
+            self._last_error = None
+        except Exception as e:
+            self._healthy = False
+            self._last_error = str(e)
+        self._last_check = time.time()
+        return self._healthy
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "healthy": self._healthy,
+            "uri": self.uri,
+            "last_check": self._last_check,
+            "last_error": self._last_error,
+            "reconnects": self._reconnects,
+        }
+
+    async def start(self) -> None:
+        await asyncio.to_thread(self.connect)
+        self._monitor_task = asyncio.create_task(self._monitor())
+
+    async def close(self) -> None:
+        if self._monitor_task:
+            self._monitor_task.cancel()
+            self._monitor_task = None
+        if self._async_client is not None:
+            try:
+                await self._async_client.close()
+            except Exception as e:
+                logger.warning("Erro ao fechar o cliente Milvus assíncrono: %s", e)
+            self._async_client = None
+        await asyncio.to_thread(self.disconnect)
+        logger.info("Conexões Milvus encerradas")
+
+    async def _monitor(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            if await asyncio.to_thread(self.ping):
+                continue
+            logger.error("Health check do Milvus falhou: %s", self._last_error)
+            try:
+                await asyncio.to_thread(self.reconnect)
+                if self._async_client is not None:
+                    old_client, self._async_client = self._async_client, None
+                    await old_client.close()
+            except Exception as e:
+                logger.error("Falha ao reconectar ao Milvus: %s", e)
+
+
+milvus_manager = MilvusConnectionManager(settings.MILVUS_URL)
@@ -0,0 +1,670 @@
+"""
+Gateway único para as chamadas aos provedores (OpenAI e Mistral).
+
+Todas as chamadas de chat, embeddings e OCR passam por aqui:
+
+- um cliente com pool de conexões por provedor (sync e async, na OpenAI), com
+  `OPENAI_BASE_URL` / `MISTRAL_SERVER_URL` para apontar para um servidor falso local
+  (python -m app.core.fake_provider);
+- vagas simultâneas por provedor com prioridade (OutboundBudget: o chat na frente
+  da ingestão e do OCR);
+- token buckets de requisições e de tokens por minuto por modelo
+  (PROVIDER_RATE_LIMITS), com uma reserva que só o tráfego INTERACTIVE consome;
+- retry com backoff exponencial e jitter centralizado (429, 5xx, timeout e erro de
+  conexão), respeitando o Retry-After do provedor; os SDKs não fazem retry próprio;
+- circuit breaker por provedor/modelo: com a taxa de falhas alta, as chamadas falham
+  na hora (CircuitOpenError) e quem chama usa o fallback;
+- requisições "hedged" (embed_async(hedge=True)): se a primeira não responder até o
+  p95 recente do modelo, dispara uma segunda e fica com a que responder antes;
+- métricas de uso por provedor/modelo/prioridade: requisições, erros, retries,
+  chamadas recusadas pelo circuito, hedges, tokens, tempo de fila e latência.
+"""
+import time
+import random
+import asyncio
+import threading
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+import httpx
+import openai
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+from mistralai import Mistral
+from mistralai.models import SDKError
+from app.core.logging import logging
+from app.core.tokens import count_tokens
+from app.core.admission import OutboundBudget, Priority, openai_budget
+from app.core.metrics import EMBEDDING_SECONDS, observe_embedding, timed
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+OPENAI = "openai"
+MISTRAL = "mistral"
+
+# tokens estimados por imagem na entrada (detail=high) e de saída quando max_tokens não é informado
+IMAGE_TOKENS_ESTIMATE = 1000
+COMPLETION_TOKENS_ESTIMATE = 512
+# espera máxima entre duas checagens do token bucket
+BUCKET_POLL_SECONDS = 1.0
+
+
+class TokenBucket:
+    """
+    Balde de `per_minute` unidades, reposto continuamente. Chamadas BATCH só consomem
+    enquanto o balde fica acima de `reserve` (fração da capacidade); o resto é do
+    tráfego INTERACTIVE. Um pedido maior que a capacidade espera o balde encher.
+    """
+
+    def __init__(self, per_minute: float, reserve: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self.reserve = self.capacity * reserve
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self, amount: float, priority: Priority) -> float:
+        """Consome `amount` e devolve 0, ou devolve quantos segundos esperar antes de tentar de novo."""
+        floor = self.reserve if priority == Priority.BATCH else 0.0
+        amount = min(amount, self.capacity - floor)
+        with self._lock:
+            self._refill()
+            if self._level - amount >= floor:
+                self._level -= amount
+                return 0.0
+            return (amount + floor - self._level) / self.rate
+
+    def adjust(self, delta: float) -> None:
+        """Corrige o consumo estimado pelo real (delta > 0 consome mais; < 0 devolve)."""
+        with self._lock:
+            self._refill()
+            self._level = min(self.capacity, self._level - delta)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill()
+            return {"per_minute": self.capacity, "available": round(self._level, 1)}
+
+
+class ModelLimits:
+    """Buckets de requisições (`rpm`) e de tokens (`tpm`) de um modelo; sem configuração, sem limite."""
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None, reserve: float = 0.0):
+        self.requests = TokenBucket(rpm, reserve) if rpm else None
+        self.tokens = TokenBucket(tpm, reserve) if tpm else None
+
+    def try_take(self, tokens: int, priority: Priority) -> float:
+        if self.requests is not None:
+            wait = self.requests.try_take(1, priority)
+            if wait:
+                return wait
+        if self.tokens is not None and tokens:
+            wait = self.tokens.try_take(tokens, priority)
+            if wait:
+                # a requisição não saiu: devolve a vaga do bucket de requisições
+                if self.requests is not None:
+                    self.requests.adjust(-1)
+                return wait
+        return 0.0
+
+    def wait(self, tokens: int, priority: Priority) -> None:
+        while True:
+            delay = self.try_take(tokens, priority)
+            if not delay:
+                return
+            time.sleep(min(delay, BUCKET_POLL_SECONDS))
+
+    async def wait_async(self, tokens: int, priority: Priority) -> None:
+        while True:
+            delay = self.try_take(tokens, priority)
+            if not delay:
+                return
+            await asyncio.sleep(min(delay, BUCKET_POLL_SECONDS))
+
+    def settle(self, estimated: int, actual: Optional[int]) -> None:
+        if self.tokens is not None and actual is not None:
+            self.tokens.adjust(actual - estimated)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests.stats() if self.requests else None,
+            "tokens": self.tokens.stats() if self.tokens else None,
+        }
+
+
+class CircuitOpenError(Exception):
+    """Circuito aberto: a chamada nem foi feita. `retry_after` é quanto falta para a próxima tentativa de teste."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuito aberto para {name}; nova tentativa em {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Fechado, registra o resultado das chamadas dos últimos `window` segundos; com pelo
+    menos `min_calls` chamadas e a fração de falhas em `error_rate` ou mais, abre. Aberto,
+    recusa as chamadas por `open_seconds`; depois deixa passar uma chamada de teste
+    (meio-aberto): sucesso fecha o circuito, falha o reabre.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, window: float, min_calls: int, error_rate: float, open_seconds: float):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self._events: Deque[Tuple[float, bool]] = deque()
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    def retry_after(self) -> float:
+        """Segundos até o circuito aceitar chamadas (0 se já aceita)."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0.0
+            return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def before(self) -> None:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            remaining = self._opened_at + self.open_seconds - time.monotonic()
+            if self.state == self.OPEN and remaining <= 0:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            self.rejected += 1
+            raise CircuitOpenError(self.name, max(remaining, 0.0))
+
+    def _open(self, now: float) -> None:
+        self.state = self.OPEN
+        self._opened_at = now
+        self._events.clear()
+        self.opened += 1
+        logger.warning(f"Circuito aberto para {self.name} por {self.open_seconds:.0f}s")
+
+    def record(self, ok: bool) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+                if ok:
+                    self.state = self.CLOSED
+                    logger.info(f"Circuito fechado para {self.name}")
+                else:
+                    self._open(now)
+                return
+            if self.state == self.OPEN:
+                return
+            self._events.append((now, ok))
+            while self._events and now - self._events[0][0] > self.window:
+                self._events.popleft()
+            failures = sum(1 for _, success in self._events if not success)
+            if len(self._events) >= self.min_calls and failures / len(self._events) >= self.error_rate:
+                self._open(now)
+
+    def cancel(self) -> None:
+        """A chamada foi cancelada sem resultado (ex.: hedge perdedor): libera a vaga de teste."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            failures = sum(1 for _, success in self._events if not success)
+            return {
+                "state": self.state,
+                "calls": len(self._events),
+                "failures": failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+
+class LatencyTracker:
+    """Latências recentes das chamadas bem-sucedidas de um modelo, para o atraso do hedge."""
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def quantile(self, q: float, min_samples: int) -> Optional[float]:
+        samples = sorted(self._samples)
+        if len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class _UsageMetrics:
+    __slots__ = ("requests", "errors", "retries", "rate_limited", "short_circuited", "hedged", "hedge_wins",
+                 "input_tokens", "output_tokens", "queue_seconds", "max_queue_seconds", "latency_seconds")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.short_circuited = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.queue_seconds = 0.0
+        self.max_queue_seconds = 0.0
+        self.latency_seconds = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        calls = self.requests or 1
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "short_circuited": self.short_circuited,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "avg_queue_ms": round(self.queue_seconds / calls * 1000, 2),
+            "max_queue_ms": round(self.max_queue_seconds * 1000, 2),
+            "avg_latency_ms": round(self.latency_seconds / calls * 1000, 2),
+        }
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code
+    if isinstance(error, SDKError):
+        return error.status_code
+    return None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None) or getattr(error, "raw_response", None)
+    if not isinstance(response, httpx.Response):
+        return None
+    value = response.headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.APIConnectionError, httpx.TransportError)):
+        return True
+    status = _status_code(error)
+    return status is not None and (status in (408, 409, 429) or status >= 500)
+
+
+def _is_outage(error: Exception) -> bool:
+    """Falha que conta para o circuit breaker: 5xx, timeout e conexão (429 e erros do pedido, não)."""
+    return is_retryable(error) and _status_code(error) != 429
+
+
+def _message_tokens(messages: List[Dict[str, Any]]) -> int:
+    tokens = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            tokens += count_tokens(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    tokens += count_tokens(part.get("text", ""))
+                else:
+                    tokens += IMAGE_TOKENS_ESTIMATE
+    return tokens
+
+
+def _completion_estimate(kwargs: Dict[str, Any]) -> int:
+    output = kwargs.get("max_tokens") or kwargs.get("max_completion_tokens") or COMPLETION_TOKENS_ESTIMATE
+    return _message_tokens(kwargs.get("messages", [])) + output
+
+
+def _usage(response) -> Tuple[Optional[int], int]:
+    """(tokens de entrada, tokens de saída) informados pelo provedor."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None, 0
+    return getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None) or 0
+
+
+class ProviderGateway:
+    def __init__(self):
+        limits = httpx.Limits(
+            max_connections=settings.PROVIDER_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.PROVIDER_MAX_CONNECTIONS,
+        )
+        timeout = httpx.Timeout(settings.PROVIDER_TIMEOUT, connect=10.0)
+        self.openai = OpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            max_retries=0,
+            timeout=timeout,
+            http_client=DefaultHttpxClient(limits=limits, timeout=timeout),
+        )
+        self.openai_async = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            max_retries=0,
+            timeout=timeout,
+            http_client=DefaultAsyncHttpxClient(limits=limits, timeout=timeout),
+        )
+        self.mistral = Mistral(
+            api_key=settings.MISTRAL_API_KEY,
+            server_url=settings.MISTRAL_SERVER_URL,
+            client=httpx.Client(limits=limits, timeout=timeout, follow_redirects=True),
+            timeout_ms=int(settings.PROVIDER_TIMEOUT * 1000),
+        )
+        self.budgets = {
+            OPENAI: openai_budget,
+            MISTRAL: OutboundBudget(settings.MISTRAL_MAX_CONCURRENCY, 0),
+        }
+        self._limits: Dict[str, ModelLimits] = {}
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self._latency: Dict[str, LatencyTracker] = defaultdict(LatencyTracker)
+        self._metrics: Dict[Tuple[str, str, str], _UsageMetrics] = defaultdict(_UsageMetrics)
+        self._lock = threading.Lock()
+
+    def limits(self, model: str) -> ModelLimits:
+        with self._lock:
+            if model not in self._limits:
+                config = settings.PROVIDER_RATE_LIMITS.get(model, {})
+                self._limits[model] = ModelLimits(config.get("rpm"), config.get("tpm"), settings.PROVIDER_BATCH_RESERVE)
+            return self._limits[model]
+
+    def breaker(self, provider: str, model: str) -> CircuitBreaker:
+        with self._lock:
+            key = (provider, model)
+            if key not in self._breakers:
+                self._breakers[key] = CircuitBreaker(
+                    f"{provider}/{model}",
+                    window=settings.PROVIDER_BREAKER_WINDOW,
+                    min_calls=settings.PROVIDER_BREAKER_MIN_CALLS,
+                    error_rate=settings.PROVIDER_BREAKER_ERROR_RATE,
+                    open_seconds=settings.PROVIDER_BREAKER_OPEN_SECONDS,
+                )
+            return self._breakers[key]
+
+    def circuit_retry_after(self, provider: str, *models: str) -> float:
+        """Maior espera até os circuitos dos modelos aceitarem chamadas (0 se todos aceitam)."""
+        return max((self.breaker(provider, model).retry_after() for model in models), default=0.0)
+
+    def _metric(self, provider: str, model: str, priority: Priority) -> _UsageMetrics:
+        with self._lock:
+            return self._metrics[(provider, model, priority.name.lower())]
+
+    @staticmethod
+    def _backoff(error: Exception, attempt: int) -> Optional[float]:
+        """Espera antes do próximo retry, ou None se o erro não é transitório ou acabaram as tentativas."""
+        if attempt >= settings.PROVIDER_MAX_RETRIES or not is_retryable(error):
+            return None
+        delay = min(settings.PROVIDER_BACKOFF_MAX, settings.PROVIDER_BACKOFF_BASE * 2 ** attempt)
+        delay = random.uniform(delay / 2, delay)
+        retry_after = _retry_after(error)
+        return max(delay, retry_after) if retry_after is not None else delay
+
+    @staticmethod
+    def _before(breaker: CircuitBreaker, metric: _UsageMetrics) -> None:
+        try:
+            breaker.before()
+        except CircuitOpenError:
+            metric.short_circuited += 1
+            raise
+
+    def _on_error(self, metric: _UsageMetrics, breaker: CircuitBreaker, error: Exception, attempt: int) -> Optional[float]:
+        if _status_code(error) == 429:
+            metric.rate_limited += 1
+            # limite de taxa não indica falha do provedor
+            breaker.cancel()
+        else:
+            breaker.record(not _is_outage(error))
+        delay = self._backoff(error, attempt)
+        if delay is None:
+            metric.errors += 1
+            return None
+        metric.retries += 1
+        logger.warning(f"{breaker.name}: {type(error).__name__} ({_status_code(error)}); nova tentativa em {delay:.1f}s")
+        return delay
+
+    def _record(
+        self, metric: _UsageMetrics, breaker: CircuitBreaker, limits: ModelLimits, estimated: int, response,
+        queued: float, started: float, succeeded: bool = True,
+    ) -> None:
+        """Uso e latência da chamada; só `succeeded` conta como sucesso no circuito e nas amostras do hedge."""
+        elapsed = time.perf_counter() - started
+        if succeeded:
+            breaker.record(True)
+            self._latency[breaker.name].add(elapsed)
+        input_tokens, output_tokens = _usage(response)
+        metric.requests += 1
+        metric.queue_seconds += queued
+        metric.max_queue_seconds = max(metric.max_queue_seconds, queued)
+        metric.latency_seconds += elapsed
+        metric.input_tokens += input_tokens or 0
+        metric.output_tokens += output_tokens
+        limits.settle(estimated, input_tokens + output_tokens if input_tokens is not None else None)
+
+    def call(self, provider: str, model: str, priority: Priority, tokens: int, request: Callable[[], T]) -> T:
+        """Executa `request` (sync) sob a vaga do provedor, os buckets e o circuito do modelo e o retry central."""
+        limits = self.limits(model)
+        breaker = self.breaker(provider, model)
+        metric = self._metric(provider, model, priority)
+        enqueued = time.perf_counter()
+        with self.budgets[provider].slot(priority):
+            attempt = 0
+            while True:
+                self._before(breaker, metric)
+                limits.wait(tokens, priority)
+                started = time.perf_counter()
+                try:
+                    response = request()
+                except Exception as e:
+                    delay = self._on_error(metric, breaker, e, attempt)
+                    if delay is None:
+                        raise
+                    attempt += 1
+                    time.sleep(delay)
+                    continue
+                self._record(metric, breaker, limits, tokens, response, started - enqueued, started)
+                return response
+
+    async def call_async(self, provider: str, model: str, priority: Priority, tokens: int, request: Callable[[], Any]) -> Any:
+        """Versão async de `call`: `request` devolve uma coroutine."""
+        limits = self.limits(model)
+        breaker = self.breaker(provider, model)
+        metric = self._metric(provider, model, priority)
+        enqueued = time.perf_counter()
+        async with self.budgets[provider].aslot(priority):
+            attempt = 0
+            while True:
+                self._before(breaker, metric)
+                await limits.wait_async(tokens, priority)
+                started = time.perf_counter()
+                try:
+                    response = await request()
+                except asyncio.CancelledError:
+                    breaker.cancel()
+                    raise
+                except Exception as e:
+                    delay = self._on_error(metric, breaker, e, attempt)
+                    if delay is None:
+                        raise
+                    attempt += 1
+                    await asyncio.sleep(delay)
+                    continue
+                self._record(metric, breaker, limits, tokens, response, started - enqueued, started)
+                return response
+
+    def hedge_delay(self, provider: str, model: str) -> float:
+        """Atraso do hedge: o quantil PROVIDER_HEDGE_QUANTILE das latências recentes do modelo, limitado."""
+        observed = self._latency[f"{provider}/{model}"].quantile(settings.PROVIDER_HEDGE_QUANTILE, settings.PROVIDER_HEDGE_MIN_SAMPLES)
+        if observed is None:
+            return settings.PROVIDER_HEDGE_DEFAULT_DELAY
+        return min(max(observed, settings.PROVIDER_HEDGE_MIN_DELAY), settings.PROVIDER_HEDGE_MAX_DELAY)
+
+    async def hedged_async(self, provider: str, model: str, priority: Priority, tokens: int, request: Callable[[], Any]) -> Any:
+        """
+        `call_async` com hedge: se a primeira requisição não terminar em `hedge_delay`,
+        dispara uma segunda igual e devolve a primeira que der certo; a outra é cancelada.
+        """
+        metric = self._metric(provider, model, priority)
+        tasks = [asyncio.ensure_future(self.call_async(provider, model, priority, tokens, request))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(provider, model))
+            if done:
+                return tasks[0].result()
+            metric.hedged += 1
+            tasks.append(asyncio.ensure_future(self.call_async(provider, model, priority, tokens, request)))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is tasks[1]:
+                            metric.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    # OpenAI
+
+    def embed(self, texts: List[str], model: str, priority: Priority = Priority.BATCH, **kwargs) -> List[List[float]]:
+        tokens = sum(count_tokens(text) for text in texts)
+        with timed(EMBEDDING_SECONDS, priority=priority.name.lower()):
+            response = self.call(OPENAI, model, priority, tokens, lambda: self.openai.embeddings.create(input=texts, model=model, **kwargs))
+        observe_embedding(priority.name.lower(), len(texts), tokens)
+        return [item.embedding for item in response.data]
+
+    async def embed_async(
+        self, texts: List[str], model: str, priority: Priority = Priority.INTERACTIVE, hedge: bool = False, **kwargs
+    ) -> List[List[float]]:
+        tokens = sum(count_tokens(text) for text in texts)
+        call = self.hedged_async if hedge else self.call_async
+        with timed(EMBEDDING_SECONDS, priority=priority.name.lower()):
+            response = await call(OPENAI, model, priority, tokens, lambda: self.openai_async.embeddings.create(input=texts, model=model, **kwargs))
+        observe_embedding(priority.name.lower(), len(texts), tokens)
+        return [item.embedding for item in response.data]
+
+    def complete(self, priority: Priority = Priority.BATCH, **kwargs):
+        return self.call(OPENAI, kwargs["model"], priority, _completion_estimate(kwargs), lambda: self.openai.chat.completions.create(**kwargs))
+
+    async def complete_async(self, priority: Priority = Priority.INTERACTIVE, **kwargs):
+        return await self.call_async(
+            OPENAI, kwargs["model"], priority, _completion_estimate(kwargs), lambda: self.openai_async.chat.completions.create(**kwargs)
+        )
+
+    @asynccontextmanager
+    async def stream_async(self, priority: Priority = Priority.INTERACTIVE, **kwargs):
+        """
+        Completion em streaming: o retry e o circuito cobrem a abertura do stream (antes
+        do primeiro token) e a vaga do provedor fica ocupada até o fim. Produz os chunks
+        com `choices`; o uso de tokens, no último chunk, vai para as métricas.
+        """
+        model = kwargs["model"]
+        estimated = _completion_estimate(kwargs)
+        limits = self.limits(model)
+        breaker = self.breaker(OPENAI, model)
+        metric = self._metric(OPENAI, model, priority)
+        enqueued = time.perf_counter()
+        async with self.budgets[OPENAI].aslot(priority):
+            attempt = 0
+            while True:
+                self._before(breaker, metric)
+                await limits.wait_async(estimated, priority)
+                started = time.perf_counter()
+                try:
+                    response = await self.openai_async.chat.completions.create(
+                        stream=True, stream_options={"include_usage": True}, **kwargs
+                    )
+                    break
+                except asyncio.CancelledError:
+                    breaker.cancel()
+                    raise
+                except Exception as e:
+                    delay = self._on_error(metric, breaker, e, attempt)
+                    if delay is None:
+                        raise
+                    attempt += 1
+                    await asyncio.sleep(delay)
+
+            final = None
+            completed = False
+            stream_error: Optional[Exception] = None
+
+            async def chunks():
+                nonlocal final, completed, stream_error
+                try:
+                    async for chunk in response:
+                        if chunk.usage is not None:
+                            final = chunk
+                        if chunk.choices:
+                            yield chunk
+                except Exception as e:
+                    stream_error = e
+                    raise
+                completed = True
+
+            try:
+                yield chunks()
+            finally:
+                await response.close()
+                if completed:
+                    self._record(metric, breaker, limits, estimated, final, started - enqueued, started)
+                elif stream_error is not None:
+                    # queda no meio do stream conta como falha do provedor, como nas outras chamadas
+                    metric.errors += 1
+                    breaker.record(not _is_outage(stream_error))
+                    logger.warning(f"{breaker.name}: stream interrompido ({type(stream_error).__name__})")
+                else:
+                    # quem consumia parou antes do fim (ex.: cliente desconectou): sem resultado para o circuito
+                    breaker.cancel()
+                    self._record(metric, breaker, limits, estimated, final, started - enqueued, started, succeeded=False)
+
+    # Mistral
+
+    def mistral_call(self, model: str, request: Callable[[Mistral], T], priority: Priority = Priority.BATCH) -> T:
+        """Chamada à API da Mistral com o cliente compartilhado (ex.: upload, URL assinada, OCR)."""
+        return self.call(MISTRAL, model, priority, 0, lambda: request(self.mistral))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = {f"{provider}/{model}/{priority}": metric.as_dict() for (provider, model, priority), metric in self._metrics.items()}
+            limits = dict(self._limits)
+            breakers = list(self._breakers.values())
+        return {
+            "budgets": {provider: budget.stats() for provider, budget in self.budgets.items()},
+            "limits": {model: model_limits.stats() for model, model_limits in limits.items()},
+            "circuits": {breaker.name: breaker.stats() for breaker in breakers},
+            "usage": metrics,
+        }
+
+
+provider_gateway = ProviderGateway()
@@ -0,0 +1,6 @@
+import json
+
+
+def sse_event(event, data):
+    """Formata um evento Server-Sent Events com payload JSON."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -0,0 +1,24 @@
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+from app.core.logging import logging
+
+logger = logging.getLogger(__name__)
+
+_encoding = None
+_fallback_warned = False
+
+
+def count_tokens(text: str) -> int:
+    """Conta tokens com o tiktoken, se instalado; senão estima ~4 caracteres por token."""
+    global _encoding, _fallback_warned
+    if tiktoken is None:
+        if not _fallback_warned:
+            _fallback_warned = True
+            logger.warning("tiktoken não instalado: tokens estimados em ~4 caracteres por token (chunker, contexto e histórico)")
+        return (len(text) + 3) // 4
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("o200k_base")
+    return len(_encoding.encode(text))
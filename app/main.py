@@ -1,15 +1,72 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.logging import configure_logging
+from app.core.admission import AdmissionMiddleware, admission, openai_budget
+from app.core.providers import provider_gateway
+from prometheus_client import CONTENT_TYPE_LATEST
+from app.core.metrics import render_metrics
+from app.core.milvus_connection import milvus_manager
+from app.modules.milvus.utils.residency import residency_manager
 import app.modules.chat.router as chat
 from app.modules.scraping.scraping_router import scraping_router
 from app.modules.milvus.router import router as milvus_router
-app = FastAPI(docs_url=None, redoc_url=None)
+from app.modules.milvus.utils.jobs import job_store
+import asyncio
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Conexões Milvus compartilhadas por todas as requisições
+    await milvus_manager.start()
+    residency_manager.configure(evict=True)
+    await residency_manager.refresh(milvus_manager.client)
+    yield
+    await milvus_manager.close()
+
+
+app = FastAPI(docs_url=None, redoc_url=None, lifespan=lifespan)
 
 # Configure logging
 configure_logging()
 
+# Limites de concorrência por rota (ADMISSION_LIMITS): fila limitada e 429 com Retry-After
+app.add_middleware(AdmissionMiddleware, controller=admission)
+
 
 app.include_router(chat.router, prefix="/chat")
 app.include_router(scraping_router)
 app.include_router(milvus_router, prefix="/milvus")
+
+
+@app.get("/admission")
+async def admission_stats():
+    """
+    Controle de admissão: requisições em andamento, na fila e rejeitadas por rota,
+    uso do orçamento de chamadas à OpenAI por prioridade e fila de jobs dos workers.
+    """
+    return {
+        **admission.stats(),
+        "openai": openai_budget.stats(),
+        "jobs": await asyncio.to_thread(job_store.queue_depth),
+    }
+
+
+@app.get("/providers")
+async def provider_stats():
+    """
+    Gateway dos provedores: vagas em uso por prioridade, buckets de requisições e
+    tokens por modelo e uso por provedor/modelo/prioridade (requisições, erros,
+    retries, 429, tokens, tempo de fila e latência).
+    """
+    return provider_gateway.stats()
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    Métricas Prometheus das etapas do pipeline: scraping, downloads, extração de texto
+    por motor, embeddings, inserts e buscas no Milvus e latência do chat. Com
+    PROMETHEUS_MULTIPROC_DIR, inclui as dos workers da mesma máquina.
+    """
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,133 @@
+import time
+import hashlib
+import threading
+from typing import Dict, List, Optional, Any, Iterable
+import numpy as np
+from app.config.settings import settings
+
+
+# Perguntas sobre várias coleções ficam sob a chave "a|b|c"
+KEY_SEPARATOR = "|"
+
+
+def collections_key(names: Iterable[str]) -> str:
+    """Chave do cache para uma pergunta sobre uma ou mais coleções."""
+    return KEY_SEPARATOR.join(sorted(set(names)))
+
+
+def context_fingerprint(ids: Iterable[Any]) -> str:
+    """Identifica o contexto recuperado pelos ids (PK) dos chunks selecionados, em ordem."""
+    return hashlib.md5(",".join(str(i) for i in ids).encode("utf-8")).hexdigest()
+
+
+class SemanticAnswerCache:
+    """
+    Cache semântico de respostas por coleção.
+
+    Cada coleção guarda um pequeno índice vetorial (matriz numpy normalizada) com
+    (embedding da pergunta, fingerprint do contexto, resposta final). Uma pergunta
+    com similaridade >= threshold e o mesmo fingerprint de contexto reaproveita a
+    resposta. A coleção inteira é invalidada quando é reingerida: a ingestão roda nos
+    workers, então cada chave guarda a versão de ingestão das suas coleções (ver
+    JobStore.collection_versions) e uma versão diferente na consulta descarta as respostas.
+    """
+
+    def __init__(self, threshold: float, max_entries: int, ttl: float):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._versions: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, collection_name: str, vector: List[float], fingerprint: str, version: Any = None) -> Optional[str]:
+        query = self._normalize(vector)
+        with self._lock:
+            self._check_version(collection_name, version)
+            self._expire(collection_name)
+            entries = self._entries.get(collection_name)
+            if not entries:
+                self.misses += 1
+                return None
+
+            similarities = self._vectors[collection_name] @ query
+            for idx in np.argsort(-similarities):
+                if similarities[idx] < self.threshold:
+                    break
+                entry = entries[idx]
+                if entry["fingerprint"] == fingerprint:
+                    entry["last_access"] = time.time()
+                    self.hits += 1
+                    return entry["answer"]
+
+            self.misses += 1
+            return None
+
+    def store(self, collection_name: str, vector: List[float], fingerprint: str, answer: str, version: Any = None) -> None:
+        now = time.time()
+        entry = {"fingerprint": fingerprint, "answer": answer, "created": now, "last_access": now}
+        with self._lock:
+            self._check_version(collection_name, version)
+            entries = self._entries.setdefault(collection_name, [])
+            vectors = self._vectors.get(collection_name)
+            row = self._normalize(vector)[np.newaxis, :]
+            self._vectors[collection_name] = row if vectors is None else np.vstack([vectors, row])
+            entries.append(entry)
+
+            # descarta a entrada menos usada recentemente ao passar do limite
+            if len(entries) > self.max_entries:
+                lru = min(range(len(entries)), key=lambda i: entries[i]["last_access"])
+                self._remove(collection_name, [lru])
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": {name: len(entries) for name, entries in self._entries.items()},
+        }
+
+    def _check_version(self, collection_name: str, version: Any) -> None:
+        # coleção reingerida desde que as respostas foram guardadas
+        if self._versions.get(collection_name) != version:
+            self._drop(collection_name)
+            self._versions[collection_name] = version
+
+    def _expire(self, collection_name: str) -> None:
+        entries = self._entries.get(collection_name, [])
+        limit = time.time() - self.ttl
+        expired = [i for i, entry in enumerate(entries) if entry["created"] < limit]
+        if expired:
+            self._remove(collection_name, expired)
+
+    def _remove(self, collection_name: str, indexes: List[int]) -> None:
+        drop = set(indexes)
+        entries = self._entries[collection_name]
+        keep = [i for i in range(len(entries)) if i not in drop]
+        if not keep:
+            self._drop(collection_name)
+            return
+        self._entries[collection_name] = [entries[i] for i in keep]
+        self._vectors[collection_name] = self._vectors[collection_name][keep]
+
+    def _drop(self, collection_name: str) -> None:
+        self._vectors.pop(collection_name, None)
+        self._entries.pop(collection_name, None)
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+
+answer_cache = SemanticAnswerCache(
+    threshold=settings.CHAT_ANSWER_CACHE_THRESHOLD,
+    max_entries=settings.CHAT_ANSWER_CACHE_SIZE,
+    ttl=settings.CHAT_ANSWER_CACHE_TTL,
+)
@@ -0,0 +1,235 @@
+import re
+import threading
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+from app.core.logging import logging
+from app.config.settings import settings
+from app.core.tokens import count_tokens
+from app.modules.chat.retrieval import RetrievedItem
+
+logger = logging.getLogger(__name__)
+
+# Sobreposição entre chunks vizinhos (INGEST_CHUNK_OVERLAP_TOKENS, ou 150 caracteres no
+# split_text antigo; os cortes caem em separadores, então a sobreposição real varia)
+MIN_OVERLAP = 20
+MAX_OVERLAP = 400
+SHINGLE_SIZE = 3
+# espaço mínimo para valer a pena incluir o começo de uma passagem que não cabe inteira
+MIN_PASSAGE_TOKENS = 100
+
+_word_re = re.compile(r"\w+")
+
+
+def overlap_length(left: str, right: str) -> int:
+    """Tamanho do maior sufixo de `left` que é prefixo de `right` (0 se menor que MIN_OVERLAP)."""
+    for size in range(min(len(left), len(right), MAX_OVERLAP), MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def merge_texts(current: str, new: str) -> Optional[str]:
+    """Junta dois chunks do mesmo trecho se um contém o outro ou se eles se sobrepõem."""
+    if new in current:
+        return current
+    if current in new:
+        return new
+    size = overlap_length(current, new)
+    if size:
+        return current + new[size:]
+    size = overlap_length(new, current)
+    if size:
+        return new + current[size:]
+    return None
+
+
+def format_passage(
+    text: str,
+    score: float,
+    file_name: Optional[str],
+    page: Optional[int],
+    score_label: str,
+    source: Optional[str] = None,
+    page_end: Optional[int] = None,
+) -> str:
+    extra = []
+    if source:
+        extra.append(f"coleção='{source}'")
+    if file_name:
+        extra.append(f"arquivo='{file_name}'")
+    if page is not None and page_end is not None and page_end > page:
+        extra.append(f"páginas={page}-{page_end}")
+    elif page is not None:
+        extra.append(f"página={page}")
+    meta_str = ", ".join(extra)
+    return f"Trecho ({score_label}={score:.4f}{', ' + meta_str if meta_str else ''}):\n{text}"
+
+
+def pages_touch(page: Optional[int], page_end: Optional[int], other: Optional[int], other_end: Optional[int]) -> bool:
+    """True se os intervalos de páginas [page, page_end] e [other, other_end] se sobrepõem ou são vizinhos."""
+    if page is None or other is None:
+        return page is None and other is None
+    return other <= page_end + 1 and page <= other_end + 1
+
+
+def _shingles(text: str) -> set:
+    words = _word_re.findall(text.casefold())
+    if len(words) < SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+class ContextAssembler:
+    """
+    Monta o contexto do prompt a partir dos trechos recuperados:
+
+    1. agrupa por (coleção, file_name) e junta chunks contíguos/sobrepostos, de
+       intervalos de páginas vizinhos ou sobrepostos (chunks que atravessam a quebra
+       de página), em uma única passagem, sem repetir o texto da sobreposição;
+    2. descarta passagens quase idênticas a outra de score maior (shingles de
+       palavras, `dedup_threshold` de contenção);
+    3. preenche `token_budget` em ordem de score, cortando a passagem que não
+       cabe inteira quando ainda sobra espaço útil.
+
+    Cada chamada devolve um relatório com os tokens economizados em relação a
+    concatenar todos os chunks, e os totais ficam acumulados em stats().
+    """
+
+    def __init__(self, token_budget: int, dedup_threshold: float):
+        self.token_budget = token_budget
+        self.dedup_threshold = dedup_threshold
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._tokens_before = 0
+        self._tokens_after = 0
+
+    def assemble(self, items: Sequence[RetrievedItem], score_label: str) -> Tuple[List[str], Dict[str, Any]]:
+        """Retorna as passagens formatadas (em ordem de score) e o relatório da montagem."""
+        tokens_before = sum(
+            count_tokens(format_passage(
+                item.text, item.score, item.file_name, item.page, score_label, item.source, item.page_end
+            ))
+            for item in items
+        )
+
+        passages = self._merge(items)
+        merged = len(items) - len(passages)
+        passages, duplicates = self._drop_near_duplicates(passages)
+
+        selected, tokens_after, truncated, dropped = [], 0, 0, 0
+        for passage in passages:
+            formatted = self._fit(passage, score_label, self.token_budget - tokens_after)
+            if formatted is None:
+                dropped += 1
+                continue
+            if not formatted.endswith(passage["text"]):
+                truncated += 1
+            selected.append(formatted)
+            tokens_after += count_tokens(formatted)
+
+        report = {
+            "chunks": len(items),
+            "passages": len(selected),
+            "merged_chunks": merged,
+            "near_duplicates": duplicates,
+            "truncated": truncated,
+            "over_budget": dropped,
+            "token_budget": self.token_budget,
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "tokens_saved": tokens_before - tokens_after,
+        }
+        with self._lock:
+            self._requests += 1
+            self._tokens_before += tokens_before
+            self._tokens_after += tokens_after
+        return selected, report
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            saved = self._tokens_before - self._tokens_after
+            return {
+                "requests": self._requests,
+                "token_budget": self.token_budget,
+                "tokens_before": self._tokens_before,
+                "tokens_after": self._tokens_after,
+                "tokens_saved": saved,
+                "avg_tokens_saved": round(saved / self._requests, 1) if self._requests else 0.0,
+            }
+
+    def _fit(self, passage: Dict[str, Any], score_label: str, remaining: int) -> Optional[str]:
+        """
+        Formata a passagem dentro dos `remaining` tokens restantes. Se não couber inteira,
+        é cortada no fim quando ainda sobra espaço útil (MIN_PASSAGE_TOKENS); senão, fica de fora.
+        """
+        text = passage["text"]
+        while True:
+            formatted = format_passage(
+                text, passage["score"], passage["file_name"], passage["page"], score_label, passage["source"],
+                passage["page_end"],
+            )
+            tokens = count_tokens(formatted)
+            if tokens <= remaining:
+                return formatted
+            if remaining < MIN_PASSAGE_TOKENS or not text:
+                return None
+            text = text[:int(len(text) * remaining / tokens * 0.95)]
+
+    def _merge(self, items: Sequence[RetrievedItem]) -> List[Dict[str, Any]]:
+        """
+        Agrupa por (coleção, file_name) e junta chunks sobrepostos cujos intervalos
+        [page, page_end] se tocam; ids auto_id seguem a ordem de inserção.
+        """
+        groups: Dict[Tuple[Any, Any], List[RetrievedItem]] = {}
+        for item in items:
+            groups.setdefault((item.source, item.file_name), []).append(item)
+
+        passages = []
+        for (source, file_name), group in groups.items():
+            group_passages: List[Dict[str, Any]] = []
+            for item in sorted(group, key=lambda item: item.id):
+                page_end = item.page_end if item.page_end is not None else item.page
+                last = group_passages[-1] if group_passages else None
+                merged_text = None
+                if last and pages_touch(last["page"], last["page_end"], item.page, page_end):
+                    merged_text = merge_texts(last["text"], item.text)
+                if merged_text is None:
+                    group_passages.append({
+                        "text": item.text,
+                        "score": item.score,
+                        "file_name": file_name,
+                        "page": item.page,
+                        "page_end": page_end,
+                        "source": source,
+                        "ids": [item.id],
+                    })
+                    continue
+                last["text"] = merged_text
+                last["score"] = max(last["score"], item.score)
+                if item.page is not None:
+                    last["page"] = min(last["page"], item.page)
+                    last["page_end"] = max(last["page_end"], page_end)
+                last["ids"].append(item.id)
+            passages.extend(group_passages)
+
+        passages.sort(key=lambda passage: passage["score"], reverse=True)
+        return passages
+
+    def _drop_near_duplicates(self, passages: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        kept, kept_shingles = [], []
+        for passage in passages:
+            shingles = _shingles(passage["text"])
+            duplicate = any(
+                len(shingles & other) / max(1, min(len(shingles), len(other))) >= self.dedup_threshold
+                for other in kept_shingles
+            )
+            if duplicate:
+                continue
+            kept.append(passage)
+            kept_shingles.append(shingles)
+        return kept, len(passages) - len(kept)
+
+
+context_assembler = ContextAssembler(
+    token_budget=settings.CHAT_CONTEXT_TOKEN_BUDGET,
+    dedup_threshold=settings.CHAT_CONTEXT_DEDUP_THRESHOLD,
+)
@@ -1,7 +1,6 @@
-from pymilvus import MilvusClient
-from openai import OpenAI
-from app.config.settings import settings
+from app.core.providers import provider_gateway
 
-# Initialize Milvus and OpenAI Clients using Config
-milvus_client = MilvusClient(settings.MILVUS_URL)
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
\ No newline at end of file
+# Clientes OpenAI compartilhados (pool do gateway dos provedores; Milvus vem de app.core.milvus_connection).
+# Chamadas novas devem passar pelo provider_gateway, que aplica limites, prioridade e retry
+client = provider_gateway.openai
+async_client = provider_gateway.openai_async
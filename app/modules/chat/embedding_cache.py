@@ -0,0 +1,81 @@
+import time
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Tuple, Any
+from cachetools import TTLCache
+from app.config.settings import settings
+
+CacheKey = Tuple[str, str]
+
+
+class QueryEmbeddingCache:
+    """
+    Cache em memória (LRU limitado por tamanho + TTL) das embeddings de perguntas,
+    chaveado por modelo e pergunta normalizada.
+    Perguntas idênticas feitas ao mesmo tempo são coalescidas: só a primeira chama
+    a API e as demais esperam pelo mesmo resultado. A chamada roda numa task própria,
+    então o cancelamento de quem a disparou (cliente desconectado) não afeta os demais.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight: Dict[CacheKey, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._miss_seconds = 0.0
+
+    @staticmethod
+    def make_key(model: str, text: str) -> CacheKey:
+        return model, " ".join(text.split()).casefold()
+
+    async def get_or_compute(
+        self,
+        model: str,
+        text: str,
+        compute: Callable[[str], Awaitable[List[float]]],
+    ) -> List[float]:
+        key = self.make_key(model, text)
+        value = self._cache.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._compute(key, text, compute))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _compute(self, key: CacheKey, text: str, compute) -> List[float]:
+        started = time.perf_counter()
+        try:
+            value = await compute(text)
+            self._cache[key] = value
+            self.misses += 1
+            self._miss_seconds += time.perf_counter() - started
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        served = self.hits + self.coalesced
+        total = served + self.misses
+        avg_miss_seconds = self._miss_seconds / self.misses if self.misses else 0.0
+        return {
+            "size": len(self._cache),
+            "maxsize": self._cache.maxsize,
+            "ttl": self._cache.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(served / total, 4) if total else 0.0,
+            "avg_miss_latency_ms": round(avg_miss_seconds * 1000, 1),
+            "saved_latency_seconds": round(served * avg_miss_seconds, 3),
+        }
+
+
+embedding_cache = QueryEmbeddingCache(
+    maxsize=settings.CHAT_EMBEDDING_CACHE_SIZE,
+    ttl=settings.CHAT_EMBEDDING_CACHE_TTL,
+)
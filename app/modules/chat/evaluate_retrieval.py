@@ -0,0 +1,104 @@
+"""
+Compara a recuperação densa com a híbrida (vetor + BM25) em um conjunto de perguntas.
+
+O arquivo de perguntas é JSONL, uma pergunta por linha, com os trechos relevantes
+identificados por arquivo (e opcionalmente página):
+
+    {"question": "Qual o CNPJ da contratada?", "relevant": [{"file_name": "contrato.pdf", "page": 2}]}
+
+Exemplo:
+
+    python -m app.modules.chat.evaluate_retrieval --collection _prefeitura_ --queries perguntas.jsonl --k 1 5 10
+
+Reporta recall@k médio e a latência da busca (p50/p95, sem a embedding da pergunta)
+para cada configuração. A densa aplica o mesmo corte por score usado no chat, então
+pode devolver menos de k trechos.
+"""
+import json
+import time
+import asyncio
+import argparse
+from typing import Dict, List, Any
+import numpy as np
+from app.core.logging import configure_logging
+from app.core.milvus_connection import milvus_manager
+from app.modules.milvus.utils.layout import resolve_search_target
+from app.modules.milvus.utils.residency import residency_manager
+from app.modules.chat.service import emb_text
+from app.modules.chat.retrieval import (
+    MODE_DENSE,
+    MODE_HYBRID,
+    RANKER_RRF,
+    RANKER_WEIGHTED,
+    RetrievedItem,
+    retrieval_config,
+    retrieve,
+)
+
+# nome -> ajustes sobre a configuração da coleção
+VARIANTS = {
+    "dense": {"mode": MODE_DENSE},
+    "hybrid_rrf": {"mode": MODE_HYBRID, "ranker": RANKER_RRF},
+    "hybrid_weighted": {"mode": MODE_HYBRID, "ranker": RANKER_WEIGHTED},
+}
+
+
+def is_relevant(item: RetrievedItem, relevant: Dict[str, Any]) -> bool:
+    return item.file_name == relevant["file_name"] and relevant.get("page") in (None, item.page)
+
+
+def recall_at_k(items: List[RetrievedItem], relevant: List[Dict[str, Any]], k: int) -> float:
+    top = items[:k]
+    found = sum(1 for rel in relevant if any(is_relevant(item, rel) for item in top))
+    return found / len(relevant)
+
+
+async def evaluate(collection_name: str, queries: List[Dict[str, Any]], ks: List[int]) -> Dict[str, Any]:
+    await milvus_manager.start()
+    try:
+        target = resolve_search_target(collection_name)
+        await residency_manager.ensure_loaded(milvus_manager.client, target.collection_name)
+        vectors = [await emb_text(query["question"]) for query in queries]
+
+        report = {}
+        for variant, overrides in VARIANTS.items():
+            config = retrieval_config(target.name, limit=max(ks), **overrides)
+            recalls = {k: [] for k in ks}
+            latencies = []
+            used_mode = None
+            for query, vector in zip(queries, vectors):
+                started = time.perf_counter()
+                used_mode, items = await retrieve(target, query["question"], vector, config)
+                latencies.append((time.perf_counter() - started) * 1000)
+                for k in ks:
+                    recalls[k].append(recall_at_k(items, query["relevant"], k))
+
+            report[variant] = {
+                "mode": used_mode,
+                **{f"recall@{k}": round(float(np.mean(values)), 4) for k, values in recalls.items()},
+                "latency_ms_p50": round(float(np.percentile(latencies, 50)), 1),
+                "latency_ms_p95": round(float(np.percentile(latencies, 95)), 1),
+            }
+        return report
+    finally:
+        await milvus_manager.close()
+
+
+def main():
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Avalia recall@k e latência da recuperação densa x híbrida.")
+    parser.add_argument("--collection", required=True, help="Coleção (ou tenant) a avaliar")
+    parser.add_argument("--queries", required=True, help="Arquivo JSONL com question e relevant")
+    parser.add_argument("--k", nargs="+", type=int, default=[1, 5, 10], help="Valores de k (padrão: 1 5 10)")
+    args = parser.parse_args()
+
+    with open(args.queries, encoding="utf-8") as f:
+        queries = [json.loads(line) for line in f if line.strip()]
+    queries = [query for query in queries if query.get("relevant")]
+
+    report = asyncio.run(evaluate(args.collection, queries, sorted(args.k)))
+    print(json.dumps({"queries": len(queries), "results": report}, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
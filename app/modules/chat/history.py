@@ -0,0 +1,209 @@
+import hashlib
+import threading
+from typing import Dict, List, Any, Optional, Tuple
+from cachetools import TTLCache
+from app.core.logging import logging
+from app.config.settings import settings
+from app.core.admission import Priority
+from app.core.providers import provider_gateway
+from app.core.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+Message = Dict[str, str]
+
+SUMMARY_PROMPT = (
+    "Resuma a conversa abaixo entre um usuário e um assistente em português, em até "
+    "{max_tokens} tokens. Preserve fatos, números, nomes de arquivos e decisões que "
+    "possam ser retomados nas próximas perguntas; omita cumprimentos e repetições."
+)
+
+
+def _messages_hash(messages: List[Message]) -> str:
+    digest = hashlib.md5()
+    for message in messages:
+        digest.update(f"{message['role']}\x00{message['content']}\x01".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _render(messages: List[Message]) -> str:
+    names = {"user": "Usuário", "assistant": "Assistente", "system": "Sistema"}
+    return "\n".join(f"{names.get(m['role'], m['role'])}: {m['content']}" for m in messages)
+
+
+def _tokens(messages: List[Message]) -> int:
+    # ~4 tokens de overhead por mensagem no formato de chat
+    return sum(count_tokens(message["content"]) + 4 for message in messages)
+
+
+class ConversationStore:
+    """
+    Histórico das conversas guardado no servidor (memória do processo, LRU + TTL).
+    Com um `conversation_id`, o cliente envia só a pergunta nova em vez do histórico inteiro.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._conversations: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id: str) -> List[Message]:
+        with self._lock:
+            return list(self._conversations.get(conversation_id, []))
+
+    def replace(self, conversation_id: str, messages: List[Message]) -> None:
+        with self._lock:
+            self._conversations[conversation_id] = list(messages)
+
+    def append(self, conversation_id: str, *messages: Message) -> None:
+        with self._lock:
+            history = self._conversations.get(conversation_id, [])
+            self._conversations[conversation_id] = history + list(messages)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"conversations": len(self._conversations), "max": self._conversations.maxsize}
+
+
+class HistoryCompactor:
+    """
+    Mantém o histórico enviado ao modelo dentro de `token_budget`:
+
+    - abaixo do orçamento, o histórico vai inteiro;
+    - acima, as últimas `keep_turns` trocas (pergunta + resposta) vão literais e as
+      anteriores viram um resumo (mensagem de sistema), gerado pelo modelo e guardado
+      por conversa: no turno seguinte só as mensagens que saíram da janela são
+      incorporadas ao resumo anterior;
+    - se o resumo falhar, as mensagens antigas são descartadas (truncamento).
+    """
+
+    def __init__(self, token_budget: int, keep_turns: int, summary_max_tokens: int, model: str):
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.summary_max_tokens = summary_max_tokens
+        self.model = model
+        # chave da conversa -> {"covered", "prefix_hash", "summary"}
+        self._summaries: TTLCache = TTLCache(maxsize=settings.CHAT_CONVERSATION_MAX, ttl=settings.CHAT_CONVERSATION_TTL)
+        self._lock = threading.Lock()
+        self.summaries_created = 0
+        self.summaries_reused = 0
+        self._tokens_before = 0
+        self._tokens_after = 0
+
+    @staticmethod
+    def clean(messages: Optional[List[Dict[str, Any]]], question: str) -> List[Message]:
+        """
+        Mantém só mensagens user/assistant com texto e remove a pergunta atual do fim
+        (o front a inclui no histórico, e ela já vai junto com a base de conhecimento).
+        """
+        cleaned = [
+            {"role": message["role"], "content": message["content"]}
+            for message in messages or []
+            if message.get("role") in ("user", "assistant") and isinstance(message.get("content"), str)
+        ]
+        if cleaned and cleaned[-1]["role"] == "user" and cleaned[-1]["content"].strip() == question.strip():
+            cleaned.pop()
+        return cleaned
+
+    async def compact(
+        self,
+        messages: List[Message],
+        conversation_key: Optional[str] = None,
+    ) -> Tuple[List[Message], Dict[str, Any]]:
+        """Retorna as mensagens a enviar ao modelo e um relatório da compactação."""
+        tokens_before = _tokens(messages)
+        report = {"messages_in": len(messages), "tokens_before": tokens_before, "summarized": 0, "summary": None}
+
+        if tokens_before <= self.token_budget:
+            return self._finish(messages, report)
+
+        split = max(0, len(messages) - self.keep_turns * 2)
+        older, recent = messages[:split], messages[split:]
+        key = conversation_key or (_messages_hash(messages[:1]) if messages else None)
+
+        compacted: List[Message] = []
+        if older:
+            summary = await self._summary_for(key, older, report)
+            if summary:
+                compacted.append({"role": "system", "content": f"Resumo da conversa anterior:\n{summary}"})
+                report["summarized"] = len(older)
+
+        # as trocas recentes ainda estouram o orçamento: descarta as mais antigas (mantém a última)
+        budget = self.token_budget - _tokens(compacted)
+        while len(recent) > 2 and _tokens(recent) > budget:
+            recent = recent[2:]
+        return self._finish(compacted + recent, report)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "token_budget": self.token_budget,
+                "keep_turns": self.keep_turns,
+                "summaries_created": self.summaries_created,
+                "summaries_reused": self.summaries_reused,
+                "tokens_before": self._tokens_before,
+                "tokens_after": self._tokens_after,
+                "tokens_saved": self._tokens_before - self._tokens_after,
+            }
+
+    def _finish(self, messages: List[Message], report: Dict[str, Any]) -> Tuple[List[Message], Dict[str, Any]]:
+        report["messages_out"] = len(messages)
+        report["tokens_after"] = _tokens(messages)
+        report["tokens_saved"] = report["tokens_before"] - report["tokens_after"]
+        with self._lock:
+            self._tokens_before += report["tokens_before"]
+            self._tokens_after += report["tokens_after"]
+        return messages, report
+
+    async def _summary_for(self, key: Optional[str], older: List[Message], report: Dict[str, Any]) -> Optional[str]:
+        """Resumo das mensagens antigas, reaproveitando/estendendo o resumo guardado da conversa."""
+        cached = self._summaries.get(key) if key else None
+        previous, pending = None, older
+        if cached and cached["covered"] <= len(older) and cached["prefix_hash"] == _messages_hash(older[:cached["covered"]]):
+            previous, pending = cached["summary"], older[cached["covered"]:]
+
+        if previous is not None and not pending:
+            self.summaries_reused += 1
+            report["summary"] = "cached"
+            return previous
+
+        try:
+            summary = await self._summarize(previous, pending)
+        except Exception as e:
+            logger.warning(f"Falha ao resumir o histórico; mensagens antigas descartadas: {e}")
+            report["summary"] = "failed"
+            return previous
+
+        self.summaries_created += 1
+        report["summary"] = "extended" if previous else "created"
+        if key:
+            self._summaries[key] = {"covered": len(older), "prefix_hash": _messages_hash(older), "summary": summary}
+        return summary
+
+    async def _summarize(self, previous: Optional[str], messages: List[Message]) -> str:
+        conversation = _render(messages)
+        if previous:
+            conversation = f"Resumo até aqui:\n{previous}\n\nContinuação:\n{conversation}"
+        response = await provider_gateway.complete_async(
+            Priority.INTERACTIVE,
+            model=self.model,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT.format(max_tokens=self.summary_max_tokens)},
+                {"role": "user", "content": conversation},
+            ],
+            max_tokens=self.summary_max_tokens,
+            temperature=0.0,
+        )
+        return response.choices[0].message.content.strip()
+
+
+conversation_store = ConversationStore(
+    maxsize=settings.CHAT_CONVERSATION_MAX,
+    ttl=settings.CHAT_CONVERSATION_TTL,
+)
+
+history_compactor = HistoryCompactor(
+    token_budget=settings.CHAT_HISTORY_TOKEN_BUDGET,
+    keep_turns=settings.CHAT_HISTORY_KEEP_TURNS,
+    summary_max_tokens=settings.CHAT_HISTORY_SUMMARY_MAX_TOKENS,
+    model=settings.CHAT_HISTORY_SUMMARY_MODEL,
+)
@@ -0,0 +1,354 @@
+import time
+import asyncio
+from typing import Dict, List, NamedTuple, Optional, Tuple, Any
+from pymilvus import AnnSearchRequest, RRFRanker, WeightedRanker
+from app.core.logging import logging
+from app.config.settings import settings
+from app.core.metrics import MILVUS_SEARCH_SECONDS, timed
+from app.core.milvus_connection import milvus_manager
+from app.modules.milvus.utils.layout import StorageTarget, resolve_search_target
+from app.modules.milvus.utils.milvus import SPARSE_FIELD, get_collection_fields
+from app.modules.milvus.utils.residency import residency_manager
+from app.modules.chat.schemas.schemas import SearchFilters
+
+logger = logging.getLogger(__name__)
+
+# Modos de recuperação (settings.CHAT_RETRIEVAL_MODE / CHAT_RETRIEVAL_OVERRIDES)
+MODE_DENSE = "dense"
+MODE_HYBRID = "hybrid"
+RANKER_RRF = "rrf"
+RANKER_WEIGHTED = "weighted"
+
+OUTPUT_FIELDS = ["text", "file_name", "page"]
+# busca em duas fases: o texto (até 65535 caracteres por chunk) só vem no get dos trechos que sobraram
+METADATA_FIELDS = ["file_name", "page"]
+DENSE_SEARCH_PARAMS = {"metric_type": "IP", "params": {"nprobe": 16}}
+SPARSE_SEARCH_PARAMS = {"metric_type": "BM25"}
+# candidatos buscados em cada perna da busca (denso puro e cada lado da híbrida)
+CANDIDATES = 20
+
+
+class RetrievedItem(NamedTuple):
+    """
+    Trecho recuperado; `source` é a coleção de origem nas buscas em várias coleções e
+    `page_end` a última página do chunk (None em coleções antigas, sem o campo).
+    """
+    text: str
+    score: float
+    file_name: str
+    page: Optional[int]
+    id: Any
+    source: Optional[str] = None
+    page_end: Optional[int] = None
+
+
+class RetrievalConfig(NamedTuple):
+    """Como recuperar o contexto de uma coleção."""
+    mode: str
+    ranker: str
+    rrf_k: int
+    weights: Tuple[float, float]  # (denso, BM25), usado pelo ranker "weighted"
+    limit: int                    # trechos devolvidos pela busca híbrida
+    deferred_text: bool           # busca só metadados e lê o texto depois, por id
+
+
+def retrieval_config(name: str, **overrides) -> RetrievalConfig:
+    """Configuração global, sobrescrita por CHAT_RETRIEVAL_OVERRIDES[name] e por `overrides`."""
+    values = {
+        "mode": settings.CHAT_RETRIEVAL_MODE,
+        "ranker": settings.CHAT_HYBRID_RANKER,
+        "rrf_k": settings.CHAT_HYBRID_RRF_K,
+        "weights": settings.CHAT_HYBRID_WEIGHTS,
+        "limit": settings.CHAT_HYBRID_LIMIT,
+        "deferred_text": settings.CHAT_DEFERRED_TEXT_FETCH,
+        **settings.CHAT_RETRIEVAL_OVERRIDES.get(name, {}),
+        **overrides,
+    }
+    values["weights"] = tuple(values["weights"])
+    return RetrievalConfig(**values)
+
+
+async def has_sparse_field(collection_name: str) -> bool:
+    """Coleções criadas antes da busca full-text (ou no Milvus Lite) não têm o campo BM25."""
+    return SPARSE_FIELD in await get_collection_fields(milvus_manager.client, collection_name)
+
+
+async def filter_expression(target: StorageTarget, filters: Optional[SearchFilters] = None) -> Optional[str]:
+    """
+    Combina o filtro do tenant com os filtros da pergunta (arquivo, páginas, data de ingestão).
+    Falha se a coleção não tiver algum campo usado (ex.: ingested_at em coleções antigas).
+    """
+    clauses = [target.filter]
+    filters_expr = None
+    if filters is not None:
+        fields = await get_collection_fields(milvus_manager.client, target.collection_name)
+        page_end = "page_end" in fields
+        filters_expr = filters.to_expr(page_end=page_end)
+    if filters_expr:
+        missing = filters.fields(page_end=page_end) - fields
+        if missing:
+            raise ValueError(f"Coleção '{target.name}' não tem o(s) campo(s) {sorted(missing)} para filtrar")
+        clauses.append(filters_expr)
+
+    clauses = [clause for clause in clauses if clause]
+    if len(clauses) <= 1:
+        return clauses[0] if clauses else None
+    return " and ".join(f"({clause})" for clause in clauses)
+
+
+async def retrieve(
+    target: StorageTarget,
+    question: str,
+    query_vector: List[float],
+    config: RetrievalConfig,
+    filters: Optional[SearchFilters] = None,
+    fetch_text: bool = True,
+) -> Tuple[str, List[RetrievedItem]]:
+    """
+    Recupera os trechos relevantes para a pergunta. Retorna o modo efetivamente
+    usado e os itens em ordem de relevância.
+
+    - hybrid: busca densa (IP) + BM25 sobre `text`, fundidas no Milvus por RRF ou
+      pesos, devolvendo `config.limit` trechos;
+    - dense: só a busca vetorial, com o corte relativo ao melhor score.
+
+    `filters` restringe a busca no próprio Milvus (índices escalares em file_name,
+    page e ingested_at), em vez de buscar na coleção inteira.
+
+    Com `config.deferred_text` a busca devolve só ids, scores e metadados, e o texto
+    é lido depois (fetch_texts) apenas para os trechos que passaram no corte; com
+    fetch_text=False essa segunda fase fica a cargo de quem chamou (itens com text="").
+    """
+    expr = await filter_expression(target, filters)
+    output_fields = METADATA_FIELDS if config.deferred_text else OUTPUT_FIELDS
+    if "page_end" in await get_collection_fields(milvus_manager.client, target.collection_name):
+        output_fields = [*output_fields, "page_end"]
+    if config.mode == MODE_HYBRID and await has_sparse_field(target.collection_name):
+        hits = await _hybrid_search(target, question, query_vector, config, expr, output_fields)
+        mode, items = MODE_HYBRID, [_to_item(hit) for hit in hits]
+    else:
+        mode, items = MODE_DENSE, await _dense_search(target, query_vector, expr, output_fields)
+
+    if config.deferred_text and fetch_text:
+        items = await fetch_texts(target.collection_name, items)
+    return mode, items
+
+
+async def fetch_texts(collection_name: str, items: List[RetrievedItem]) -> List[RetrievedItem]:
+    """
+    Segunda fase da busca: lê o `text` dos itens por id (chave primária). Itens
+    removidos entre a busca e o get ficam de fora.
+    """
+    if not items:
+        return items
+    with timed(MILVUS_SEARCH_SECONDS, kind="get"):
+        rows = await milvus_manager.async_client.get(
+            collection_name=collection_name,
+            ids=[item.id for item in items],
+            output_fields=["text"],
+        )
+    texts = {row["id"]: row["text"] for row in rows}
+    return [item._replace(text=texts[item.id]) for item in items if item.id in texts]
+
+
+async def _dense_search(
+    target: StorageTarget,
+    query_vector: List[float],
+    expr: Optional[str],
+    output_fields: List[str],
+) -> List[RetrievedItem]:
+    with timed(MILVUS_SEARCH_SECONDS, kind="dense"):
+        hits = await milvus_manager.async_client.search(
+            collection_name=target.collection_name,
+            data=[query_vector],
+            filter=expr or "",
+            search_params=DENSE_SEARCH_PARAMS,
+            limit=CANDIDATES,
+            output_fields=output_fields,
+        )
+    retrieved_items = sorted((_to_item(hit) for hit in hits[0]), key=lambda item: item.score, reverse=True)
+    if not retrieved_items:
+        return []
+
+    top_score = retrieved_items[0].score
+    threshold = max(0.2, top_score * 0.6)
+    return [item for item in retrieved_items if item.score > threshold]
+
+
+async def _hybrid_search(
+    target: StorageTarget,
+    question: str,
+    query_vector: List[float],
+    config: RetrievalConfig,
+    expr: Optional[str],
+    output_fields: List[str],
+) -> List[Dict[str, Any]]:
+    requests = [
+        AnnSearchRequest(
+            data=[query_vector],
+            anns_field="vector",
+            param=DENSE_SEARCH_PARAMS,
+            limit=CANDIDATES,
+            expr=expr,
+        ),
+        AnnSearchRequest(
+            data=[question],
+            anns_field=SPARSE_FIELD,
+            param=SPARSE_SEARCH_PARAMS,
+            limit=CANDIDATES,
+            expr=expr,
+        ),
+    ]
+    if config.ranker == RANKER_WEIGHTED:
+        ranker = WeightedRanker(*config.weights)
+    else:
+        ranker = RRFRanker(config.rrf_k)
+
+    with timed(MILVUS_SEARCH_SECONDS, kind="hybrid"):
+        hits = await milvus_manager.async_client.hybrid_search(
+            collection_name=target.collection_name,
+            reqs=requests,
+            ranker=ranker,
+            limit=config.limit,
+            output_fields=output_fields,
+        )
+    return hits[0]
+
+
+def fused_score(rank: int, rrf_k: int) -> float:
+    """
+    Score de um trecho no ranking global das buscas em várias coleções: RRF pela
+    posição (1 = melhor) na própria coleção, dividido pelo do 1º lugar, em (0, 1].
+    Os scores brutos (IP denso, RRF ou weighted da híbrida) não são comparáveis
+    entre coleções, então só a ordem dentro de cada uma conta.
+    """
+    return (rrf_k + 1) / (rrf_k + rank)
+
+
+async def federated_retrieve(
+    names: List[str],
+    question: str,
+    query_vector: List[float],
+    deadline: Optional[float],
+    limit: int,
+    filters: Optional[SearchFilters] = None,
+) -> Tuple[List[RetrievedItem], Dict[str, Dict[str, Any]]]:
+    """
+    Busca a pergunta em várias coleções ao mesmo tempo (carregando-as sob demanda),
+    funde os rankings por RRF (ver `fused_score`) e devolve os `limit` melhores trechos no geral,
+    marcados com a coleção de origem, e o status/latência por coleção.
+    Coleções que não respondem em `deadline` segundos ficam de fora (a carga
+    continua em segundo plano para as próximas perguntas).
+    Com a busca em duas fases, o texto só é lido para os trechos do ranking global.
+    As coleções ficam marcadas como em uso até o fim, para nenhuma ser liberada no meio.
+    """
+    with residency_manager.hold(*(resolve_search_target(name).collection_name for name in names)):
+        return await _federated_retrieve(names, question, query_vector, deadline, limit, filters)
+
+
+async def _federated_retrieve(
+    names: List[str],
+    question: str,
+    query_vector: List[float],
+    deadline: Optional[float],
+    limit: int,
+    filters: Optional[SearchFilters],
+) -> Tuple[List[RetrievedItem], Dict[str, Dict[str, Any]]]:
+    started = time.perf_counter()
+    sources: Dict[str, Dict[str, Any]] = {}
+    # coleção -> coleção física cujo texto ainda falta ler
+    deferred: Dict[str, str] = {}
+
+    async def search_one(name: str) -> List[RetrievedItem]:
+        target = resolve_search_target(name)
+        await asyncio.shield(residency_manager.ensure_loaded(milvus_manager.client, target.collection_name))
+        config = retrieval_config(target.name)
+        mode, items = await retrieve(target, question, query_vector, config, filters, fetch_text=False)
+        if config.deferred_text:
+            deferred[name] = target.collection_name
+        sources[name] = {
+            "status": "ok",
+            "mode": mode,
+            "hits": len(items),
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        ranked = sorted(items, key=lambda item: item.score, reverse=True)
+        return [
+            item._replace(score=fused_score(rank, settings.CHAT_HYBRID_RRF_K), source=name)
+            for rank, item in enumerate(ranked, start=1)
+        ]
+
+    tasks = {asyncio.ensure_future(search_one(name)): name for name in names}
+    try:
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    items: List[RetrievedItem] = []
+    errors = []
+    for task, name in tasks.items():
+        if task in pending:
+            sources[name] = {"status": "timeout", "latency_ms": round(deadline * 1000, 1)}
+            continue
+        if task.exception() is not None:
+            errors.append(task.exception())
+            sources[name] = {"status": "error", "error": str(task.exception())}
+            continue
+        items.extend(task.result())
+
+    if errors and len(errors) == len(names):
+        raise errors[0]
+    if len(done) < len(names):
+        logger.warning(f"Busca em várias coleções sem resposta completa: {sources}")
+
+    items.sort(key=lambda item: item.score, reverse=True)
+    items = items[:limit]
+    if deferred:
+        items = await _fetch_federated_texts(items, deferred, sources)
+    return items, sources
+
+
+async def _fetch_federated_texts(
+    items: List[RetrievedItem],
+    deferred: Dict[str, str],
+    sources: Dict[str, Dict[str, Any]],
+) -> List[RetrievedItem]:
+    """Lê o texto dos trechos do ranking global, uma chamada por coleção, mantendo a ordem."""
+    by_source: Dict[str, List[RetrievedItem]] = {}
+    for item in items:
+        if item.source in deferred:
+            by_source.setdefault(item.source, []).append(item)
+
+    names = list(by_source)
+    results = await asyncio.gather(
+        *(fetch_texts(deferred[name], by_source[name]) for name in names),
+        return_exceptions=True,
+    )
+    fetched: Dict[Tuple[str, Any], RetrievedItem] = {}
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Falha ao ler o texto dos trechos de '{name}': {result}")
+            sources[name] = {"status": "error", "error": str(result)}
+            continue
+        fetched.update(((item.source, item.id), item) for item in result)
+
+    ordered = []
+    for item in items:
+        if item.source not in deferred:
+            ordered.append(item)
+        elif (item.source, item.id) in fetched:
+            ordered.append(fetched[(item.source, item.id)])
+    return ordered
+
+
+def _to_item(hit: Dict[str, Any]) -> RetrievedItem:
+    entity = hit["entity"]
+    return RetrievedItem(
+        text=entity.get("text", ""),
+        score=hit["distance"],
+        file_name=entity.get("file_name", "desconhecido"),
+        page=entity.get("page"),
+        id=hit["id"],
+        page_end=entity.get("page_end"),
+    )
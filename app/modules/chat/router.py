@@ -1,24 +1,57 @@
 from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse, StreamingResponse
-from app.modules.chat.service import ask_question_stream
+from pydantic import ValidationError
+from app.modules.chat.service import CHAT_MODEL, EMBEDDING_MODEL, ask_question_stream
+from app.core.providers import OPENAI, CircuitOpenError, provider_gateway
+from app.core.metrics import CHAT_TOTAL_SECONDS, CHAT_TTFT_SECONDS
+from app.core.milvus_connection import milvus_manager
+from app.modules.milvus.utils.residency import residency_manager
+from app.modules.milvus.utils.layout import resolve_search_target
+from app.modules.chat.embedding_cache import embedding_cache
+from app.modules.chat.answer_cache import answer_cache
+from app.modules.chat.context import context_assembler
+from app.modules.chat.history import conversation_store, history_compactor
+from app.modules.chat.retrieval import filter_expression
+from app.modules.chat.schemas.schemas import SearchFilters
+from app.core.sse import sse_event
 import json
+import math
+import time
+import asyncio
 import logging
+from app.config.settings import settings
 
 log = logging.getLogger(__name__)
 
 router = APIRouter()
 
+
 @router.post("/ask")
 async def process_web_query(request: Request):
     try:
         log.info("Recebendo solicitação de consulta da Web...")
+        started = time.perf_counter()
+        accept = request.headers.get("accept", "")
 
         request = await request.json()
         
         question = request.get("question")
-        collection_name = request.get("collection")
+        # uma coleção (`collection`) ou várias (`collections`, ou `collection` como lista)
+        collection_name = request.get("collections") or request.get("collection")
 
         messages = request.get("messages")
+        # com conversation_id o histórico fica no servidor e `messages` pode ser omitido
+        conversation_id = request.get("conversation_id")
+        # filtros opcionais: file_names, page_from/page_to, ingested_after/ingested_before
+        try:
+            filters = SearchFilters.model_validate(request["filters"]) if request.get("filters") else None
+        except ValidationError as e:
+            return JSONResponse(
+                content={"status": "error", "message": "Filtros inválidos.", "errors": e.errors(include_url=False, include_context=False)},
+                status_code=400,
+            )
+        # SSE com eventos token/done (e métricas de latência) ou texto puro (padrão)
+        use_sse = request.get("stream_format") == "sse" or "text/event-stream" in accept
         
         if not question or not collection_name:
             log.error("Campos obrigatórios não fornecidos.")
@@ -29,25 +62,97 @@ async def process_web_query(request: Request):
                 },
                 status_code=400,
             )
-    
 
-        # Nome da coleção no Milvus
-        collection_name = f"{collection_name}"
-        log.info(f"Utilizando coleção Milvus: {collection_name}")
+        # provedor instável (circuito aberto): responde na hora em vez de esperar o timeout
+        retry_after = provider_gateway.circuit_retry_after(OPENAI, EMBEDDING_MODEL, CHAT_MODEL)
+        if retry_after:
+            log.warning(f"Circuito da OpenAI aberto; pergunta recusada por {retry_after:.0f}s")
+            return JSONResponse(
+                content={
+                    "status": "error",
+                    "message": "O provedor de IA está indisponível no momento. Tente novamente em instantes.",
+                },
+                status_code=503,
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+        if isinstance(collection_name, list):
+            collection_name = list(dict.fromkeys(f"{name}" for name in collection_name))
+            if len(collection_name) > settings.CHAT_FEDERATED_MAX_COLLECTIONS:
+                return JSONResponse(
+                    content={
+                        "status": "error",
+                        "message": f"Máximo de {settings.CHAT_FEDERATED_MAX_COLLECTIONS} coleções por pergunta.",
+                    },
+                    status_code=400,
+                )
+            if len(collection_name) == 1:
+                collection_name = collection_name[0]
+
+        if isinstance(collection_name, list):
+            # busca federada: cada coleção é carregada dentro do prazo da busca
+            log.info(f"Utilizando coleções Milvus: {collection_name}")
+        else:
+            # Nome da coleção no Milvus
+            collection_name = f"{collection_name}"
+            log.info(f"Utilizando coleção Milvus: {collection_name}")
+            target = resolve_search_target(collection_name)
+            await residency_manager.ensure_loaded(milvus_manager.client, target.collection_name)
+            try:
+                await filter_expression(target, filters)
+            except ValueError as e:
+                return JSONResponse(content={"status": "error", "message": str(e)}, status_code=400)
         
         log.info("Iniciando geração de resposta...")
+        metrics = {}
         answer_generator = ask_question_stream(
-            question, collection_name, messages
+            question, collection_name, messages, metrics, conversation_id, filters
         )
         
-        def event_generator():
-            full_answer = ""
-            for chunk in answer_generator:
-                full_answer += chunk
-                log.debug(f"Chunk recebido: {chunk}")
-                yield chunk 
-        
-        return StreamingResponse(event_generator(), media_type="text/plain")
+        async def event_generator():
+            first_token_at = None
+            try:
+                async for chunk in answer_generator:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        CHAT_TTFT_SECONDS.observe(first_token_at - started)
+                        log.info(f"Primeiro token em {(first_token_at - started) * 1000:.0f} ms")
+                    log.debug(f"Chunk recebido: {chunk}")
+                    yield sse_event("token", {"content": chunk}) if use_sse else chunk
+            except asyncio.CancelledError:
+                CHAT_TOTAL_SECONDS.labels("cancelled").observe(time.perf_counter() - started)
+                log.info("Cliente desconectou; geração interrompida.")
+                raise
+            except CircuitOpenError as e:
+                CHAT_TOTAL_SECONDS.labels("unavailable").observe(time.perf_counter() - started)
+                log.warning(f"Resposta interrompida: {e}")
+                if use_sse:
+                    yield sse_event("error", {
+                        "message": "O provedor de IA está indisponível no momento. Tente novamente em instantes.",
+                        "retry_after": math.ceil(e.retry_after),
+                    })
+                return
+            except Exception as e:
+                CHAT_TOTAL_SECONDS.labels("error").observe(time.perf_counter() - started)
+                log.error(f"Erro durante o streaming da resposta: {e}")
+                if use_sse:
+                    yield sse_event("error", {"message": "Não foi possível processar sua solicitação."})
+                return
+
+            timings = {
+                "ttft_ms": round((first_token_at - started) * 1000, 1) if first_token_at else None,
+                "total_ms": round((time.perf_counter() - started) * 1000, 1),
+            }
+            CHAT_TOTAL_SECONDS.labels("ok").observe(timings["total_ms"] / 1000)
+            log.info(f"Resposta concluída: {timings}")
+            if use_sse:
+                yield sse_event("done", {**timings, **metrics})
+
+        return StreamingResponse(
+            event_generator(),
+            media_type="text/event-stream" if use_sse else "text/plain",
+            headers={"X-Conversation-Id": conversation_id} if conversation_id else None,
+        )
     
     except Exception as e:
         log.error(f"Erro ao processar a solicitação: {e}")
@@ -57,4 +162,19 @@ async def process_web_query(request: Request):
                 "message": "Não foi possível processar sua solicitação.",
             },
             status_code=500,
-        )
\ No newline at end of file
+        )
+
+
+@router.get("/metrics")
+async def chat_metrics():
+    """
+    Métricas do chat: hit-rate e latência economizada pelo cache de embeddings,
+    uso do cache semântico de respostas e tokens economizados na montagem do contexto
+    e na compactação do histórico.
+    """
+    return {
+        "embedding_cache": embedding_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "context": context_assembler.stats(),
+        "history": {**history_compactor.stats(), **conversation_store.stats()},
+    }
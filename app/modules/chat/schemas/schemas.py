@@ -0,0 +1,60 @@
+from datetime import datetime, timezone
+from pydantic import BaseModel, model_validator
+from typing import List, Optional, Set
+from app.modules.milvus.utils.milvus import quote_expr_value
+
+
+class SearchFilters(BaseModel):
+    """Filtros opcionais de /chat/ask, aplicados como expressão de filtro na busca do Milvus."""
+    file_names: Optional[List[str]] = None
+    page_from: Optional[int] = None
+    page_to: Optional[int] = None
+    # datas sem fuso são interpretadas como UTC
+    ingested_after: Optional[datetime] = None
+    ingested_before: Optional[datetime] = None
+
+    @model_validator(mode="after")
+    def check_ranges(self):
+        if self.page_from is not None and self.page_to is not None and self.page_from > self.page_to:
+            raise ValueError("page_from deve ser menor ou igual a page_to")
+        if self.ingested_after and self.ingested_before and _epoch(self.ingested_after) > _epoch(self.ingested_before):
+            raise ValueError("ingested_after deve ser anterior a ingested_before")
+        return self
+
+    def fields(self, page_end: bool = False) -> Set[str]:
+        """Campos do schema usados pelos filtros (`page_end`: ver `to_expr`)."""
+        fields = set()
+        if self.file_names:
+            fields.add("file_name")
+        if self.page_from is not None or self.page_to is not None:
+            fields.add("page")
+        if page_end and self.page_from is not None:
+            fields.add("page_end")
+        if self.ingested_after or self.ingested_before:
+            fields.add("ingested_at")
+        return fields
+
+    def to_expr(self, page_end: bool = False) -> Optional[str]:
+        """
+        Expressão de filtro do Milvus. Com `page_end` (coleções cujos chunks atravessam
+        páginas), o intervalo de páginas pega todo chunk que o toca: `page_end >= page_from`
+        e `page <= page_to`; em coleções antigas vale só a página inicial do chunk.
+        """
+        clauses = []
+        if self.file_names:
+            clauses.append(f"file_name in [{', '.join(quote_expr_value(name) for name in self.file_names)}]")
+        if self.page_from is not None:
+            clauses.append(f"{'page_end' if page_end else 'page'} >= {self.page_from}")
+        if self.page_to is not None:
+            clauses.append(f"page <= {self.page_to}")
+        if self.ingested_after:
+            clauses.append(f"ingested_at >= {_epoch(self.ingested_after)}")
+        if self.ingested_before:
+            clauses.append(f"ingested_at <= {_epoch(self.ingested_before)}")
+        return " and ".join(clauses) or None
+
+
+def _epoch(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
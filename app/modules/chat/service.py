@@ -1,64 +1,120 @@
+import asyncio
 import logging
-from app.modules.chat.dependencies import client, milvus_client
+from app.core.admission import Priority
+from app.core.metrics import CHAT_RETRIEVAL_SECONDS, timed
+from app.core.providers import provider_gateway
+from app.core.milvus_connection import milvus_manager
+from app.modules.milvus.utils.layout import resolve_search_target
+from app.modules.milvus.utils.residency import residency_manager
+from app.modules.chat.embedding_cache import embedding_cache
+from app.config.settings import settings
+from app.modules.chat.answer_cache import answer_cache, collections_key, context_fingerprint
+from app.modules.chat.retrieval import MODE_HYBRID, federated_retrieve, retrieval_config, retrieve
+from app.modules.chat.context import context_assembler
+from app.modules.chat.history import conversation_store, history_compactor
+from app.modules.milvus.utils.jobs import job_store
 import logging
 
 import datetime
 
 log = logging.getLogger(__name__)
 
-# Função para gerar embedding da pergunta
-def emb_text(text):
+EMBEDDING_MODEL = "text-embedding-3-large"
+CHAT_MODEL = "gpt-4.1-mini-2025-04-14"
+
+async def _create_embedding(text):
+    # hedge: se a API demorar mais que o p95 recente, uma segunda requisição corre junto
+    embeddings = await provider_gateway.embed_async(
+        [text], EMBEDDING_MODEL, Priority.INTERACTIVE, hedge=settings.CHAT_EMBEDDING_HEDGE
+    )
+    return embeddings[0]
+
+# Função para gerar embedding da pergunta (com cache e coalescência de perguntas repetidas)
+async def emb_text(text):
     try:
-        response = client.embeddings.create(input=text, model="text-embedding-3-large")
-        return response.data[0].embedding
+        return await embedding_cache.get_or_compute(EMBEDDING_MODEL, text, _create_embedding)
     except Exception as e:
         logging.error(f"Erro ao gerar embedding: {e}")
         raise e
     
 
+# Reenvia uma resposta do cache semântico como stream
+def replay_answer(answer, chunk_size=64):
+    for i in range(0, len(answer), chunk_size):
+        yield answer[i:i + chunk_size]
+
     
-def ask_question_stream(question, collection_name, context):  
-    # Consultar dados no Milvus
-    search_res = milvus_client.search(
-        collection_name=collection_name,
-        data=[emb_text(question)],
-        search_params={"metric_type": "IP", "params": {"nprobe": 16}},
-        limit=20,
-        output_fields=["text", "file_name", "page"], 
+async def ask_question_stream(question, collection_name, context, metrics=None, conversation_id=None, filters=None):  
+    # `metrics` (opcional) recebe os relatórios da montagem do contexto e do histórico (tokens economizados).
+    # Com `conversation_id`, o histórico fica no servidor e o cliente pode omitir `context`;
+    # `context` só semeia a conversa quando o servidor não a tem (expirou ou reiniciou).
+    # `filters` (SearchFilters) restringe a busca por arquivo, páginas ou data de ingestão.
+    history = history_compactor.clean(context, question)
+    if conversation_id:
+        stored = conversation_store.get(conversation_id)
+        if stored:
+            history = stored
+        elif history:
+            conversation_store.replace(conversation_id, history)
+
+    # Uma coleção ou várias (busca federada: todas ao mesmo tempo, ranking global e citação da origem)
+    names = [collection_name] if isinstance(collection_name, str) else list(collection_name)
+    federated = len(names) > 1
+    cache_key = collections_key(names)
+    # versão de ingestão das coleções, lida antes da busca: a resposta gerada com o
+    # contexto atual não é guardada sob uma versão mais nova
+    cache_version = tuple((await asyncio.to_thread(job_store.collection_versions, names)).items())
+
+    async def retrieve_context():
+        with timed(CHAT_RETRIEVAL_SECONDS):
+            query_vector = await emb_text(question)
+            if federated:
+                results, sources = await federated_retrieve(
+                    names, question, query_vector, settings.CHAT_FEDERATED_DEADLINE, settings.CHAT_FEDERATED_LIMIT, filters
+                )
+                return query_vector, MODE_HYBRID, results, sources
+
+            # Consultar dados no Milvus (no layout particionado, filtra pelo tenant);
+            # busca híbrida (vetor + BM25) ou só densa, conforme a configuração da coleção
+            target = resolve_search_target(names[0])
+            async with residency_manager.use(milvus_manager.client, target.collection_name):
+                mode, results = await retrieve(target, question, query_vector, retrieval_config(target.name), filters)
+            return query_vector, mode, results, None
+
+    # a busca e a compactação do histórico (que pode chamar o modelo para resumir) rodam juntas
+    (query_vector, mode, filtered_results, sources), (history_messages, history_report) = await asyncio.gather(
+        retrieve_context(),
+        history_compactor.compact(history, conversation_id),
     )
+    score_label = "relevância" if mode == MODE_HYBRID else "similaridade"
+    log.info("Histórico compactado: %s", history_report)
+    if metrics is not None:
+        metrics["history"] = history_report
+        if sources is not None:
+            metrics["sources"] = sources
 
-    retrieved_items = []
-    for res in search_res[0]:
-        entity = res["entity"]
-        text = entity["text"]
-        distance = res["distance"]
-        file_name = entity.get("file_name", "desconhecido")
-        page = entity.get("page")
-        retrieved_items.append((text, distance, file_name, page))
-    
-    retrieved_items.sort(key=lambda x: x[1], reverse=True)
-
-    if retrieved_items:
-        top_score = retrieved_items[0][1]
-        threshold = max(0.2, top_score * 0.6)
-        filtered_results = [
-            (text, dist, file_name, page)
-            for (text, dist, file_name, page) in retrieved_items
-            if dist > threshold
-        ]
-    else:
-        filtered_results = []
-
-    selected_contexts = []
-    for text, dist, file_name, page in filtered_results:
-        extra = []
-        if file_name:
-            extra.append(f"arquivo='{file_name}'")
-        if page is not None:
-            extra.append(f"página={page}")
-        meta_str = ", ".join(extra)
-        context_entry = f"Trecho (similaridade={dist:.4f}{', ' + meta_str if meta_str else ''}):\n{text}"
-        selected_contexts.append(context_entry)
+    # Pergunta sem conversa anterior e mesmo contexto recuperado: reaproveita a resposta
+    fingerprint = context_fingerprint((item.source, item.id) for item in filtered_results)
+    cacheable = not any(message["role"] == "assistant" for message in history)
+    if cacheable:
+        cached_answer = answer_cache.lookup(cache_key, query_vector, fingerprint, cache_version)
+        if cached_answer is not None:
+            log.info("Resposta servida pelo cache semântico de '%s'", cache_key)
+            for piece in replay_answer(cached_answer):
+                yield piece
+            if conversation_id:
+                conversation_store.append(
+                    conversation_id,
+                    {"role": "user", "content": question},
+                    {"role": "assistant", "content": cached_answer},
+                )
+            return
+
+    # Junta chunks sobrepostos de páginas vizinhas, descarta quase-duplicatas e respeita o orçamento de tokens
+    selected_contexts, context_report = context_assembler.assemble(filtered_results, score_label)
+    log.info("Montagem do contexto: %s", context_report)
+    if metrics is not None:
+        metrics["context"] = context_report
 
     if not selected_contexts:
         milvus_context = "Nenhum contexto relevante encontrado no banco de dados."
@@ -69,25 +125,40 @@ def ask_question_stream(question, collection_name, context):
 
     # Criar prompt do usuário com contexto relevante
     SYSTEM_PROMPT = "Você é um assistente que só responde sobre a base de conhecimento" 
+    if federated:
+        SYSTEM_PROMPT += ". Os trechos vêm de várias coleções: cite a coleção, o arquivo e a página de cada informação"
     conhecimento = f"\n\n Base de Conhecimento:\n + {milvus_context}"
     if SYSTEM_PROMPT is None:
         raise KeyError("The key 'prompt' is missing from the dictionary.")
 
-    # Realiza a chamada ao modelo com stream=True
-    response = client.chat.completions.create(
-        model="gpt-4.1-mini-2025-04-14",
+    # Realiza a chamada ao modelo em streaming pelo gateway (prioridade do chat, retry
+    # até o stream abrir); a vaga no orçamento da OpenAI fica ocupada até o fim do stream
+    full_answer = []
+    async with provider_gateway.stream_async(
+        Priority.INTERACTIVE,
+        model=CHAT_MODEL,
         messages=[
             {"role": "system", "content": SYSTEM_PROMPT},
-            *context,          
+            *history_messages,
             {"role": "user", "content": question + conhecimento} ,
         ],
-        stream=True,
         temperature=0.0,
-    )
+    ) as response:
+        # Itera sobre os chunks do stream e yield o conteúdo conforme recebido.
+        # Se o cliente desconectar, a task é cancelada e o gateway fecha o stream upstream.
+        async for chunk in response:
+            # Cada chunk pode ter uma estrutura parcial na chave "delta"
+            content = chunk.choices[0].delta.content
+            if content:
+                full_answer.append(content)
+                yield content
 
-    # Itera sobre os chunks do stream e yield o conteúdo conforme recebido
-    for chunk in response:
-        # Cada chunk pode ter uma estrutura parcial na chave "delta"
-        content = chunk.choices[0].delta.content
-        if content:
-            yield content
+    answer = "".join(full_answer)
+    if conversation_id:
+        conversation_store.append(
+            conversation_id,
+            {"role": "user", "content": question},
+            {"role": "assistant", "content": answer},
+        )
+    if cacheable:
+        answer_cache.store(cache_key, query_vector, fingerprint, answer, cache_version)
@@ -1,3 +1,6 @@
+import json
+import time
+import uuid
 import streamlit as st
 import requests
 
@@ -6,6 +9,9 @@ st.set_page_config(page_title="TCC - Scraping & Chat", layout="wide")
 
 API_BASE = "http://localhost:8080"
 PAGES = ["Scraping", "Chat"]
+# segundos na fila (ou sem eventos do SSE) antes de parar de esperar ou reconsultar o job
+JOB_QUEUE_TIMEOUT = 30
+JOB_WAIT_TIMEOUT = 30 * 60
 
 # Inicialização do session_state
 for key, default in {
@@ -23,18 +29,77 @@ for key, default in {
 if 'chat_histories' not in st.session_state:
     st.session_state.chat_histories = {}
 
+# Id da conversa de cada coleção: o backend guarda o histórico, então só a pergunta nova é enviada
+if 'conversation_ids' not in st.session_state:
+    st.session_state.conversation_ids = {}
+
 # Funções auxiliares
 def ensure_history():
     """Garante que exista uma lista para a coleção selecionada."""
     col = st.session_state.selected_collection
     if col and col not in st.session_state.chat_histories:
         st.session_state.chat_histories[col] = []
+        st.session_state.conversation_ids[col] = str(uuid.uuid4())
+
+def show_job_progress(bar, progress: dict):
+    """Atualiza a barra com a etapa atual do job (contagens e ETA)."""
+    stage = progress["current_stage"]
+    if stage:
+        counts = progress["stages"][stage]
+        fraction = counts["done"] / counts["total"] if counts["total"] else 0.0
+        eta = progress["eta_seconds"]
+        text = f"{stage}: {counts['done']}/{counts['total'] or '?'} {counts['unit']}"
+        if eta is not None:
+            text += f" · ~{eta:.0f}s restantes"
+        bar.progress(min(fraction, 1.0), text=text)
+
+def wait_for_job(job_id: str) -> dict:
+    """
+    Acompanha o job de ingestão pelo SSE de eventos, com barra de progresso por etapa.
+    Para de acompanhar (e devolve o último estado) se o job continuar na fila depois de
+    JOB_QUEUE_TIMEOUT segundos ou não terminar em JOB_WAIT_TIMEOUT segundos.
+    """
+    bar = st.progress(0.0, text="Na fila…")
+    job = {"id": job_id, "status": "queued"}
+    started = time.monotonic()
+    while time.monotonic() - started < JOB_WAIT_TIMEOUT:
+        try:
+            # o SSE só manda evento quando o progresso muda: o timeout de leitura marca o silêncio
+            with requests.get(
+                f"{API_BASE}/milvus/jobs/{job_id}/events", stream=True, timeout=(10, JOB_QUEUE_TIMEOUT)
+            ) as resp:
+                resp.raise_for_status()
+                event = None
+                for line in resp.iter_lines(decode_unicode=True):
+                    if line.startswith("event:"):
+                        event = line[len("event:"):].strip()
+                    elif line.startswith("data:"):
+                        job.update(json.loads(line[len("data:"):]))
+                        if event in ("done", "error"):
+                            bar.empty()
+                            return job
+                        show_job_progress(bar, job["progress"])
+                        if job["status"] == "queued" and time.monotonic() - started > JOB_QUEUE_TIMEOUT:
+                            break
+        except requests.exceptions.ConnectionError:
+            # sem eventos por JOB_QUEUE_TIMEOUT segundos; se a API caiu, o GET abaixo levanta o erro
+            resp = requests.get(f"{API_BASE}/milvus/jobs/{job_id}", timeout=30)
+            resp.raise_for_status()
+            job = resp.json()
+            if job["status"] in ("succeeded", "failed"):
+                bar.empty()
+                return job
+        if job["status"] == "queued":
+            break
+    bar.empty()
+    return job
 
 def new_conversation():
     """Inicia nova conversa, limpando só o histórico da coleção atual."""
     col = st.session_state.selected_collection
     if col:
         st.session_state.chat_histories[col] = []
+        st.session_state.conversation_ids[col] = str(uuid.uuid4())
 
 # Sidebar de navegação
 st.sidebar.title("Navegação")
@@ -92,24 +157,33 @@ if st.session_state.active_page == 'Scraping':
 
     if st.session_state.selected_links:
         if st.button("🚀 Inserir selecionados"):
-            with st.spinner("Inserindo no Milvus…"):
-                try:
-                    insert_resp = requests.post(
-                        f"{API_BASE}/milvus/insert",
-                        json={
-                            "links": st.session_state.selected_links,
-                            "folder_name": folder_name
-                        },
-                        timeout=120
-                    )
-                    insert_resp.raise_for_status()
-                    st.success("Inserção concluída com sucesso!")
+            try:
+                # a API só enfileira o job; o andamento é acompanhado pelo SSE de eventos
+                insert_resp = requests.post(
+                    f"{API_BASE}/milvus/insert",
+                    json={
+                        "links": st.session_state.selected_links,
+                        "folder_name": folder_name
+                    },
+                    timeout=30
+                )
+                insert_resp.raise_for_status()
+                job_id = insert_resp.json()["job_id"]
+                job = wait_for_job(job_id)
+                if job["status"] == "succeeded":
+                    st.success(f"Inserção concluída com sucesso! ({job['result'].get('rows', 0)} trechos)")
                     # define coleção padrão para chat
                     st.session_state.collection_name = f"_{folder_name}_"
                     st.session_state.scraped_links.clear()
                     st.session_state.selected_links.clear()
-                except Exception as e:
-                    st.error(f"Erro ao inserir: {e}")
+                elif job["status"] == "queued":
+                    st.info(f"Job {job_id} na fila, aguardando um worker; acompanhe em /milvus/jobs/{job_id}.")
+                elif job["status"] == "running":
+                    st.info(f"Job {job_id} ainda em andamento; acompanhe em /milvus/jobs/{job_id}.")
+                else:
+                    st.error(f"Erro ao inserir: {job.get('error')} (job {job_id}, pode ser retomado)")
+            except Exception as e:
+                st.error(f"Erro ao inserir: {e}")
 
 # === Página de Chat ===
 else:
@@ -165,7 +239,7 @@ else:
                     json={
                         "collection": col,
                         "question": user_input,
-                        "messages": history
+                        "conversation_id": st.session_state.conversation_ids[col]
                     },
                     timeout=60,
                     stream=True
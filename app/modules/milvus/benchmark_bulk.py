@@ -0,0 +1,149 @@
+"""
+Compara a carga normal de chunks (append: lotes de BATCH_SIZE linhas com
+`insert_batch_to_milvus`, coleção com consistência Strong e índices criados antes)
+com o modo bulk (BulkLoader com os índices adiados até o fim da carga), sobre as
+mesmas `--rows` linhas sintéticas. Exemplo:
+
+    MILVUS_URL=/tmp/bench.db python -m app.modules.milvus.benchmark_bulk --rows 20000
+
+Sem MILVUS_BULK_BUCKET o bulk insere em lotes de MILVUS_BULK_INSERT_BATCH linhas com
+um único flush; com o bucket configurado (Milvus standalone e pacote `minio`), grava
+Parquet e usa o bulk import. Os embeddings ficam de fora: só a carga é medida. As
+coleções do benchmark (prefixo `bench_bulk_`) são removidas no fim, salvo com --keep.
+"""
+import json
+import time
+import asyncio
+import argparse
+from typing import Any, Dict, Iterator, List
+import numpy as np
+from app.config.settings import settings
+from app.core.logging import configure_logging
+from app.core.milvus_connection import milvus_manager
+from app.modules.milvus.utils.bulk import BulkLoader
+from app.modules.milvus.utils.milvus import (
+    BATCH_SIZE,
+    build_collection_indexes,
+    get_collection_fields,
+    insert_batch_to_milvus,
+    prepare_milvus_collection,
+)
+
+PREFIX = "bench_bulk_"
+DIMENSIONS = 3072
+# linhas entregues de cada vez à carga, como os batches de embeddings da ingestão
+EMBED_BATCH = 100
+
+
+def _batches(count: int, seed: int) -> Iterator[List[Dict[str, Any]]]:
+    """Linhas sintéticas em lotes de EMBED_BATCH; a mesma semente gera as mesmas linhas."""
+    rng = np.random.default_rng(seed)
+    for start in range(0, count, EMBED_BATCH):
+        vectors = rng.standard_normal((min(EMBED_BATCH, count - start), DIMENSIONS), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        yield [
+            {
+                "vector": vector.tolist(),
+                "text": f"trecho sintético {index}",
+                "doc_id": f"doc-{index}",
+                "file_name": f"arquivo_{index // 100}.pdf",
+                "page": index % 100 + 1,
+                "page_end": index % 100 + 1,
+                "ingested_at": 0,
+                "occurrences": [],
+            }
+            for index, vector in enumerate(vectors, start)
+        ]
+
+
+async def _append(client, collection_name: str, args) -> Dict[str, Any]:
+    """Caminho normal da ingestão: índices criados com a coleção e lotes de BATCH_SIZE linhas."""
+    await prepare_milvus_collection(client, collection_name)
+    load_seconds = 0.0
+
+    async def insert(batch: List[Dict[str, Any]]) -> float:
+        started = time.perf_counter()
+        if not await insert_batch_to_milvus(client, collection_name, batch):
+            raise RuntimeError(f"Falha ao inserir um batch em '{collection_name}'")
+        return time.perf_counter() - started
+
+    pending: List[Dict[str, Any]] = []
+    for rows in _batches(args.rows, args.seed):
+        pending.extend(rows)
+        while len(pending) >= BATCH_SIZE:
+            load_seconds += await insert(pending[:BATCH_SIZE])
+            del pending[:BATCH_SIZE]
+    if pending:
+        load_seconds += await insert(pending)
+    return {"load_seconds": round(load_seconds, 2), "rows_per_sec": round(args.rows / load_seconds, 1)}
+
+
+async def _bulk(client, collection_name: str, args) -> Dict[str, Any]:
+    """Modo bulk: coleção sem índices, carga pelo BulkLoader e índices criados no fim."""
+    await prepare_milvus_collection(client, collection_name, build_index=False)
+    loader = BulkLoader(client, collection_name, await get_collection_fields(client, collection_name))
+    load_seconds = 0.0
+    for rows in _batches(args.rows, args.seed):
+        started = time.perf_counter()
+        await loader.add_rows(rows)
+        load_seconds += time.perf_counter() - started
+    started = time.perf_counter()
+    progress = await loader.finish()
+    load_seconds += time.perf_counter() - started
+    started = time.perf_counter()
+    await build_collection_indexes(collection_name)
+    return {
+        "load_seconds": round(load_seconds, 2),
+        "rows_per_sec": round(args.rows / load_seconds, 1),
+        "index_seconds": round(time.perf_counter() - started, 2),
+        "bulk_mode": progress["mode"],
+        "rows_imported": progress["rows_imported"],
+    }
+
+
+def _drop(client) -> None:
+    for name in client.list_collections():
+        if name.startswith(PREFIX):
+            client.drop_collection(name)
+
+
+async def benchmark(args) -> Dict[str, Any]:
+    client = milvus_manager.client
+    if args.bulk_batch:
+        settings.MILVUS_BULK_INSERT_BATCH = args.bulk_batch
+    _drop(client)
+    results = {}
+    try:
+        for mode, run in (("append", _append), ("bulk", _bulk)):
+            collection_name = f"{PREFIX}{mode}"
+            results[mode] = await run(client, collection_name, args)
+            # as duas cargas precisam terminar com todas as linhas consultáveis
+            await asyncio.to_thread(client.load_collection, collection_name)
+            stats = await asyncio.to_thread(client.query, collection_name, output_fields=["count(*)"])
+            results[mode]["count"] = stats[0]["count(*)"]
+    finally:
+        if not args.keep:
+            _drop(client)
+
+    append, bulk = results["append"]["rows_per_sec"], results["bulk"]["rows_per_sec"]
+    return {
+        "rows": args.rows,
+        "bulk_insert_batch": None if results["bulk"]["bulk_mode"] == "import" else settings.MILVUS_BULK_INSERT_BATCH,
+        "modes": results,
+        "bulk_speedup": round(bulk / append, 2) if append else None,
+    }
+
+
+def main():
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Carga normal (append) x modo bulk, em linhas/s.")
+    parser.add_argument("--rows", type=int, default=20000, help="Linhas sintéticas carregadas em cada modo")
+    parser.add_argument("--bulk-batch", type=int, help="Linhas por insert no bulk sem bucket (padrão: MILVUS_BULK_INSERT_BATCH)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="Não remove as coleções do benchmark no fim")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(benchmark(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compara o chunker estruturado com o split_text antigo (por página, em caracteres).
+
+Exemplo:
+
+    python -m app.modules.milvus.benchmark_chunking edital.pdf planilha.xlsx --repeat 3
+
+As páginas são extraídas com o OCRService, como na ingestão (PDFs sem texto caem
+no OCR). Para cada chunker reporta o throughput em MB/s (só o chunking, melhor de
+`--repeat` execuções), o número de chunks, tokens por chunk (média, p5, p95) e
+quantos chunks ficaram pequenos (< SMALL_CHUNK_TOKENS).
+"""
+import json
+import time
+import argparse
+from typing import Callable, Dict, List, Any, Tuple
+import numpy as np
+from app.core.logging import configure_logging
+from app.core.tokens import count_tokens
+from app.modules.milvus.utils.ocr import OCRService
+from app.modules.milvus.utils.embbeding import split_text
+from app.modules.milvus.utils.chunking import chunker
+
+SMALL_CHUNK_TOKENS = 64
+
+Pages = List[Tuple[int, str]]
+
+
+def legacy_chunks(pages: Pages) -> List[str]:
+    return [chunk for _, text in pages for chunk in split_text(text)]
+
+
+def structured_chunks(pages: Pages) -> List[str]:
+    return [chunk.text for chunk in chunker.chunk(pages)]
+
+
+CHUNKERS: Dict[str, Callable[[Pages], List[str]]] = {
+    "legacy": legacy_chunks,
+    "structured": structured_chunks,
+}
+
+
+def benchmark(documents: List[Pages], repeat: int) -> Dict[str, Any]:
+    size_mb = sum(len(text.encode("utf-8")) for pages in documents for _, text in pages) / (1024 * 1024)
+    report = {}
+    for name, split in CHUNKERS.items():
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            chunks = [chunk for pages in documents for chunk in split(pages)]
+            best = min(best, time.perf_counter() - started)
+
+        tokens = np.array([count_tokens(chunk) for chunk in chunks] or [0])
+        report[name] = {
+            "chunks": len(chunks),
+            "mb_per_sec": round(size_mb / best, 2) if best else None,
+            "tokens_mean": round(float(tokens.mean()), 1),
+            "tokens_p5": int(np.percentile(tokens, 5)),
+            "tokens_p95": int(np.percentile(tokens, 95)),
+            "small_chunks": int((tokens < SMALL_CHUNK_TOKENS).sum()),
+        }
+    return {"size_mb": round(size_mb, 3), "results": report}
+
+
+def main():
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Compara throughput e número de chunks dos chunkers.")
+    parser.add_argument("files", nargs="+", help="Arquivos a extrair e dividir em chunks")
+    parser.add_argument("--repeat", type=int, default=3, help="Execuções por chunker (vale a melhor)")
+    args = parser.parse_args()
+
+    ocr = OCRService()
+    documents = []
+    for path in args.files:
+        result = ocr.process_file(file_path=path)
+        documents.append([(page["page_number"], page["content"]) for page in result["pages"]])
+
+    report = benchmark(documents, args.repeat)
+    print(json.dumps({"files": len(documents), **report}, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
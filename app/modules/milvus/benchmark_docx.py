@@ -0,0 +1,104 @@
+"""
+Compara a extração de .docx em streaming (lxml iterparse) com a anterior (python-docx).
+
+Gera documentos sintéticos com headings, parágrafos e tabelas (com células
+mescladas), mede tempo e pico de memória de cada extrator (cada um em um processo
+próprio, pelo aumento do RSS máximo) e confere se o texto extraído é o mesmo. Exemplo:
+
+    python -m app.modules.milvus.benchmark_docx --sections 200 --rows 100 --repeat 3
+
+Os documentos de teste não têm quebras de página, para que as duas saídas
+(uma página só, no extrator anterior) sejam comparáveis.
+"""
+import os
+import json
+import time
+import random
+import resource
+import argparse
+import tempfile
+import multiprocessing
+from typing import Dict, Any
+import docx
+from app.core.logging import configure_logging
+from app.modules.milvus.utils.ocr import OCRService
+
+WORDS = (
+    "contrato licitação prefeitura municipal valor pagamento serviço empresa processo "
+    "artigo lei decreto secretaria cláusula prazo vigência multa garantia objeto"
+).split()
+
+
+def _sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30))).capitalize() + "."
+
+
+def generate_docx(path: str, sections: int, rows: int, columns: int = 5, seed: int = 0) -> None:
+    """Documento com `sections` seções (heading, parágrafos e uma tabela de `rows` linhas)."""
+    rng = random.Random(seed)
+    document = docx.Document()
+    for section in range(sections):
+        document.add_heading(f"Seção {section + 1}", level=1 + section % 3)
+        for _ in range(rng.randint(3, 10)):
+            document.add_paragraph(" ".join(_sentence(rng) for _ in range(rng.randint(1, 6))))
+        table = document.add_table(rows=rows, cols=columns)
+        for row in table.rows:
+            for cell in row.cells:
+                cell.text = rng.choice(WORDS) + f" {rng.randint(1, 9999)}"
+        # mesclas horizontais e verticais, como nos quadros de contratos
+        table.cell(0, 0).merge(table.cell(0, 1))
+        table.cell(1, columns - 1).merge(table.cell(min(rows - 1, 4), columns - 1))
+    document.save(path)
+
+
+def _measure(method: str, path: str, repeat: int) -> Dict[str, Any]:
+    """Roda no processo filho: melhor tempo e aumento do RSS máximo (inclui o parse do XML pelo lxml)."""
+    extract = getattr(OCRService(), method)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        pages = extract(path)
+        best = min(best, time.perf_counter() - started)
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "seconds": round(best, 3),
+        "peak_rss_mb": round((rss_peak - rss_before) / 1024, 1),
+        "pages": pages,
+    }
+
+
+def benchmark(sections: int, rows: int, repeat: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "benchmark.docx")
+        generate_docx(path, sections, rows)
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+
+        results = {}
+        for method in ("_extract_text_from_docx_legacy", "_extract_text_from_docx"):
+            with multiprocessing.get_context("spawn").Pool(1) as pool:
+                results[method] = pool.apply(_measure, (method, path, repeat))
+        legacy, streaming = results["_extract_text_from_docx_legacy"], results["_extract_text_from_docx"]
+
+    same_output = [p["content"] for p in legacy.pop("pages")] == [p["content"] for p in streaming.pop("pages")]
+    return {
+        "file_mb": round(size_mb, 2),
+        "python_docx": legacy,
+        "streaming": streaming,
+        "speedup": round(legacy["seconds"] / streaming["seconds"], 1) if streaming["seconds"] else None,
+        "same_output": same_output,
+    }
+
+
+def main():
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Tempo e memória da extração de .docx (streaming x python-docx).")
+    parser.add_argument("--sections", type=int, default=200, help="Seções (heading + parágrafos + tabela)")
+    parser.add_argument("--rows", type=int, default=100, help="Linhas por tabela")
+    parser.add_argument("--repeat", type=int, default=3, help="Execuções por extrator (vale a melhor)")
+    args = parser.parse_args()
+    print(json.dumps(benchmark(args.sections, args.rows, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
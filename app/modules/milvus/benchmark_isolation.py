@@ -0,0 +1,220 @@
+"""
+Mede a latência do /chat/ask enquanto uma ingestão grande roda, com a ingestão no
+processo da API (como era antes do app.worker) e num processo `app.worker` separado.
+
+Tudo passa pelo caminho real: a API (app.main, com o lifespan) atende o /chat/ask no
+próprio processo do benchmark, via ASGI; a ingestão é um job do JobStore, executado
+pelo IngestionService no processo da API (modo "inline") ou reivindicado por um
+`app.worker` (modo "worker"). A OpenAI é o servidor falso (app.core.fake_provider, em
+outro processo) e o PDF sintético é servido por HTTP local para o download do job.
+Enquanto a ingestão roda, uma pergunta diferente vai ao /chat/ask a cada `--interval`
+segundos e a latência da resposta inteira é registrada. Exemplo:
+
+    MILVUS_URL=/tmp/bench.db python -m app.modules.milvus.benchmark_isolation --pages 300
+
+Com o Milvus Lite (MILVUS_URL é um arquivo), que só pode ser aberto por um processo,
+a API e o worker usam bancos separados no diretório temporário; com Milvus
+standalone, os dois usam o mesmo servidor.
+
+O esperado é p95 do modo "worker" próximo do "baseline" e o do modo "inline" bem acima.
+"""
+import os
+import json
+import time
+import socket
+import asyncio
+import argparse
+import itertools
+import tempfile
+import functools
+import statistics
+import threading
+import multiprocessing
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+import httpx
+import uvicorn
+from app.core.fake_provider import FakeProvider
+
+CHAT_FOLDER = "benchmark_chat"
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve_provider(port: int, latency: float) -> None:
+    uvicorn.run(FakeProvider(latency).create_app(), host="127.0.0.1", port=port, log_level="warning")
+
+
+def _serve_files(directory: str) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _wait_for(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def _summary(latencies: List[float], seconds: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    quantiles = statistics.quantiles(ordered, n=100, method="inclusive") if len(ordered) > 1 else ordered * 99
+    return {
+        "requests": len(ordered),
+        "seconds": round(seconds, 2),
+        "p50_ms": round(quantiles[49], 2),
+        "p95_ms": round(quantiles[94], 2),
+        "p99_ms": round(quantiles[98], 2),
+        "max_ms": round(ordered[-1], 2),
+    }
+
+
+# perguntas diferentes em todo o benchmark: sem acerto nos caches de embedding e de respostas
+_questions = itertools.count(1)
+
+
+async def _probe(client: httpx.AsyncClient, interval: float, running) -> List[float]:
+    """Pergunta ao /chat/ask a cada `interval` enquanto `running()` e devolve as latências (ms)."""
+    latencies = []
+    while running():
+        await asyncio.sleep(interval)
+        index = next(_questions)
+        started = time.perf_counter()
+        response = await client.post(
+            "/chat/ask",
+            json={"collection": f"_{CHAT_FOLDER}_", "question": f"Qual o prazo do contrato {index}?"},
+        )
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+async def _measure(args, pdf_url: str, worker_milvus_url: str) -> Dict[str, Any]:
+    # importados aqui: as variáveis de ambiente do benchmark precisam valer antes do import
+    from app.main import app, lifespan
+    from app.core.milvus_connection import milvus_manager
+    from app.modules.milvus.schemas.schemas import InsertDto
+    from app.modules.milvus.services.ingestion_service import IngestionService
+    from app.modules.milvus.utils.jobs import TERMINAL_STATUSES, JobKind, job_store
+    from app.worker import run_worker
+
+    service = IngestionService(job_store)
+    results: Dict[str, Any] = {}
+    async with lifespan(app):
+        # coleção consultada pelo chat, com um PDF pequeno
+        await service.insert(milvus_manager.client, InsertDto(links=[f"{pdf_url}/chat.pdf"], folder_name=CHAT_FOLDER))
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://api", timeout=60) as client:
+            warmup = iter(range(5))
+            await _probe(client, 0.0, lambda: next(warmup, None) is not None)
+
+            started = time.perf_counter()
+            latencies = await _probe(client, args.interval, lambda: time.perf_counter() - started < args.seconds)
+            results["baseline"] = _summary(latencies, time.perf_counter() - started)
+
+            # a ingestão roda no event loop da API (OCR e chunking em threads do mesmo processo)
+            dto = InsertDto(links=[f"{pdf_url}/ingest.pdf"], folder_name="benchmark_inline")
+            started = time.perf_counter()
+            task = asyncio.create_task(service.insert(milvus_manager.client, dto))
+            latencies = await _probe(client, args.interval, lambda: not task.done())
+            result = await task
+            results["inline"] = {**_summary(latencies, time.perf_counter() - started), "rows": result.get("rows")}
+
+            # o job vai para a fila e um app.worker em outro processo o executa
+            dto = InsertDto(links=[f"{pdf_url}/ingest.pdf"], folder_name="benchmark_worker")
+            job_id = service.submit(dto)
+            environ = dict(os.environ)
+            os.environ["MILVUS_URL"] = worker_milvus_url
+            process = multiprocessing.get_context("spawn").Process(target=run_worker, args=([JobKind.INGESTION.value],))
+            process.start()
+            os.environ.clear()
+            os.environ.update(environ)
+            started = time.perf_counter()
+            job = {"status": None}
+
+            def running() -> bool:
+                job.update(job_store.get(job_id))
+                return job["status"] not in TERMINAL_STATUSES
+
+            latencies = await _probe(client, args.interval, running)
+            results["worker"] = {
+                **_summary(latencies, time.perf_counter() - started),
+                "status": job["status"],
+                "rows": (job["result"] or {}).get("rows"),
+            }
+            process.terminate()
+            process.join()
+    return results
+
+
+def benchmark(args) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        port = _free_port()
+        milvus_url = os.environ.get("MILVUS_URL", "")
+        standalone = milvus_url.startswith(("http://", "https://", "tcp://"))
+        os.environ.update({
+            "MILVUS_URL": milvus_url if standalone else os.path.join(tmp, "api.db"),
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{port}/v1",
+            "MISTRAL_SERVER_URL": f"http://127.0.0.1:{port}",
+            "INGEST_JOBS_DB_PATH": os.path.join(tmp, "jobs.db"),
+            "INGEST_JOBS_DIR": os.path.join(tmp, "jobs"),
+            "INGEST_WORKER_POLL_INTERVAL": "0.2",
+        })
+        # importado depois das variáveis de ambiente (carrega as settings)
+        from app.modules.milvus.benchmark_pdf import generate_pdf
+
+        generate_pdf(os.path.join(tmp, "chat.pdf"), 5)
+        generate_pdf(os.path.join(tmp, "ingest.pdf"), args.pages, seed=1)
+        files = _serve_files(tmp)
+        provider = multiprocessing.get_context("spawn").Process(target=_serve_provider, args=(port, args.latency), daemon=True)
+        provider.start()
+        try:
+            _wait_for(f"http://127.0.0.1:{port}/stats")
+            worker_milvus_url = milvus_url if standalone else os.path.join(tmp, "worker.db")
+            modes = asyncio.run(_measure(args, f"http://127.0.0.1:{files.server_port}", worker_milvus_url))
+        finally:
+            provider.terminate()
+            provider.join()
+            files.shutdown()
+
+    baseline = modes["baseline"]["p95_ms"]
+    for result in modes.values():
+        result["p95_vs_baseline"] = round(result["p95_ms"] / baseline, 2) if baseline else None
+    return {
+        "pages": args.pages,
+        "cpus": os.cpu_count(),
+        "interval_ms": args.interval * 1000,
+        "provider_latency_ms": args.latency * 1000,
+        "milvus": "standalone" if standalone else "lite (bancos separados para API e worker)",
+        "modes": modes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência do /chat/ask durante uma ingestão no processo da API e num app.worker.")
+    parser.add_argument("--pages", type=int, default=300, help="Páginas do PDF ingerido")
+    parser.add_argument("--interval", type=float, default=0.05, help="Segundos entre perguntas ao /chat/ask")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duração da medição sem ingestão (baseline)")
+    parser.add_argument("--latency", type=float, default=0.02, help="Latência do provedor falso (s)")
+    args = parser.parse_args()
+    print(json.dumps(benchmark(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Compara os dois layouts de armazenamento com muitas pastas: uma coleção `_<pasta>_`
+por pasta x uma coleção compartilhada com partition key `tenant`. Para cada layout,
+cria as coleções (schema e índices da aplicação), insere `--rows` chunks sintéticos
+por pasta, carrega tudo na memória e faz `--queries` buscas densas em pastas
+sorteadas (no particionado, filtrando pelo tenant). Exemplo:
+
+    MILVUS_URL=http://localhost:19530 python -m app.modules.milvus.benchmark_layout --tenants 1000 --rows 20
+
+Requer Milvus standalone/cluster: o Milvus Lite não filtra por partition key. As
+coleções do benchmark (prefixo `bench_layout_`) são removidas no fim, salvo com --keep.
+O esperado é criação e carga bem mais rápidas no particionado, com latência de busca
+parecida.
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from typing import Any, Callable, Dict, List
+import numpy as np
+from app.core.logging import configure_logging
+from app.core.milvus_connection import milvus_manager
+from app.modules.chat.retrieval import CANDIDATES, DENSE_SEARCH_PARAMS
+from app.modules.milvus.utils.milvus import BATCH_SIZE, is_milvus_lite, prepare_milvus_collection, quote_expr_value
+
+PREFIX = "bench_layout_"
+DIMENSIONS = 3072
+
+
+def _vectors(rng: np.random.Generator, count: int) -> np.ndarray:
+    vectors = rng.standard_normal((count, DIMENSIONS), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _rows(rng: np.random.Generator, tenant: str, count: int, partitioned: bool) -> List[Dict[str, Any]]:
+    rows = []
+    for index, vector in enumerate(_vectors(rng, count)):
+        row = {
+            "vector": vector.tolist(),
+            "text": f"trecho {index} da pasta {tenant}",
+            "doc_id": f"{tenant}-{index}",
+            "file_name": f"{tenant}.pdf",
+            "page": index + 1,
+            "page_end": index + 1,
+            "ingested_at": 0,
+            "occurrences": [],
+        }
+        if partitioned:
+            row["tenant"] = tenant
+        rows.append(row)
+    return rows
+
+
+def _timed(function: Callable, *args, **kwargs) -> float:
+    started = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - started
+
+
+def _quantiles(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    quantiles = statistics.quantiles(ordered, n=100) if len(ordered) > 1 else ordered * 99
+    return {
+        "p50_ms": round(quantiles[49] * 1000, 2),
+        "p95_ms": round(quantiles[94] * 1000, 2),
+        "p99_ms": round(quantiles[98] * 1000, 2),
+    }
+
+
+def _run_layout(client, tenants: List[str], rows: int, queries: int, partitioned: bool, seed: int) -> Dict[str, Any]:
+    rng = np.random.default_rng(seed)
+    shared = f"{PREFIX}shared"
+    names = [shared] if partitioned else [f"{PREFIX}{index}" for index in range(len(tenants))]
+
+    started = time.perf_counter()
+    for name in names:
+        asyncio.run(prepare_milvus_collection(client, name, partition_key=partitioned))
+    create_seconds = time.perf_counter() - started
+
+    insert_seconds = 0.0
+    if partitioned:
+        # lotes de BATCH_SIZE linhas misturando tenants, como a coleção compartilhada recebe
+        pending: List[Dict[str, Any]] = []
+        for tenant in tenants:
+            pending.extend(_rows(rng, tenant, rows, partitioned=True))
+            while len(pending) >= BATCH_SIZE:
+                insert_seconds += _timed(client.insert, collection_name=shared, data=pending[:BATCH_SIZE])
+                pending = pending[BATCH_SIZE:]
+        if pending:
+            insert_seconds += _timed(client.insert, collection_name=shared, data=pending)
+    else:
+        for tenant, name in zip(tenants, names):
+            insert_seconds += _timed(client.insert, collection_name=name, data=_rows(rng, tenant, rows, partitioned=False))
+
+    load_seconds = sum(_timed(client.load_collection, name) for name in names)
+
+    latencies = []
+    picker = random.Random(seed)
+    for vector in _vectors(rng, queries):
+        index = picker.randrange(len(tenants))
+        if partitioned:
+            request = {"collection_name": shared, "filter": f"tenant == {quote_expr_value(tenants[index])}"}
+        else:
+            request = {"collection_name": names[index]}
+        started = time.perf_counter()
+        client.search(data=[vector.tolist()], search_params=DENSE_SEARCH_PARAMS, limit=CANDIDATES, **request)
+        latencies.append(time.perf_counter() - started)
+
+    return {
+        "collections": len(names),
+        "create_seconds": round(create_seconds, 2),
+        "insert_seconds": round(insert_seconds, 2),
+        "rows_per_sec": round(len(tenants) * rows / insert_seconds, 1) if insert_seconds else None,
+        "load_seconds": round(load_seconds, 2),
+        "search": _quantiles(latencies),
+    }
+
+
+def _drop(client) -> None:
+    for name in client.list_collections():
+        if name.startswith(PREFIX):
+            client.drop_collection(name)
+
+
+def benchmark(args) -> Dict[str, Any]:
+    client = milvus_manager.client
+    tenants = [f"_pasta_{index}_" for index in range(args.tenants)]
+    _drop(client)
+    results = {}
+    try:
+        for layout, partitioned in (("collection", False), ("partitioned", True)):
+            results[layout] = _run_layout(client, tenants, args.rows, args.queries, partitioned, args.seed)
+            if not args.keep:
+                _drop(client)
+    finally:
+        if not args.keep:
+            _drop(client)
+    return {"tenants": args.tenants, "rows_per_tenant": args.rows, "queries": args.queries, "layouts": results}
+
+
+def main():
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Uma coleção por pasta x coleção compartilhada com partition key.")
+    parser.add_argument("--tenants", type=int, default=1000, help="Pastas (coleções ou tenants)")
+    parser.add_argument("--rows", type=int, default=20, help="Chunks por pasta")
+    parser.add_argument("--queries", type=int, default=200, help="Buscas em pastas sorteadas por layout")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="Não remove as coleções do benchmark no fim")
+    args = parser.parse_args()
+    if is_milvus_lite():
+        parser.error("requer Milvus standalone/cluster em MILVUS_URL (o Milvus Lite não filtra por partition key)")
+    print(json.dumps(benchmark(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Mede o ganho da extração paralela da camada de texto de PDFs (faixas de páginas
+em processos) de 1 a N workers.
+
+Gera um PDF sintético com texto em todas as páginas, extrai com cada número de
+workers (uma execução de aquecimento para subir o pool, depois a melhor de
+`--repeat`) e confere se as páginas saem iguais às da extração sequencial. Exemplo:
+
+    python -m app.modules.milvus.benchmark_pdf --pages 3000 --workers 1 2 4 8
+"""
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+from typing import Dict, Any, List
+import fitz  # PyMuPDF
+from app.core.logging import configure_logging
+from app.modules.milvus.utils.pdf_reader import iter_pdf_pages
+
+WORDS = (
+    "diário oficial município decreto portaria nomeação exoneração licitação contrato "
+    "extrato aviso secretaria prefeitura artigo parágrafo inciso valor dotação prazo"
+).split()
+
+
+def generate_pdf(path: str, pages: int, seed: int = 0) -> None:
+    """PDF A4 com um bloco de texto corrido (~3.000 caracteres) por página, como num diário oficial."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        text = f"Página {number + 1}\n" + " ".join(rng.choice(WORDS) for _ in range(400))
+        page.insert_textbox(page.rect + (36, 36, -36, -36), text, fontsize=8)
+    doc.save(path)
+    doc.close()
+
+
+def _extract(path: str, workers: int, pages_per_task: int) -> List[Dict]:
+    return list(iter_pdf_pages(path, workers=workers, pages_per_task=pages_per_task))
+
+
+def benchmark(pages: int, workers: List[int], pages_per_task: int, repeat: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "benchmark.pdf")
+        generate_pdf(path, pages)
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+
+        reference = _extract(path, 1, pages_per_task)
+        results = {}
+        for count in workers:
+            output = _extract(path, count, pages_per_task)  # aquecimento: sobe o pool
+            best = float("inf")
+            for _ in range(repeat):
+                started = time.perf_counter()
+                output = _extract(path, count, pages_per_task)
+                best = min(best, time.perf_counter() - started)
+            results[count] = {
+                "seconds": round(best, 3),
+                "pages_per_sec": round(pages / best, 1) if best else None,
+                "same_output": output == reference,
+            }
+
+    baseline = results[workers[0]]["seconds"]
+    for result in results.values():
+        result["speedup"] = round(baseline / result["seconds"], 2) if result["seconds"] else None
+    return {
+        "pages": pages,
+        "file_mb": round(size_mb, 2),
+        "cpus": os.cpu_count(),
+        "pages_per_task": pages_per_task,
+        "workers": results,
+    }
+
+
+def main():
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Ganho da extração paralela de PDFs de 1 a N workers.")
+    parser.add_argument("--pages", type=int, default=3000, help="Páginas do PDF gerado")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="Números de workers a medir")
+    parser.add_argument("--pages-per-task", type=int, default=50, help="Páginas por faixa enviada a um worker")
+    parser.add_argument("--repeat", type=int, default=3, help="Execuções por número de workers (vale a melhor)")
+    args = parser.parse_args()
+    print(json.dumps(benchmark(args.pages, args.workers, args.pages_per_task, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
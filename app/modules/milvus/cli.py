@@ -0,0 +1,54 @@
+"""
+Ingestão de documentos pela linha de comando (sem passar pela API).
+
+Exemplo de carga inicial em massa:
+
+    python -m app.modules.milvus.cli --folder-name prefeitura --links-file links.txt --mode bulk
+
+A ingestão é registrada como um job e executada neste processo (sem passar pelos workers);
+se for interrompida, continua dos checkpoints com:
+
+    python -m app.modules.milvus.cli --resume <job_id>
+"""
+import json
+import asyncio
+import argparse
+from app.core.milvus_connection import milvus_manager
+from app.core.logging import configure_logging
+from app.modules.milvus.schemas.schemas import InsertDto, InsertMode
+from app.modules.milvus.services.ingestion_service import IngestionService
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Insere documentos em uma coleção Milvus.")
+    parser.add_argument("--folder-name", help="Nome da pasta (coleção _<folder-name>_)")
+    parser.add_argument("--links-file", help="Arquivo texto com um link por linha")
+    parser.add_argument(
+        "--mode",
+        choices=[mode.value for mode in InsertMode],
+        default=InsertMode.BULK.value,
+        help="Modo de ingestão (padrão: bulk)",
+    )
+    parser.add_argument("--resume", metavar="JOB_ID", help="Retoma um job interrompido a partir dos checkpoints")
+    args = parser.parse_args()
+    if not args.resume and not (args.folder_name and args.links_file):
+        parser.error("--folder-name e --links-file são obrigatórios (exceto com --resume)")
+    return args
+
+
+def main():
+    configure_logging()
+    args = parse_args()
+    service = IngestionService()
+    if args.resume:
+        result = asyncio.run(service.run_here(milvus_manager.client, args.resume))
+    else:
+        with open(args.links_file, encoding="utf-8") as f:
+            links = [line.strip() for line in f if line.strip()]
+        dto = InsertDto(links=links, folder_name=args.folder_name, mode=InsertMode(args.mode))
+        result = asyncio.run(service.insert(milvus_manager.client, dto))
+    print(json.dumps(result, indent=2, ensure_ascii=False, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Migra coleções por pasta (_<pasta>_) para a coleção compartilhada com partition key.
+
+Cada coleção vira o tenant de mesmo nome, então /chat/ask continua aceitando
+o nome antigo. Exemplo:
+
+    python -m app.modules.milvus.migrate_layout --collections _prefeitura_ _camara_ --drop
+"""
+import asyncio
+import argparse
+from typing import List
+from pymilvus import Collection
+from app.config.settings import settings
+from app.core.logging import configure_logging, logging
+from app.core.milvus_connection import milvus_manager
+from app.modules.milvus.utils.layout import StorageTarget, tenant_registry
+from app.modules.milvus.utils.residency import residency_manager
+from app.modules.milvus.utils.milvus import (
+    BATCH_SIZE,
+    get_collection_fields,
+    prepare_milvus_collection,
+    insert_batch_to_milvus,
+)
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ["vector", "text", "doc_id", "file_name", "page"]
+# campos que coleções antigas podem não ter, com o valor usado quando só o destino tem o campo
+# (ingested_at=0: data desconhecida)
+OPTIONAL_FIELDS = {
+    "page_end": lambda row: row["page"],
+    "ingested_at": lambda row: 0,
+    "occurrences": lambda row: [],
+}
+
+
+async def migrate_collection(milvus_client, collection_name: str, drop: bool) -> int:
+    """
+    Copia todos os chunks da coleção para a coleção compartilhada. Retorna a quantidade copiada.
+
+    Pode ser executada de novo: um tenant já registrado (migração concluída) não é
+    copiado outra vez, e as linhas de uma migração interrompida no meio são
+    apagadas antes da cópia.
+    """
+    if collection_name in tenant_registry:
+        logger.info(f"Collection '{collection_name}' já migrada; cópia ignorada")
+        if drop:
+            await _drop(milvus_client, collection_name)
+        return 0
+
+    target = StorageTarget(settings.MILVUS_SHARED_COLLECTION, collection_name)
+    await residency_manager.ensure_loaded(milvus_client, target.collection_name)
+    leftover = await asyncio.to_thread(
+        milvus_client.query, target.collection_name, filter=target.filter, output_fields=["id"], limit=1
+    )
+    if leftover:
+        logger.info(f"Removendo as linhas de uma migração incompleta de '{collection_name}'")
+        await asyncio.to_thread(milvus_client.delete, collection_name=target.collection_name, filter=target.filter)
+
+    await residency_manager.ensure_loaded(milvus_client, collection_name)
+    target_fields = await get_collection_fields(milvus_client, settings.MILVUS_SHARED_COLLECTION)
+    source_fields = await get_collection_fields(milvus_client, collection_name)
+    output_fields = FIELDS + [field for field in OPTIONAL_FIELDS if field in source_fields and field in target_fields]
+    defaults = {
+        field: default for field, default in OPTIONAL_FIELDS.items()
+        if field in target_fields and field not in source_fields
+    }
+    it = Collection(name=collection_name).query_iterator(
+        batch_size=BATCH_SIZE,
+        limit=-1,
+        output_fields=output_fields,
+    )
+
+    total = 0
+    while True:
+        batch = await asyncio.to_thread(it.next)
+        if not batch:
+            it.close()
+            break
+        rows = [{**{field: hit[field] for field in output_fields}, "tenant": collection_name} for hit in batch]
+        for row in rows:
+            row.update({field: default(row) for field, default in defaults.items()})
+        ok = await insert_batch_to_milvus(milvus_client, settings.MILVUS_SHARED_COLLECTION, rows)
+        if not ok:
+            raise RuntimeError(f"Falha ao migrar '{collection_name}' após {total} chunks")
+        total += len(rows)
+
+    tenant_registry.add(collection_name)
+    logger.info(f"Collection '{collection_name}' migrada: {total} chunks")
+
+    if drop:
+        await _drop(milvus_client, collection_name)
+    return total
+
+
+async def _drop(milvus_client, collection_name: str) -> None:
+    if not await asyncio.to_thread(milvus_client.has_collection, collection_name):
+        return
+    await residency_manager.release(milvus_client, collection_name)
+    await asyncio.to_thread(milvus_client.drop_collection, collection_name)
+    logger.info(f"Collection '{collection_name}' removida")
+
+
+async def migrate(collections: List[str], drop: bool) -> None:
+    milvus_client = milvus_manager.client
+    await prepare_milvus_collection(milvus_client, settings.MILVUS_SHARED_COLLECTION, partition_key=True)
+
+    if not collections:
+        collections = [
+            name for name in await asyncio.to_thread(milvus_client.list_collections)
+            if name.startswith("_") and name.endswith("_") and name != settings.MILVUS_SHARED_COLLECTION
+        ]
+    for name in collections:
+        await migrate_collection(milvus_client, name, drop)
+
+
+def main():
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Migra coleções por pasta para o layout particionado.")
+    parser.add_argument("--collections", nargs="*", default=[], help="Coleções a migrar (padrão: todas _<pasta>_)")
+    parser.add_argument("--drop", action="store_true", help="Remove cada coleção depois de migrada")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.collections, args.drop))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,117 +1,106 @@
-import uuid
 import asyncio
 import logging
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from app.modules.milvus.schemas.schemas import InsertDto
-from app.modules.milvus.utils.downloader import download_links_to_temp_dir
-from app.modules.milvus.utils.ocr import OCRService
-from app.modules.milvus.utils.embbeding import batches_chunks, generate_doc_id, split_text, embed_texts
-from app.modules.milvus.utils.milvus import prepare_milvus_collection, insert_batch_to_milvus
+from app.modules.milvus.services.ingestion_service import IngestionService
 from app.core.dependencies import get_milvus_client  # retorna MilvusClient
-from pymilvus import connections
+from app.core.milvus_connection import milvus_manager
+from app.modules.milvus.utils.residency import residency_manager
+from app.modules.milvus.utils.layout import tenant_registry
+from app.modules.milvus.utils.jobs import job_store, JobKind, JobStatus, TERMINAL_STATUSES
+from app.core.sse import sse_event
+from app.core.admission import admission
 from app.config.settings import settings
-from pymilvus import MilvusClient
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-@router.post("/insert")
-async def insert_documents(
-    dto: InsertDto,
-    milvus_client=Depends(get_milvus_client),
-):
-    connections.connect(
-        alias="default",
-        host="localhost",   # ou settings.MILVUS_HOST
-        port="19530"        # ou settings.MILVUS_PORT
-    )
-    collection_name = f"_{dto.folder_name}_"
-    # 1) prepara coleção Milvus
-    await prepare_milvus_collection(milvus_client, collection_name)
-
-    # 2) baixa links e executa OCR
-    paths, temp_dir = download_links_to_temp_dir(
-        links=dto.links,
-        folder_name=dto.folder_name
-    )
-    if not temp_dir:
-        raise HTTPException(status_code=500, detail="Falha ao criar pasta temporária")
-
-    ocr = OCRService()
-    documents = []
-    for path in paths:
-        result = ocr.process_file(file_path=path)
-        for page in result["pages"]:
-            documents.append({
-                "page_content": page["content"],
-                "metadata": {"file_name": result["file_name"], "page": page["page_number"]}
-            })
-
-    # 3) pré-processa e gera chunks + metadata alinhada
-    all_chunks, all_pages_metadata = [], []
-    for doc in documents:
-        chunks = split_text(doc["page_content"])
-        if not chunks:
-            logger.warning(f"Documento {doc['metadata'].get('file_name')} sem chunks.")
-            continue
-        all_chunks.extend(chunks)
-        all_pages_metadata.extend([doc["metadata"]] * len(chunks))
-
-    # 4) cria batches de embedding
-    embedding_batches = await batches_chunks(
-        all_chunks, max_tokens_per_batch=600000, tokens_per_chunk_estimate=1024
-    )
-
-    # 5) processa batches e insere em Milvus
-    BATCH_SIZE = 500
-    batch_counter = 0
-    chunk_counter = 0
-    milvus_batch = []
-
-    for batch in embedding_batches:
-        # 5a) gera embeddings localmente (sem Celery)
-        embeddings = await asyncio.to_thread(embed_texts, batch)
-
-        for idx, (chunk, vector) in enumerate(zip(batch, embeddings)):
-            metadata = all_pages_metadata[chunk_counter]
-            chunk_id = f"{generate_doc_id(chunk)}-{idx}"
-            milvus_batch.append({
-                "vector": vector,
-                "text": chunk,
-                "doc_id": chunk_id,
-                "file_name": metadata.get("file_name"),
-                "page": metadata.get("page", 1)
-            })
-            chunk_counter += 1
-
-            # 5b) insere batch em Milvus quando atingir BATCH_SIZE
-            if len(milvus_batch) >= BATCH_SIZE:
-                ok = await insert_batch_to_milvus(milvus_client, collection_name, milvus_batch)
-                if ok:
-                    logger.info(f"Batch {batch_counter} inserido com sucesso.")
-                else:
-                    logger.error(f"Erro ao inserir o batch {batch_counter}")
-                milvus_batch.clear()
-                batch_counter += 1
-
-    # 6) insere o que sobrou
-    if milvus_batch:
-        ok = await insert_batch_to_milvus(milvus_client, collection_name, milvus_batch)
-        if ok:
-            logger.info("Último batch inserido com sucesso.")
-        else:
-            logger.error("Erro ao inserir o último batch.")
-            raise HTTPException(status_code=500, detail="Erro na inserção final")
-
-    return {"status": "success", "collection": collection_name}
+ingestion_service = IngestionService()
+
+
+@router.post("/insert", status_code=202)
+async def insert_documents(dto: InsertDto):
+    """
+    Enfileira a ingestão como um job e responde na hora: quem executa são os
+    workers (python -m app.worker). O andamento fica em GET /milvus/jobs/{job_id}
+    (ou no SSE /milvus/jobs/{job_id}/events).
+    """
+    depth = await asyncio.to_thread(job_store.queue_depth)
+    if depth.get(f"{JobKind.INGESTION.value}_{JobStatus.QUEUED.value}", 0) >= settings.INGEST_MAX_QUEUED_JOBS:
+        # fila dos workers cheia: rejeita na hora em vez de acumular jobs
+        admission.reject_backlog("/milvus/insert")
+        raise HTTPException(
+            status_code=429,
+            detail="Fila de ingestão cheia, tente novamente mais tarde.",
+            headers={"Retry-After": str(settings.INGEST_QUEUE_RETRY_AFTER)},
+        )
+    job_id = await asyncio.to_thread(ingestion_service.submit, dto)
+    return {"job_id": job_id, "status": JobStatus.QUEUED.value}
+
+
+@router.get("/jobs")
+async def job_queue():
+    """Profundidade da fila dos workers: jobs na fila e em execução, por tipo."""
+    return await asyncio.to_thread(job_store.queue_depth)
+
+
+async def _get_job(job_id: str):
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} não encontrado")
+    return job
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Status do job de ingestão, checkpoint de cada arquivo e progresso por etapa
+    (contagens, throughput e ETA); o resultado da ingestão quando concluído.
+    """
+    return await _get_job(job_id)
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Progresso do job em Server-Sent Events: um evento `progress` a cada mudança
+    e um `done` (ou `error`) com o job completo ao terminar.
+    """
+    job = await _get_job(job_id)
+
+    async def event_generator():
+        current, last = job, None
+        while True:
+            if current["status"] in TERMINAL_STATUSES:
+                event = "done" if current["status"] == JobStatus.SUCCEEDED.value else "error"
+                yield sse_event(event, current)
+                return
+            payload = {"id": job_id, "status": current["status"], "progress": current["progress"]}
+            if payload != last:
+                yield sse_event("progress", payload)
+                last = payload
+            await asyncio.sleep(settings.INGEST_JOBS_EVENTS_INTERVAL)
+            current = await asyncio.to_thread(job_store.get, job_id)
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 
+@router.post("/jobs/{job_id}/resume", status_code=202)
+async def resume_job(job_id: str):
+    """Recoloca na fila um job que falhou; o worker retoma do último checkpoint de cada arquivo."""
+    await _get_job(job_id)
+    if not await asyncio.to_thread(job_store.requeue, job_id):
+        raise HTTPException(status_code=409, detail="Só jobs com falha podem ser retomados")
+    return {"job_id": job_id, "status": JobStatus.QUEUED.value}
+
 
 @router.get("/collections")
 async def list_collections(
+    milvus_client=Depends(get_milvus_client),
 ) -> list[str]:
-    milvus_client = MilvusClient(settings.MILVUS_URL)
     """
     Retorna a lista de collections existentes no servidor Milvus.
+    Os tenants da coleção compartilhada (layout particionado) aparecem como collections.
     """
     # Dependendo da versão do pymilvus, use list_collections ou show_collections
     try:
@@ -119,4 +108,45 @@ async def list_collections(
     except AttributeError:
         # Em versões mais antigas do SDK
         collections = milvus_client.show_collections()
-    return collections
+    collections = [name for name in collections if name != settings.MILVUS_SHARED_COLLECTION]
+    return collections + tenant_registry.list()
+
+
+@router.get("/health")
+async def milvus_health():
+    """
+    Executa um health check na conexão compartilhada com o Milvus.
+    """
+    await asyncio.to_thread(milvus_manager.ping)
+    return milvus_manager.health()
+
+
+@router.get("/residency")
+async def collection_residency():
+    """
+    Retorna as coleções carregadas na memória, o uso estimado do orçamento
+    e as latências de carga.
+    """
+    return residency_manager.stats()
+
+
+@router.post("/residency/{collection_name}/pin")
+async def pin_collection(
+    collection_name: str,
+    milvus_client=Depends(get_milvus_client),
+):
+    """
+    Fixa a coleção na memória (nunca é liberada pelo LRU) e a pré-carrega.
+    """
+    residency_manager.pin(collection_name)
+    await residency_manager.ensure_loaded(milvus_client, collection_name)
+    return residency_manager.stats()
+
+
+@router.delete("/residency/{collection_name}/pin")
+async def unpin_collection(collection_name: str):
+    """
+    Remove a fixação; a coleção volta a poder ser liberada pelo LRU.
+    """
+    residency_manager.unpin(collection_name)
+    return residency_manager.stats()
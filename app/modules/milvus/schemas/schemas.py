@@ -1,6 +1,18 @@
+from enum import Enum
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+
+
+class InsertMode(str, Enum):
+    """Modos de ingestão suportados por /milvus/insert"""
+    APPEND = "append"
+    SYNC = "sync"
+    BULK = "bulk"
+
 
 class InsertDto(BaseModel):
     links: List[str]
     folder_name: str
+    mode: InsertMode = InsertMode.APPEND
+    company_id: Optional[int] = None
+    group_id: Optional[int] = None
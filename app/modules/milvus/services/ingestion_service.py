@@ -0,0 +1,550 @@
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+from collections import Counter
+from itertools import groupby
+from typing import Dict, Iterator, List, Any, Optional, Set, Tuple
+from urllib.parse import urlparse
+import numpy as np
+from fastapi import HTTPException
+from app.core.logging import logging
+from app.config.settings import settings
+from app.modules.milvus.schemas.schemas import InsertDto, InsertMode
+from app.modules.milvus.utils.downloader import download_link
+from app.modules.milvus.utils.ocr import OCRService
+from app.modules.milvus.utils.embbeding import batches_chunks, generate_chunk_id, split_text, embed_texts
+from app.modules.milvus.utils.bulk import BulkLoader
+from app.modules.milvus.utils.chunking import chunker
+from app.modules.milvus.utils.dedup import deduplicate_chunks
+from app.modules.milvus.utils.layout import StorageTarget, resolve_insert_target, tenant_registry
+from app.modules.milvus.utils.jobs import JobKind, JobStore, job_store, stage_reached
+from app.modules.milvus.utils.milvus import (
+    prepare_milvus_collection,
+    build_collection_indexes,
+    insert_batch_to_milvus,
+    get_existing_documents,
+    diff_documents,
+    delete_chunks_by_ids,
+    delete_removed_documents,
+    get_collection_fields,
+    quote_expr_value,
+    update_occurrences,
+)
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+class IngestionService:
+    """
+    Pipeline de ingestão: download, OCR, chunking, embeddings e inserção no Milvus.
+
+    Cada ingestão é um job persistido no JobStore: cada arquivo registra a última
+    etapa concluída (downloaded, extracted, chunked, embedded, inserted) e os
+    artefatos de cada etapa ficam no diretório do job, então um job interrompido
+    é retomado de onde parou, sem repetir downloads, OCR e embeddings já feitos.
+    """
+
+    def __init__(self, store: JobStore = job_store):
+        self.store = store
+
+    def submit(self, dto: InsertDto) -> str:
+        """Enfileira a ingestão; quem executa são os workers (python -m app.worker)."""
+        return self.store.create(dto.model_dump(mode="json"), dto.links, JobKind.INGESTION)
+
+    async def insert(self, milvus_client, dto: InsertDto) -> Dict[str, Any]:
+        """Cria o job e o executa neste processo até o fim (ex.: CLI), devolvendo o resultado."""
+        return await self.run_here(milvus_client, self.submit(dto))
+
+    async def run_here(self, milvus_client, job_id: str) -> Dict[str, Any]:
+        """
+        Executa (ou retoma, se falhou ou foi interrompido) um job neste processo,
+        com lease como um worker; falha se outro worker está com ele.
+        """
+        self.store.requeue(job_id)
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:cli"
+        claimed = self.store.claim(worker_id, [JobKind.INGESTION.value], job_id=job_id)
+        if claimed is None:
+            raise RuntimeError(f"Job {job_id} inexistente, concluído ou em execução em outro worker")
+        with self.store.lease(job_id, worker_id):
+            return await self.run_job(milvus_client, job_id, claimed["attempts"])
+
+    async def run_job(self, milvus_client, job_id: str, attempt: int) -> Dict[str, Any]:
+        """Executa um job já reivindicado (`claim`) e registra o resultado ou o erro."""
+        dto = InsertDto.model_validate(self.store.request(job_id))
+        logger.info(f"Job {job_id} iniciado (tentativa {attempt}) para '{dto.folder_name}'")
+        try:
+            result = await self._run(milvus_client, job_id, dto, resumed=attempt > 1)
+        except Exception as e:
+            error = getattr(e, "detail", None) or str(e) or type(e).__name__
+            logger.error(f"Job {job_id} falhou: {error}")
+            self.store.finish(job_id, error=error)
+            raise
+        self.store.finish(job_id, result=result)
+        logger.info(f"Job {job_id} concluído: {result.get('rows')} linhas")
+        return {"job_id": job_id, **result}
+
+    async def _run(self, milvus_client, job_id: str, dto: InsertDto, resumed: bool = False) -> Dict[str, Any]:
+        target = resolve_insert_target(dto.folder_name, dto.company_id, dto.group_id)
+        partitioned = target.tenant is not None
+        bulk = dto.mode == InsertMode.BULK
+
+        # 1) prepara coleção Milvus (na carga em massa os índices ficam para o final)
+        created = await prepare_milvus_collection(
+            milvus_client, target.collection_name, build_index=not bulk, partition_key=partitioned
+        )
+
+        # 2) baixa, executa OCR e gera chunks + metadata alinhada, arquivo por arquivo (com checkpoints)
+        all_chunks, all_pages_metadata = await self._prepare_files(job_id)
+
+        # 3a) descarta quase-duplicatas (cabeçalhos, rodapés, avisos) antes das embeddings;
+        # roda antes do sync para que os doc_ids comparados sejam os mesmos entre cargas
+        dedup_report = None
+        if settings.INGEST_DEDUP_ENABLED:
+            all_chunks, all_pages_metadata, dedup_report = await asyncio.to_thread(
+                deduplicate_chunks, all_chunks, all_pages_metadata
+            )
+
+        # 3b) modo sync: insere só os chunks novos e remove os de arquivos alterados/removidos
+        sync_summary = None
+        if dto.mode == InsertMode.SYNC:
+            all_chunks, all_pages_metadata, sync_summary = await self._sync_chunks(
+                milvus_client, target, dto.links, all_chunks, all_pages_metadata
+            )
+        elif resumed:
+            # 3c) job retomado: não reinsere o que a tentativa anterior já gravou
+            all_chunks, all_pages_metadata = await self._skip_inserted(
+                milvus_client, job_id, target, all_chunks, all_pages_metadata
+            )
+
+        # 4) gera embeddings e insere (coleções antigas não têm page_end, ingested_at e occurrences)
+        fields = await get_collection_fields(milvus_client, target.collection_name)
+        ingested_at = int(time.time()) if "ingested_at" in fields else None
+        progress = _JobCheckpoints(self.store, job_id, all_pages_metadata)
+        if bulk:
+            stats = await self._bulk_insert_chunks(
+                milvus_client, target, all_chunks, all_pages_metadata, ingested_at, fields, progress
+            )
+            if created:
+                await build_collection_indexes(target.collection_name, partition_key=partitioned)
+        else:
+            stats = await self._insert_chunks(
+                milvus_client, target, all_chunks, all_pages_metadata, ingested_at, fields, progress
+            )
+
+        if partitioned:
+            tenant_registry.add(target.tenant)
+        # respostas em cache (na API) foram geradas com o conteúdo antigo
+        self.store.bump_collection_version(target.name)
+
+        response = {"status": "success", "collection": target.name, **stats}
+        if sync_summary is not None:
+            response["sync"] = sync_summary
+        if dedup_report is not None:
+            response["dedup"] = dedup_report
+        return response
+
+    async def _prepare_files(self, job_id: str) -> Tuple[List[str], List[Dict]]:
+        """
+        Download, OCR e chunking de cada arquivo do job, com checkpoint ao fim de cada
+        etapa; etapas já concluídas em tentativas anteriores são lidas do disco.
+        Arquivos cujo download falhou (ou de tipo não suportado) ficam de fora.
+        A metadata de cada chunk leva a `position` do arquivo no job.
+        """
+        ocr = OCRService()
+        all_chunks, all_pages_metadata = [], []
+        for file in self.store.files(job_id):
+            if file["error"]:
+                continue
+            position, stage = file["position"], file["stage"]
+            file_dir = os.path.join(self.store.job_dir(job_id), str(position))
+            chunks_path = os.path.join(file_dir, "chunks.json")
+
+            if stage_reached(stage, "chunked"):
+                chunks, metadata = _read_json(chunks_path)
+            else:
+                pages_path = os.path.join(file_dir, "pages.json")
+                if stage_reached(stage, "extracted"):
+                    result = _read_json(pages_path)
+                else:
+                    download_dir = os.path.join(file_dir, "download")
+                    if stage_reached(stage, "downloaded"):
+                        path = os.path.join(download_dir, file["file_name"])
+                    else:
+                        os.makedirs(download_dir, exist_ok=True)
+                        try:
+                            path = await asyncio.to_thread(download_link, file["link"], download_dir)
+                        except Exception as e:
+                            logger.error(f"Falha ao baixar {file['link']}: {e}")
+                            self.store.fail_file(job_id, position, f"download: {e}")
+                            continue
+                        self.store.checkpoint(job_id, position, "downloaded", file_name=os.path.basename(path))
+                    try:
+                        result = await asyncio.to_thread(ocr.process_file, path)
+                    except ValueError as e:
+                        logger.error(f"Arquivo {os.path.basename(path)} ignorado: {e}")
+                        self.store.fail_file(job_id, position, str(e))
+                        continue
+                    _write_json(pages_path, result)
+                    self.store.checkpoint(job_id, position, "extracted")
+
+                documents = [
+                    {
+                        "page_content": page["content"],
+                        "metadata": {"file_name": result["file_name"], "page": page["page_number"]},
+                    }
+                    for page in result["pages"]
+                ]
+                chunks, metadata = self._chunk_documents(documents)
+                _write_json(chunks_path, [chunks, metadata])
+                self.store.checkpoint(job_id, position, "chunked")
+
+            all_chunks.extend(chunks)
+            all_pages_metadata.extend({**meta, "position": position} for meta in metadata)
+        return all_chunks, all_pages_metadata
+
+    async def _skip_inserted(
+        self,
+        milvus_client,
+        job_id: str,
+        target: StorageTarget,
+        all_chunks: List[str],
+        all_pages_metadata: List[Dict],
+    ):
+        """
+        Ao retomar um job: descarta os chunks de arquivos já inseridos (checkpoint) e,
+        nos arquivos que pararam no meio da inserção, os chunks que já estão na coleção.
+        """
+        inserted = {file["position"] for file in self.store.files(job_id) if stage_reached(file["stage"], "inserted")}
+        pending_files = sorted({
+            metadata["file_name"] for metadata in all_pages_metadata if metadata["position"] not in inserted
+        })
+        existing: Dict[str, Dict[str, List[int]]] = {}
+        if pending_files:
+            expr = f"file_name in [{', '.join(quote_expr_value(name) for name in pending_files)}]"
+            if target.filter:
+                expr = f"{target.filter} and {expr}"
+            existing = await get_existing_documents(milvus_client, target.collection_name, expr=expr)
+
+        keep = [
+            idx for idx, metadata in enumerate(all_pages_metadata)
+            if metadata["position"] not in inserted
+            and metadata["doc_id"] not in existing.get(metadata["file_name"], ())
+        ]
+        logger.info(f"Job {job_id} retomado: {len(all_chunks) - len(keep)} chunks já inseridos")
+        return [all_chunks[i] for i in keep], [all_pages_metadata[i] for i in keep]
+
+    def _chunk_documents(self, documents: List[Dict]):
+        """
+        Gera os chunks e a metadata alinhada: file_name, page (primeira página do
+        chunk), page_end (última) e doc_id.
+        """
+        all_chunks, all_pages_metadata = [], []
+        seen_per_file: Dict[str, Dict[str, int]] = {}
+        for file_name, pages in groupby(documents, key=lambda doc: doc["metadata"]["file_name"]):
+            seen = seen_per_file.setdefault(file_name, {})
+            produced = 0
+            for chunk, page, page_end in self._split_pages(pages):
+                all_chunks.append(chunk)
+                all_pages_metadata.append({
+                    "file_name": file_name,
+                    "page": page,
+                    "page_end": page_end,
+                    "doc_id": generate_chunk_id(chunk, seen),
+                })
+                produced += 1
+            if not produced:
+                logger.warning(f"Documento {file_name} sem chunks.")
+        return all_chunks, all_pages_metadata
+
+    @staticmethod
+    def _split_pages(pages: Iterator[Dict]) -> Iterator[Tuple[str, int, int]]:
+        """
+        Chunks de um arquivo como (texto, página inicial, página final). O chunker
+        estruturado recebe as páginas em sequência; o legado divide cada página isolada.
+        """
+        if settings.INGEST_CHUNKER == "legacy":
+            for doc in pages:
+                page = doc["metadata"]["page"]
+                for chunk in split_text(doc["page_content"]):
+                    yield chunk, page, page
+            return
+        for chunk in chunker.chunk((doc["metadata"]["page"], doc["page_content"]) for doc in pages):
+            yield chunk.text, chunk.page_start, chunk.page_end
+
+    async def _sync_chunks(
+        self,
+        milvus_client,
+        target: StorageTarget,
+        links: List[str],
+        all_chunks: List[str],
+        all_pages_metadata: List[Dict],
+    ):
+        """
+        Compara os chunks recebidos com os já armazenados na coleção (por file_name e doc_id):
+        remove os chunks obsoletos de arquivos alterados ou removidos, atualiza as
+        `occurrences` dos chunks mantidos e devolve apenas os chunks novos, junto com
+        um resumo da diferença.
+        """
+        incoming_doc_map: Dict[str, List[str]] = {}
+        for metadata in all_pages_metadata:
+            incoming_doc_map.setdefault(metadata["file_name"], []).append(metadata["doc_id"])
+
+        collection_name = target.collection_name
+        existing_doc_map = await get_existing_documents(milvus_client, collection_name, expr=target.filter)
+        diff = diff_documents(existing_doc_map, incoming_doc_map)
+
+        deleted = await delete_chunks_by_ids(milvus_client, collection_name, diff["stale_ids"])
+
+        # arquivos pedidos cujo download falhou não contam como removidos
+        requested = [os.path.basename(urlparse(link).path) for link in links]
+        removed_files = await delete_removed_documents(
+            milvus_client,
+            collection_name,
+            existing_doc_map,
+            requested + list(incoming_doc_map),
+            expr=target.filter,
+        )
+
+        keep = [
+            idx for idx, metadata in enumerate(all_pages_metadata)
+            if metadata["doc_id"] in diff["to_insert"].get(metadata["file_name"], ())
+        ]
+
+        # chunks que ficam como estão podem ter ganhado ou perdido cópias descartadas no dedup
+        updated = 0
+        fields = await get_collection_fields(milvus_client, collection_name)
+        if "occurrences" in fields:
+            kept = set(keep)
+            occurrences_by_id = {
+                existing_doc_map[metadata["file_name"]][metadata["doc_id"]][0]: metadata.get("occurrences", [])
+                for idx, metadata in enumerate(all_pages_metadata)
+                if idx not in kept and metadata["doc_id"] in existing_doc_map.get(metadata["file_name"], {})
+            }
+            updated = await update_occurrences(milvus_client, collection_name, occurrences_by_id, fields)
+
+        summary = {
+            "files": diff["files"],
+            "removed_files": removed_files,
+            "inserted_chunks": len(keep),
+            "deleted_chunks": deleted + sum(removed_files.values()),
+            "updated_occurrences": updated,
+        }
+        logger.info(f"Sync de '{target.name}': {summary}")
+        return [all_chunks[i] for i in keep], [all_pages_metadata[i] for i in keep], summary
+
+    async def _embed_rows(
+        self,
+        target: StorageTarget,
+        all_chunks: List[str],
+        all_pages_metadata: List[Dict],
+        ingested_at: Optional[int],
+        fields: Set[str],
+        progress: "_JobCheckpoints",
+    ):
+        """
+        Gera os embeddings em batches e devolve, por batch, as linhas prontas para o Milvus
+        (os campos opcionais só entram se existirem no schema, `fields`) e a position do
+        arquivo de cada linha. Embeddings salvos por uma tentativa anterior do job são reaproveitados.
+        """
+        vectors = progress.load_vectors()
+        embedding_batches = await batches_chunks(
+            list(range(len(all_chunks))), max_tokens_per_batch=600000, tokens_per_chunk_estimate=1024
+        )
+        progress.start_embedding(sum(1 for metadata in all_pages_metadata if progress.key(metadata) in vectors))
+
+        for batch in embedding_batches:
+            missing = [idx for idx in batch if progress.key(all_pages_metadata[idx]) not in vectors]
+            if missing:
+                # gera embeddings localmente (sem Celery)
+                embeddings = await asyncio.to_thread(embed_texts, [all_chunks[idx] for idx in missing])
+                fresh = {progress.key(all_pages_metadata[idx]): vector for idx, vector in zip(missing, embeddings)}
+                await asyncio.to_thread(progress.save_vectors, fresh)
+                vectors.update(fresh)
+            positions = [all_pages_metadata[idx]["position"] for idx in batch]
+            progress.embedded(positions, fresh=len(missing))
+
+            rows = []
+            for idx in batch:
+                chunk, metadata = all_chunks[idx], all_pages_metadata[idx]
+                row = {
+                    "vector": vectors.pop(progress.key(metadata)),
+                    "text": chunk,
+                    "doc_id": metadata["doc_id"],
+                    "file_name": metadata.get("file_name"),
+                    "page": metadata.get("page", 1)
+                }
+                if ingested_at is not None:
+                    row["ingested_at"] = ingested_at
+                if "page_end" in fields:
+                    row["page_end"] = metadata.get("page_end", row["page"])
+                if "occurrences" in fields:
+                    row["occurrences"] = metadata.get("occurrences", [])
+                if target.tenant is not None:
+                    row["tenant"] = target.tenant
+                rows.append(row)
+            yield rows, positions
+
+    async def _insert_chunks(
+        self,
+        milvus_client,
+        target: StorageTarget,
+        all_chunks: List[str],
+        all_pages_metadata: List[Dict],
+        ingested_at: Optional[int],
+        fields: Set[str],
+        progress: "_JobCheckpoints",
+    ) -> Dict[str, Any]:
+        collection_name = target.collection_name
+        batch_counter = 0
+        rows_inserted = 0
+        insert_seconds = 0.0
+        milvus_batch = []
+        batch_positions = []
+
+        async for rows, positions in self._embed_rows(
+            target, all_chunks, all_pages_metadata, ingested_at, fields, progress
+        ):
+            for row, position in zip(rows, positions):
+                milvus_batch.append(row)
+                batch_positions.append(position)
+
+                # insere batch em Milvus quando atingir BATCH_SIZE
+                if len(milvus_batch) >= BATCH_SIZE:
+                    started = time.perf_counter()
+                    ok = await insert_batch_to_milvus(milvus_client, collection_name, milvus_batch)
+                    insert_seconds += time.perf_counter() - started
+                    if not ok:
+                        # falha o job com os checkpoints intactos: ao retomar, o _skip_inserted
+                        # pula o que já foi gravado e o batch é inserido de novo
+                        logger.error(f"Erro ao inserir o batch {batch_counter}")
+                        raise HTTPException(status_code=500, detail=f"Erro na inserção do batch {batch_counter}")
+                    logger.info(f"Batch {batch_counter} inserido com sucesso.")
+                    rows_inserted += len(milvus_batch)
+                    progress.inserted(batch_positions)
+                    milvus_batch.clear()
+                    batch_positions = []
+                    batch_counter += 1
+
+        # insere o que sobrou
+        if milvus_batch:
+            started = time.perf_counter()
+            ok = await insert_batch_to_milvus(milvus_client, collection_name, milvus_batch)
+            insert_seconds += time.perf_counter() - started
+            if ok:
+                logger.info("Último batch inserido com sucesso.")
+                rows_inserted += len(milvus_batch)
+                progress.inserted(batch_positions)
+            else:
+                logger.error("Erro ao inserir o último batch.")
+                raise HTTPException(status_code=500, detail="Erro na inserção final")
+
+        rows_per_sec = round(rows_inserted / insert_seconds, 1) if insert_seconds else 0.0
+        logger.info(f"{rows_inserted} linhas inseridas em '{collection_name}' ({rows_per_sec} linhas/s)")
+        return {"rows": rows_inserted, "rows_per_sec": rows_per_sec}
+
+    async def _bulk_insert_chunks(
+        self,
+        milvus_client,
+        target: StorageTarget,
+        all_chunks: List[str],
+        all_pages_metadata: List[Dict],
+        ingested_at: Optional[int],
+        fields: Set[str],
+        progress: "_JobCheckpoints",
+    ) -> Dict[str, Any]:
+        loader = BulkLoader(milvus_client, target.collection_name, fields)
+        positions = []
+        async for rows, batch_positions in self._embed_rows(
+            target, all_chunks, all_pages_metadata, ingested_at, fields, progress
+        ):
+            await loader.add_rows(rows)
+            positions.extend(batch_positions)
+        result = await loader.finish()
+        # o import é um só: os arquivos só contam como inseridos no final
+        progress.inserted(positions)
+        return {"rows": result["rows_imported"], "rows_per_sec": result["rows_per_sec"], "bulk": result}
+
+
+class _JobCheckpoints:
+    """
+    Checkpoints das etapas embedded e inserted de um job: conta os chunks de cada
+    arquivo que ainda faltam em cada etapa (o arquivo ganha o checkpoint quando
+    zera) e guarda os embeddings gerados em disco, por batch, para uma nova
+    tentativa não pagar por eles de novo.
+    """
+
+    def __init__(self, store: JobStore, job_id: str, all_pages_metadata: List[Dict]):
+        self.store = store
+        self.job_id = job_id
+        self.vectors_dir = os.path.join(store.job_dir(job_id), "embeddings")
+        counts = Counter(metadata["position"] for metadata in all_pages_metadata)
+        self._to_embed = dict(counts)
+        self._to_insert = dict(counts)
+        store.set_stage(job_id, "inserted", 0, len(all_pages_metadata))
+        # arquivos sem nada a inserir (só duplicatas, inalterados no sync) já estão concluídos
+        for file in store.files(job_id):
+            if (
+                not file["error"]
+                and stage_reached(file["stage"], "chunked")
+                and not stage_reached(file["stage"], "inserted")
+                and file["position"] not in counts
+            ):
+                store.checkpoint(job_id, file["position"], "inserted")
+
+    @staticmethod
+    def key(metadata: Dict) -> str:
+        return f"{metadata['position']}:{metadata['doc_id']}"
+
+    def load_vectors(self) -> Dict[str, List[float]]:
+        vectors: Dict[str, List[float]] = {}
+        if not os.path.isdir(self.vectors_dir):
+            return vectors
+        for name in sorted(os.listdir(self.vectors_dir)):
+            if not name.endswith(".npz"):
+                continue
+            with np.load(os.path.join(self.vectors_dir, name)) as saved:
+                vectors.update(zip(saved["keys"].tolist(), saved["vectors"].tolist()))
+        return vectors
+
+    def save_vectors(self, vectors: Dict[str, List[float]]) -> None:
+        os.makedirs(self.vectors_dir, exist_ok=True)
+        path = os.path.join(self.vectors_dir, f"{uuid.uuid4().hex}.npz")
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez(f, keys=np.array(list(vectors)), vectors=np.array(list(vectors.values()), dtype=np.float32))
+        os.replace(f"{path}.tmp", path)
+
+    def start_embedding(self, cached: int) -> None:
+        self.store.set_stage(self.job_id, "embedded", cached, sum(self._to_embed.values()))
+
+    def embedded(self, positions: List[int], fresh: int) -> None:
+        if fresh:
+            self.store.advance(self.job_id, "embedded", fresh)
+        self._count_down(self._to_embed, positions, "embedded")
+
+    def inserted(self, positions: List[int]) -> None:
+        self.store.advance(self.job_id, "inserted", len(positions))
+        self._count_down(self._to_insert, positions, "inserted")
+
+    def _count_down(self, remaining: Dict[int, int], positions: List[int], stage: str) -> None:
+        for position, count in Counter(positions).items():
+            remaining[position] -= count
+            if remaining[position] == 0:
+                self.store.checkpoint(self.job_id, position, stage)
+
+
+def _read_json(path: str) -> Any:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_json(path: str, data: Any) -> None:
+    """Grava em um arquivo temporário e renomeia: o checkpoint só é registrado depois da escrita completa."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(f"{path}.tmp", path)
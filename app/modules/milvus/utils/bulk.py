@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import asyncio
+import tempfile
+from typing import Iterable, List, Dict, Any
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pymilvus import utility
+from pymilvus.client.types import BulkInsertState
+
+try:
+    from minio import Minio
+except ImportError:
+    Minio = None
+
+from app.core.logging import logging
+from app.config.settings import settings
+from app.core.metrics import MILVUS_INSERT_ROWS, MILVUS_INSERT_SECONDS, timed
+
+logger = logging.getLogger(__name__)
+
+# Colunas gravadas nos arquivos Parquet (o id é auto_id e fica de fora)
+PARQUET_SCHEMA = pa.schema([
+    ("vector", pa.list_(pa.float32())),
+    ("text", pa.string()),
+    ("doc_id", pa.string()),
+    ("file_name", pa.string()),
+    ("page", pa.int64()),
+])
+# Colunas que só existem em parte das coleções (campos mais novos, partition key);
+# campos JSON vão como texto serializado no Parquet
+OPTIONAL_COLUMNS = {
+    "page_end": pa.int64(),
+    "ingested_at": pa.int64(),
+    "occurrences": pa.string(),
+    "tenant": pa.string(),
+}
+
+IMPORT_POLL_INTERVAL = 2
+
+
+class BulkLoader:
+    """
+    Carga em massa de chunks em uma coleção Milvus.
+
+    Com MILVUS_BULK_BUCKET configurado (e o pacote `minio` instalado), grava as linhas
+    em arquivos Parquet, envia para o object storage do Milvus e dispara o bulk import.
+    Caso contrário (ex.: Milvus Lite), insere em lotes grandes e faz um único flush no final.
+    """
+
+    def __init__(self, milvus_client, collection_name: str, fields: Iterable[str] = ()):
+        self.milvus_client = milvus_client
+        self.collection_name = collection_name
+        # colunas opcionais, conforme os campos (`fields`) do schema da coleção
+        self.parquet_schema = PARQUET_SCHEMA
+        for name, column_type in OPTIONAL_COLUMNS.items():
+            if name in fields:
+                self.parquet_schema = self.parquet_schema.append(pa.field(name, column_type))
+        self.remote = bool(settings.MILVUS_BULK_BUCKET) and Minio is not None
+        if settings.MILVUS_BULK_BUCKET and Minio is None:
+            logger.warning("Pacote 'minio' não instalado. Bulk import indisponível, usando insert em lotes.")
+
+        self.progress: Dict[str, Any] = {
+            "mode": "import" if self.remote else "insert",
+            "rows_written": 0,
+            "rows_imported": 0,
+            "files": [],
+            "tasks": {},
+            "rows_per_sec": 0.0,
+        }
+        # tempo gasto só com a carga (Parquet, upload, import, insert), sem os embeddings
+        self._load_seconds = 0.0
+        self._buffer: List[Dict[str, Any]] = []
+        self._writer = None
+        self._rows_in_file = 0
+        self._staging_dir = tempfile.mkdtemp(prefix=f"bulk_{collection_name}_") if self.remote else None
+
+    async def add_rows(self, rows: List[Dict[str, Any]]) -> None:
+        """Adiciona linhas à carga (Parquet no modo import, buffer no modo insert)."""
+        started = time.perf_counter()
+        if self.remote:
+            await asyncio.to_thread(self._write_parquet, rows)
+        else:
+            self._buffer.extend(rows)
+            while len(self._buffer) >= settings.MILVUS_BULK_INSERT_BATCH:
+                batch = self._buffer[:settings.MILVUS_BULK_INSERT_BATCH]
+                del self._buffer[:settings.MILVUS_BULK_INSERT_BATCH]
+                await self._insert(batch)
+        self._load_seconds += time.perf_counter() - started
+        self._update_rate()
+
+    async def finish(self) -> Dict[str, Any]:
+        """Conclui a carga (import + acompanhamento, ou último insert + flush) e retorna o progresso."""
+        started = time.perf_counter()
+        try:
+            if self.remote:
+                await asyncio.to_thread(self._close_file)
+                await self._import_files()
+            else:
+                if self._buffer:
+                    await self._insert(self._buffer)
+                    self._buffer = []
+                await asyncio.to_thread(self.milvus_client.flush, self.collection_name)
+        finally:
+            if self._staging_dir:
+                shutil.rmtree(self._staging_dir, ignore_errors=True)
+
+        self._load_seconds += time.perf_counter() - started
+        self._update_rate()
+        logger.info(f"Carga em massa de '{self.collection_name}' concluída: {self.progress}")
+        return self.progress
+
+    async def _insert(self, batch: List[Dict[str, Any]]) -> None:
+        with timed(MILVUS_INSERT_SECONDS, mode="bulk"):
+            await asyncio.to_thread(
+                self.milvus_client.insert, collection_name=self.collection_name, data=batch
+            )
+        MILVUS_INSERT_ROWS.labels("bulk").inc(len(batch))
+        self.progress["rows_written"] += len(batch)
+        self.progress["rows_imported"] += len(batch)
+        logger.info(f"Carga em massa: {self.progress['rows_imported']} linhas inseridas em '{self.collection_name}'")
+
+    def _write_parquet(self, rows: List[Dict[str, Any]]) -> None:
+        if self._writer is None:
+            path = os.path.join(self._staging_dir, f"part_{len(self.progress['files']):05d}.parquet")
+            self._writer = pq.ParquetWriter(path, self.parquet_schema)
+            self.progress["files"].append(path)
+        if "occurrences" in self.parquet_schema.names:
+            rows = [{**row, "occurrences": json.dumps(row["occurrences"], ensure_ascii=False)} for row in rows]
+        self._writer.write_table(pa.Table.from_pylist(rows, schema=self.parquet_schema))
+        self._rows_in_file += len(rows)
+        self.progress["rows_written"] += len(rows)
+        if self._rows_in_file >= settings.MILVUS_BULK_ROWS_PER_FILE:
+            self._close_file()
+
+    def _close_file(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._rows_in_file = 0
+
+    async def _import_files(self) -> None:
+        minio_client = Minio(
+            settings.MILVUS_BULK_MINIO_ENDPOINT,
+            access_key=settings.MILVUS_BULK_MINIO_ACCESS_KEY,
+            secret_key=settings.MILVUS_BULK_MINIO_SECRET_KEY,
+            secure=settings.MILVUS_BULK_MINIO_SECURE,
+        )
+        prefix = f"bulk/{self.collection_name}/{uuid.uuid4().hex}"
+
+        # 1) envia cada arquivo e dispara um import por arquivo
+        for path in self.progress["files"]:
+            object_name = f"{prefix}/{os.path.basename(path)}"
+            await asyncio.to_thread(
+                minio_client.fput_object, settings.MILVUS_BULK_BUCKET, object_name, path
+            )
+            task_id = await asyncio.to_thread(
+                utility.do_bulk_insert, collection_name=self.collection_name, files=[object_name]
+            )
+            self.progress["tasks"][task_id] = {"file": object_name, "state": "Pending", "progress": 0, "rows": 0}
+            logger.info(f"Bulk import {task_id} iniciado para {object_name}")
+
+        # 2) acompanha os imports até todos terminarem
+        pending = set(self.progress["tasks"])
+        while pending:
+            await asyncio.sleep(IMPORT_POLL_INTERVAL)
+            for task_id in list(pending):
+                state = await asyncio.to_thread(utility.get_bulk_insert_state, task_id)
+                task = self.progress["tasks"][task_id]
+                task.update({"state": state.state_name, "progress": state.progress, "rows": state.row_count})
+                if state.state in (BulkInsertState.ImportFailed, BulkInsertState.ImportFailedAndCleaned):
+                    raise RuntimeError(f"Bulk import {task_id} falhou: {state.failed_reason}")
+                if state.state == BulkInsertState.ImportCompleted:
+                    pending.discard(task_id)
+
+            self.progress["rows_imported"] = sum(t["rows"] for t in self.progress["tasks"].values())
+            logger.info(
+                f"Bulk import de '{self.collection_name}': "
+                f"{len(self.progress['tasks']) - len(pending)}/{len(self.progress['tasks'])} arquivos, "
+                f"{self.progress['rows_imported']} linhas"
+            )
+
+    def _update_rate(self) -> None:
+        if self._load_seconds > 0:
+            self.progress["rows_per_sec"] = round(self.progress["rows_imported"] / self._load_seconds, 1)
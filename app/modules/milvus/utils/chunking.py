@@ -0,0 +1,196 @@
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Tuple
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from app.core.logging import logging
+from app.core.tokens import count_tokens
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+HEADING = "heading"
+TABLE_ROW = "table_row"
+TEXT = "text"
+# heading/cabeçalho de tabela repetido no início de um chunk para dar contexto
+CONTEXT = "context"
+
+_heading_re = re.compile(r"^(#{1,6})\s+\S")
+_table_row_re = re.compile(r"^\|")
+_table_separator_re = re.compile(r"^\|?[\s:|-]*-{3,}[\s:|-]*$")
+_list_item_re = re.compile(r"^([-*+]|\d+[.)])\s")
+_sentence_re = re.compile(r"(?<=[.!?])\s+")
+_sentence_end_re = re.compile(r"[.!?;:]$")
+
+
+class Chunk(NamedTuple):
+    text: str
+    page_start: int
+    page_end: int
+    tokens: int
+
+
+class _Unit(NamedTuple):
+    kind: str
+    text: str
+    tokens: int
+    page: int
+    sep: str        # separador em relação à unidade anterior
+    level: int = 0  # nível do heading (# = 1)
+
+
+@lru_cache(maxsize=8)
+def _fallback_splitter(chunk_tokens: int) -> RecursiveCharacterTextSplitter:
+    """Splitter (criado uma vez por tamanho) para frases que sozinhas passam do tamanho do chunk."""
+    return RecursiveCharacterTextSplitter(
+        separators=[" ", ""],
+        chunk_size=chunk_tokens,
+        chunk_overlap=0,
+        length_function=count_tokens,
+    )
+
+
+class StructuredChunker:
+    """
+    Divide documentos em chunks medidos em tokens, respeitando a estrutura do
+    markdown gerado pelo OCRService:
+
+    - as páginas de um documento são processadas em sequência, então páginas
+      pequenas se juntam e a frase cortada no fim de uma página continua no
+      mesmo chunk; cada chunk guarda a página inicial e a final;
+    - headings (`#`) abrem um chunk novo quando o atual já tem pelo menos metade
+      do tamanho, e o caminho de headings é repetido no início dos chunks
+      seguintes da mesma seção;
+    - linhas de tabela (`| ... |`) nunca são cortadas, e um chunk que começa no
+      meio de uma tabela repete o cabeçalho dela;
+    - texto corrido é empacotado por frases, com `overlap_tokens` de sobreposição.
+    """
+
+    def __init__(self, chunk_tokens: int, overlap_tokens: int):
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.min_fill = chunk_tokens // 2
+        self.max_context = chunk_tokens // 4
+
+    def chunk(self, pages: Iterable[Tuple[int, str]]) -> Iterator[Chunk]:
+        """Recebe (página, texto) em ordem e gera os chunks do documento à medida que as páginas chegam."""
+        buffer: List[_Unit] = []
+        buffer_tokens = 0
+        headings: Dict[int, _Unit] = {}
+        table_header: List[_Unit] = []
+        previous = None
+
+        for page, text in pages:
+            for position, unit in enumerate(self._units(text, page)):
+                if position == 0:
+                    # continua a frase que a página anterior deixou pela metade
+                    mends = (
+                        previous is not None and previous.kind == TEXT and unit.kind == TEXT
+                        and not _sentence_end_re.search(previous.text)
+                    )
+                    unit = unit._replace(sep=" " if mends else "\n\n")
+
+                has_content = any(item.kind != CONTEXT for item in buffer)
+                starts_section = unit.kind == HEADING and buffer_tokens >= self.min_fill
+                if has_content and (starts_section or buffer_tokens + unit.tokens > self.chunk_tokens):
+                    yield self._emit(buffer)
+                    buffer = self._carry(buffer, unit, headings, table_header)
+                    buffer_tokens = sum(item.tokens for item in buffer)
+                    if buffer and buffer[-1].kind == CONTEXT:
+                        unit = unit._replace(sep="\n")
+
+                buffer.append(unit)
+                buffer_tokens += unit.tokens
+                previous = unit
+
+                if unit.kind == HEADING:
+                    headings = {level: item for level, item in headings.items() if level < unit.level}
+                    headings[unit.level] = unit
+                if unit.kind != TABLE_ROW:
+                    table_header = []
+                elif not table_header or (len(table_header) == 1 and _table_separator_re.match(unit.text)):
+                    table_header.append(unit)
+
+        if any(item.kind != CONTEXT for item in buffer):
+            yield self._emit(buffer)
+
+    def _units(self, text: str, page: int) -> Iterator[_Unit]:
+        """Quebra a página em headings, linhas de tabela, itens de lista e frases."""
+        paragraph: List[str] = []
+        sep = "\n\n"
+        for line in text.split("\n") + [""]:
+            stripped = line.strip()
+            is_heading = _heading_re.match(stripped)
+            is_table = _table_row_re.match(stripped)
+            is_item = _list_item_re.match(stripped)
+            if paragraph and (not stripped or is_heading or is_table or is_item):
+                for index, sentence in enumerate(self._sentences(" ".join(paragraph))):
+                    yield _Unit(TEXT, sentence, count_tokens(sentence), page, sep if index == 0 else " ")
+                paragraph, sep = [], "\n\n"
+            if not stripped:
+                sep = "\n\n"
+            elif is_heading:
+                yield _Unit(HEADING, stripped, count_tokens(stripped), page, sep, len(is_heading.group(1)))
+                sep = "\n"
+            elif is_table:
+                yield _Unit(TABLE_ROW, stripped, count_tokens(stripped), page, sep)
+                sep = "\n"
+            elif is_item:
+                for index, part in enumerate(self._sentences(stripped)):
+                    yield _Unit(TEXT, part, count_tokens(part), page, sep if index == 0 else " ")
+                sep = "\n"
+            else:
+                paragraph.append(stripped)
+
+    def _sentences(self, paragraph: str) -> Iterator[str]:
+        for sentence in _sentence_re.split(paragraph):
+            if count_tokens(sentence) <= self.chunk_tokens:
+                yield sentence
+            else:
+                yield from _fallback_splitter(self.chunk_tokens).split_text(sentence)
+
+    def _carry(
+        self,
+        buffer: List[_Unit],
+        next_unit: _Unit,
+        headings: Dict[int, _Unit],
+        table_header: List[_Unit],
+    ) -> List[_Unit]:
+        """Começo do próximo chunk: caminho de headings, cabeçalho da tabela e a sobreposição de texto."""
+        context = [
+            heading for level, heading in sorted(headings.items())
+            if next_unit.kind != HEADING or level < next_unit.level
+        ]
+        if next_unit.kind == TABLE_ROW and table_header:
+            context.extend(table_header)
+        while context and sum(item.tokens for item in context) > self.max_context:
+            context.pop(0)
+        carried = [item._replace(kind=CONTEXT, sep="\n") for item in context]
+
+        overlap: List[_Unit] = []
+        if next_unit.kind == TEXT and next_unit.sep == " ":
+            tokens = 0
+            for item in reversed(buffer):
+                if item.kind != TEXT or tokens + item.tokens > self.overlap_tokens:
+                    break
+                overlap.insert(0, item)
+                tokens += item.tokens
+        if overlap and carried:
+            overlap[0] = overlap[0]._replace(sep="\n")
+        return carried + overlap
+
+    @staticmethod
+    def _emit(buffer: List[_Unit]) -> Chunk:
+        parts = [buffer[0].text] + [item.sep + item.text for item in buffer[1:]]
+        pages = [item.page for item in buffer if item.kind != CONTEXT]
+        return Chunk(
+            text="".join(parts),
+            page_start=min(pages),
+            page_end=max(pages),
+            tokens=sum(item.tokens for item in buffer),
+        )
+
+
+chunker = StructuredChunker(
+    chunk_tokens=settings.INGEST_CHUNK_TOKENS,
+    overlap_tokens=settings.INGEST_CHUNK_OVERLAP_TOKENS,
+)
@@ -0,0 +1,155 @@
+import re
+import time
+import zlib
+from typing import Dict, List, Any, Optional, Tuple
+import numpy as np
+from app.core.logging import logging
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# permutações do MinHash por hash multiply-shift ((a * x + b) >> 32, aritmética de 64 bits);
+# sementes fixas para que a mesma entrada gere sempre as mesmas decisões (o modo sync
+# compara doc_ids entre cargas)
+SHIFT = np.uint64(32)
+SEED = 1
+SHINGLE_MULTIPLIER = 0x9E3779B97F4A7C15
+# bytes de um vetor de 3072 float32 armazenado no Milvus
+VECTOR_BYTES = 3072 * 4
+
+_word_re = re.compile(r"\w+")
+
+
+def shingle_hashes(text: str, size: int) -> np.ndarray:
+    """
+    Hashes de 32 bits dos shingles de `size` palavras do texto, sem distinguir maiúsculas:
+    cada palavra é hasheada uma vez (crc32) e os shingles combinam os hashes vizinhos.
+    """
+    words = np.array([zlib.crc32(word.encode("utf-8")) for word in _word_re.findall(text.casefold())], dtype=np.uint64)
+    if len(words) == 0:
+        return np.zeros(1, dtype=np.uint64)
+    size = min(size, len(words))
+    count = len(words) - size + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset in range(size):
+        hashes = hashes * np.uint64(SHINGLE_MULTIPLIER) + words[offset:offset + count]
+    return hashes >> SHIFT ^ hashes & np.uint64(0xFFFFFFFF)
+
+
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    (bandas, linhas por banda) que minimizam a soma das probabilidades de falso
+    positivo e falso negativo em torno do limiar de Jaccard.
+    """
+    similarities = np.linspace(0.0, 1.0, 201)
+    below, above = similarities < threshold, similarities >= threshold
+    best, best_error = (num_perm, 1), float("inf")
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        candidate = 1 - (1 - similarities ** rows) ** bands
+        error = candidate[below].mean() * threshold + (1 - candidate[above]).mean() * (1 - threshold)
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class NearDuplicateIndex:
+    """
+    Índice incremental de quase-duplicatas (MinHash + LSH por bandas).
+
+    Cada texto vira uma assinatura MinHash dos seus shingles de palavras; as bandas
+    da assinatura são chaves de buckets, e só os textos que caem no mesmo bucket de
+    algum representativo são comparados (Jaccard estimado pela fração de posições
+    iguais na assinatura). Custo por texto independe do tamanho do índice, então a
+    deduplicação é aproximadamente linear no número de chunks.
+    """
+
+    def __init__(self, threshold: float, num_perm: int = 128, shingle_size: int = 3):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        self.num_perm = self.bands * self.rows
+        generator = np.random.RandomState(SEED)
+        self._a = generator.randint(0, 1 << 63, size=self.num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = generator.randint(0, 1 << 63, size=self.num_perm, dtype=np.uint64)
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        self._signatures: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = shingle_hashes(text, self.shingle_size)
+        permuted = (np.outer(hashes, self._a) + self._b) >> SHIFT
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def add(self, text: str) -> Optional[int]:
+        """
+        Retorna a posição do representativo se o texto for quase-duplicata de um já
+        indexado; senão indexa o texto como novo representativo e retorna None.
+        """
+        signature = self.signature(text)
+        keys = [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+        checked = set()
+        for band, key in enumerate(keys):
+            for candidate in self._buckets[band].get(key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                if np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                    return candidate
+
+        position = len(self._signatures)
+        self._signatures.append(signature)
+        for band, key in enumerate(keys):
+            self._buckets[band].setdefault(key, []).append(position)
+        return None
+
+
+def deduplicate_chunks(
+    chunks: List[str],
+    metadata: List[Dict[str, Any]],
+    threshold: float = settings.INGEST_DEDUP_THRESHOLD,
+    num_perm: int = settings.INGEST_DEDUP_NUM_PERM,
+    shingle_size: int = settings.INGEST_DEDUP_SHINGLE_SIZE,
+    max_occurrences: int = settings.INGEST_DEDUP_MAX_OCCURRENCES,
+) -> Tuple[List[str], List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Mantém a primeira ocorrência de cada grupo de chunks quase idênticos (cabeçalhos,
+    rodapés e avisos repetidos em todas as páginas) e descarta as demais antes das
+    embeddings. A metadata do representativo ganha `occurrences`: arquivo e página
+    das cópias descartadas (até `max_occurrences`).
+    Retorna os chunks e a metadata mantidos e um relatório com o que deixou de ser
+    embedado e armazenado.
+    """
+    started = time.perf_counter()
+    index = NearDuplicateIndex(threshold, num_perm, shingle_size)
+    kept_chunks: List[str] = []
+    kept_metadata: List[Dict[str, Any]] = []
+    duplicates = 0
+    text_bytes_saved = 0
+
+    for chunk, meta in zip(chunks, metadata):
+        representative = index.add(chunk)
+        if representative is None:
+            kept_chunks.append(chunk)
+            kept_metadata.append({**meta, "occurrences": []})
+            continue
+        duplicates += 1
+        text_bytes_saved += len(chunk.encode("utf-8"))
+        occurrences = kept_metadata[representative]["occurrences"]
+        if len(occurrences) < max_occurrences:
+            occurrences.append({"file_name": meta.get("file_name"), "page": meta.get("page")})
+
+    report = {
+        "chunks_in": len(chunks),
+        "chunks_out": len(kept_chunks),
+        "duplicates": duplicates,
+        "embeddings_saved": duplicates,
+        "bytes_saved": text_bytes_saved + duplicates * VECTOR_BYTES,
+        "threshold": threshold,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    logger.info(f"Deduplicação de chunks: {report}")
+    return kept_chunks, kept_metadata, report
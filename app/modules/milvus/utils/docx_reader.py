@@ -0,0 +1,226 @@
+import posixpath
+import zipfile
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from lxml import etree
+from docx.styles import BabelFish
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+OFFICE_DOCUMENT_REL = "/officeDocument"
+STYLES_REL = "/styles"
+
+
+def _w(tag: str) -> str:
+    return f"{{{W_NS}}}{tag}"
+
+
+W_BODY, W_P, W_TBL, W_TR, W_TC = _w("body"), _w("p"), _w("tbl"), _w("tr"), _w("tc")
+W_R, W_HYPERLINK, W_PPR, W_PSTYLE = _w("r"), _w("hyperlink"), _w("pPr"), _w("pStyle")
+W_T, W_TAB, W_PTAB, W_BR, W_CR, W_NO_BREAK_HYPHEN = _w("t"), _w("tab"), _w("ptab"), _w("br"), _w("cr"), _w("noBreakHyphen")
+W_SECT_PR, W_PAGE_BREAK_BEFORE = _w("sectPr"), _w("pageBreakBefore")
+W_TCPR, W_GRID_SPAN, W_VMERGE, W_TRPR, W_GRID_BEFORE = _w("tcPr"), _w("gridSpan"), _w("vMerge"), _w("trPr"), _w("gridBefore")
+W_VAL, W_TYPE = _w("val"), _w("type")
+
+# marca de quebra de página dentro do texto de um parágrafo
+PAGE_BREAK = "\f"
+_FALSE_VALUES = {"0", "false", "off"}
+
+
+def _part_path(archive: zipfile.ZipFile, source: str, rel_suffix: str, default: str) -> str:
+    """Caminho da parte ligada a `source` pelo relacionamento `rel_suffix` (ex.: /styles)."""
+    directory, name = posixpath.split(source)
+    rels_path = posixpath.join(directory, "_rels", f"{name}.rels")
+    try:
+        rels = etree.fromstring(archive.read(rels_path))
+    except KeyError:
+        return default
+    for rel in rels.iter(f"{{{REL_NS}}}Relationship"):
+        if rel.get("Type", "").endswith(rel_suffix) and rel.get("TargetMode") != "External":
+            target = rel.get("Target")
+            if target.startswith("/"):
+                return target.lstrip("/")
+            return posixpath.normpath(posixpath.join(directory, target))
+    return default
+
+
+def _heading_levels(archive: zipfile.ZipFile, styles_path: str) -> Tuple[Dict[str, Optional[int]], Optional[int]]:
+    """
+    Lê styles.xml uma única vez: styleId -> nível de heading (None se não for heading),
+    e o nível do estilo de parágrafo padrão. Mesmas regras do python-docx: estilo
+    inexistente ou de outro tipo vale como o padrão.
+    """
+    try:
+        root = etree.fromstring(archive.read(styles_path))
+    except KeyError:
+        return {}, None
+
+    levels: Dict[str, Optional[int]] = {}
+    default_level = None
+    for style in root.iter(_w("style")):
+        if style.get(W_TYPE, "paragraph") != "paragraph":
+            continue
+        name_element = style.find(_w("name"))
+        name = BabelFish.internal2ui(name_element.get(W_VAL)) if name_element is not None else None
+        level = None
+        if name and name.startswith("Heading"):
+            level = int(name[-1]) if name[-1].isdigit() else 1
+        style_id = style.get(_w("styleId"))
+        if style_id is not None and style_id not in levels:
+            levels[style_id] = level
+        if style.get(_w("default")) in ("1", "true", "on"):
+            default_level = level
+    return levels, default_level
+
+
+def _run_text(run: etree._Element) -> str:
+    parts = []
+    for child in run:
+        tag = child.tag
+        if tag == W_T:
+            parts.append(child.text or "")
+        elif tag in (W_TAB, W_PTAB):
+            parts.append("\t")
+        elif tag == W_BR:
+            br_type = child.get(W_TYPE, "textWrapping")
+            parts.append("\n" if br_type == "textWrapping" else PAGE_BREAK if br_type == "page" else "")
+        elif tag == W_CR:
+            parts.append("\n")
+        elif tag == W_NO_BREAK_HYPHEN:
+            parts.append("-")
+    return "".join(parts)
+
+
+def _paragraph_text(paragraph: etree._Element) -> str:
+    """Texto do parágrafo como no python-docx (runs e hyperlinks), com PAGE_BREAK nas quebras de página."""
+    parts = []
+    for child in paragraph:
+        if child.tag == W_R:
+            parts.append(_run_text(child))
+        elif child.tag == W_HYPERLINK:
+            parts.extend(_run_text(run) for run in child.iterchildren(W_R))
+    return "".join(parts)
+
+
+def _int_val(element: Optional[etree._Element], default: int) -> int:
+    if element is None:
+        return default
+    try:
+        return int(element.get(W_VAL))
+    except (TypeError, ValueError):
+        return default
+
+
+def _table_rows(table: etree._Element) -> Iterator[List[str]]:
+    """
+    Texto das células de cada linha, uma entrada por coluna da grade: células com
+    gridSpan se repetem, e as continuações de vMerge repetem o texto da célula de
+    origem (acima), guardado por coluna em vez de percorrer as linhas anteriores.
+    """
+    above: Dict[int, str] = {}
+    for row in table.iterchildren(W_TR):
+        trpr = row.find(W_TRPR)
+        offset = _int_val(trpr.find(W_GRID_BEFORE) if trpr is not None else None, 0)
+        cells: List[str] = []
+        for cell in row.iterchildren(W_TC):
+            tcpr = cell.find(W_TCPR)
+            span = _int_val(tcpr.find(W_GRID_SPAN) if tcpr is not None else None, 1)
+            vmerge = tcpr.find(W_VMERGE) if tcpr is not None else None
+            if vmerge is not None and vmerge.get(W_VAL, "continue") == "continue":
+                text = above.get(offset, "")
+            else:
+                text = "\n".join(
+                    _paragraph_text(paragraph).replace(PAGE_BREAK, "")
+                    for paragraph in cell.iterchildren(W_P)
+                )
+            above[offset] = text
+            cells.extend([text] * span)
+            offset += span
+        yield cells
+
+
+def _table_markdown(table: etree._Element) -> Optional[str]:
+    rows = [[text.strip() or " " for text in cells] for cells in _table_rows(table)]
+    if not rows:
+        return None
+    header = rows[0]
+    lines = ["| " + " | ".join(header) + " |", "| " + " | ".join(["---"] * len(header)) + " |"]
+    lines.extend("| " + " | ".join(cells) + " |" for cells in rows[1:])
+    return "\n".join(lines)
+
+
+def _breaks_page_before(paragraph: etree._Element) -> bool:
+    ppr = paragraph.find(W_PPR)
+    if ppr is None:
+        return False
+    element = ppr.find(W_PAGE_BREAK_BEFORE)
+    return element is not None and element.get(W_VAL, "true") not in _FALSE_VALUES
+
+
+def _ends_section(paragraph: etree._Element) -> bool:
+    ppr = paragraph.find(W_PPR)
+    return ppr is not None and ppr.find(W_SECT_PR) is not None
+
+
+def read_docx_pages(file_path: Union[str, Path]) -> List[Dict]:
+    """
+    Extrai o texto de um .docx lendo o word/document.xml em streaming (lxml iterparse),
+    sem montar a árvore inteira nem os objetos do python-docx.
+
+    Produz o mesmo markdown do extrator anterior (headings como `#`, tabelas como
+    tabelas markdown, partes separadas por linha em branco), mas dividido em páginas
+    lógicas: uma página nova a cada quebra de página explícita (`w:br type="page"`,
+    `pageBreakBefore`) ou quebra de seção. Retorna [{"page_number", "content"}] sem
+    limpeza de texto (feita pelo OCRService).
+    """
+    pages: List[Dict] = []
+    parts: List[str] = []
+    page_number = 1
+
+    def new_page():
+        nonlocal parts, page_number
+        if parts:
+            pages.append({"page_number": page_number, "content": "\n\n".join(parts)})
+        parts = []
+        page_number += 1
+
+    with zipfile.ZipFile(file_path) as archive:
+        document_path = _part_path(archive, "", OFFICE_DOCUMENT_REL, "word/document.xml")
+        levels, default_level = _heading_levels(
+            archive, _part_path(archive, document_path, STYLES_REL, "word/styles.xml")
+        )
+
+        with archive.open(document_path) as document:
+            for _, element in etree.iterparse(document, events=("end",), tag=(W_P, W_TBL)):
+                parent = element.getparent()
+                if parent is None or parent.tag != W_BODY:
+                    continue
+
+                if element.tag == W_TBL:
+                    markdown = _table_markdown(element)
+                    if markdown is not None:
+                        parts.append(markdown)
+                else:
+                    if _breaks_page_before(element):
+                        new_page()
+                    ppr = element.find(W_PPR)
+                    style = ppr.find(W_PSTYLE) if ppr is not None else None
+                    style_id = style.get(W_VAL) if style is not None else None
+                    level = levels.get(style_id, default_level) if style_id is not None else default_level
+
+                    for index, text in enumerate(_paragraph_text(element).split(PAGE_BREAK)):
+                        if index > 0:
+                            new_page()
+                        if text.strip():
+                            parts.append(f"{'#' * level} {text}" if level else text)
+                    if _ends_section(element):
+                        new_page()
+
+                # libera o que já foi processado (o elemento e os irmãos anteriores do body)
+                element.clear(keep_tail=True)
+                while element.getprevious() is not None:
+                    del parent[0]
+
+    if parts:
+        pages.append({"page_number": page_number, "content": "\n\n".join(parts)})
+    return pages
@@ -1,8 +1,10 @@
 import os
+import time
 import uuid
 import tempfile
 import requests
 import logging
+from app.core.metrics import DOWNLOAD_SECONDS, observe_download, timed
 
 
 def download_links_to_temp_dir(links: list[str], folder_name: str = None) -> str:
@@ -24,18 +26,29 @@ def download_links_to_temp_dir(links: list[str], folder_name: str = None) -> str
 
     for link in links:
         try:
-            response = requests.get(link, timeout=60)
-            response.raise_for_status()
-            # Extrai nome de arquivo da URL
-            parsed = requests.utils.urlparse(link)
-            filename = os.path.basename(parsed.path) or f"file_{uuid.uuid4().hex}"
-            file_path = os.path.join(temp_dir, filename)
-            file_paths.append(file_path)
-            # Salva o conteúdo
-            with open(file_path, "wb") as f:
-                f.write(response.content)
-            logging.info(f"Downloaded {link} -> {file_path}")
+            file_paths.append(download_link(link, temp_dir))
         except Exception as e:
             logging.error(f"Falha ao baixar {link}: {e}")
 
-    return file_paths, temp_dir
\ No newline at end of file
+    return file_paths, temp_dir
+
+
+def download_link(link: str, directory: str) -> str:
+    """
+    Baixa uma URL para `directory`, com o nome do arquivo da URL.
+    Retorna o caminho do arquivo salvo; erros de rede/HTTP são propagados.
+    """
+    started = time.perf_counter()
+    with timed(DOWNLOAD_SECONDS, source="link"):
+        response = requests.get(link, timeout=60)
+        response.raise_for_status()
+    observe_download("link", len(response.content), time.perf_counter() - started)
+    # Extrai nome de arquivo da URL
+    parsed = requests.utils.urlparse(link)
+    filename = os.path.basename(parsed.path) or f"file_{uuid.uuid4().hex}"
+    file_path = os.path.join(directory, filename)
+    # Salva o conteúdo
+    with open(file_path, "wb") as f:
+        f.write(response.content)
+    logging.info(f"Downloaded {link} -> {file_path}")
+    return file_path
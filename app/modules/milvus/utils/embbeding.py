@@ -1,16 +1,14 @@
 import asyncio
 import hashlib
-from typing import List
+from functools import lru_cache
+from typing import Dict, List
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from app.config.settings import settings
-from pymilvus import model
+from app.core.admission import Priority
+from app.core.providers import provider_gateway
 
-# Configura função de embeddings do OpenAI
-openai_ef = model.dense.OpenAIEmbeddingFunction(
-    model_name='text-embedding-3-large',  # Specify the model name
-    api_key=settings.OPENAI_API_KEY,       # Provide your OpenAI API key
-    dimensions=3072                        # Set the embedding dimensionality
-)
+# Modelo e dimensão das embeddings da ingestão (pelo gateway dos provedores)
+EMBEDDING_MODEL = 'text-embedding-3-large'
+EMBEDDING_DIMENSIONS = 3072
 
 # Text processing utilities
 def normalize_text(text: str) -> str:
@@ -22,14 +20,28 @@ def generate_doc_id(text: str) -> str:
     normalized_text = normalize_text(text)
     return hashlib.md5(normalized_text.encode("utf-8")).hexdigest()
 
-def split_text(text: str, chunk_size: int = 1024, overlap: int = 150) -> List[str]:
-    """Splits text into chunks using RecursiveCharacterTextSplitter"""
-    splitter = RecursiveCharacterTextSplitter(
+def generate_chunk_id(text: str, seen: Dict[str, int]) -> str:
+    """
+    Generates a stable doc_id for a chunk: MD5 of its text plus the occurrence
+    of that text inside the file (`seen` must be one dict per file).
+    """
+    digest = generate_doc_id(text)
+    occurrence = seen.get(digest, 0)
+    seen[digest] = occurrence + 1
+    return f"{digest}-{occurrence}"
+
+@lru_cache(maxsize=8)
+def _character_splitter(chunk_size: int, overlap: int) -> RecursiveCharacterTextSplitter:
+    """One splitter per (chunk_size, overlap), reused across calls"""
+    return RecursiveCharacterTextSplitter(
         separators=["\n\n", "\n", " ", ""],
         chunk_size=chunk_size,
         chunk_overlap=overlap,
     )
-    return splitter.split_text(text)
+
+def split_text(text: str, chunk_size: int = 1024, overlap: int = 150) -> List[str]:
+    """Splits text into chunks using RecursiveCharacterTextSplitter"""
+    return _character_splitter(chunk_size, overlap).split_text(text)
 
 async def batches_chunks(
     chunks: List[str],
@@ -41,17 +53,14 @@ async def batches_chunks(
     return [chunks[i:i + chunks_per_batch] for i in range(0, len(chunks), chunks_per_batch)]
 
 async def embed_batch(batch: List[str], sem: asyncio.Semaphore) -> List[List[float]]:
-    """Embeds a batch of text chunks usando OpenAIEmbeddingFunction."""
+    """Embeds a batch of text chunks (embed_texts numa thread)."""
     async with sem:
-        if asyncio.iscoroutinefunction(openai_ef.encode_documents):
-            return await openai_ef.encode_documents(batch)
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, openai_ef.encode_documents, batch)
+        return await loop.run_in_executor(None, embed_texts, batch)
 
 def embed_texts(texts: List[str]) -> List[List[float]]:
     """
-    Gera embeddings para uma lista de textos de forma síncrona.
-    Usa o OpenAIEmbeddingFunction (pymilvus.model).
+    Gera embeddings para uma lista de textos de forma síncrona, pelo gateway dos
+    provedores com prioridade BATCH (a reserva do chat nos limites fica de fora).
     """
-    # encode_documents aceita lista de strings e retorna lista de embeddings
-    return openai_ef.encode_documents(texts)
+    return provider_gateway.embed(texts, EMBEDDING_MODEL, Priority.BATCH, dimensions=EMBEDDING_DIMENSIONS)
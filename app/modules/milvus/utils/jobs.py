@@ -0,0 +1,448 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from enum import Enum
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from app.core.logging import logging
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Etapas de cada arquivo, em ordem. As três primeiras são contadas em arquivos;
+# embedded e inserted em chunks (o total só é conhecido depois do dedup/sync).
+STAGES = ("downloaded", "extracted", "chunked", "embedded", "inserted")
+FILE_STAGES = STAGES[:3]
+
+
+class JobStatus(str, Enum):
+    """Estados de um job de ingestão"""
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class JobKind(str, Enum):
+    """Tipos de job executados pelos workers (python -m app.worker)"""
+    INGESTION = "ingestion"
+    DOWNLOAD = "download"
+
+
+TERMINAL_STATUSES = {JobStatus.SUCCEEDED.value, JobStatus.FAILED.value}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL DEFAULT 'ingestion',
+    status TEXT NOT NULL,
+    request TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    updated_at REAL NOT NULL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT,
+    worker TEXT,
+    heartbeat_at REAL
+);
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    link TEXT NOT NULL,
+    file_name TEXT,
+    stage TEXT,
+    error TEXT,
+    updated_at REAL,
+    PRIMARY KEY (job_id, position)
+);
+CREATE TABLE IF NOT EXISTS job_stages (
+    job_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    total INTEGER,
+    baseline INTEGER NOT NULL DEFAULT 0,
+    started_at REAL,
+    updated_at REAL,
+    PRIMARY KEY (job_id, stage)
+);
+CREATE TABLE IF NOT EXISTS collection_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+"""
+# colunas acrescentadas depois da criação da tabela jobs (stores antigos ganham com ALTER TABLE)
+_JOB_COLUMNS = {
+    "kind": "TEXT NOT NULL DEFAULT 'ingestion'",
+    "worker": "TEXT",
+    "heartbeat_at": "REAL",
+}
+
+
+def stage_reached(stage: Optional[str], target: str) -> bool:
+    """True se o arquivo já passou (checkpoint) pela etapa `target`."""
+    return stage is not None and STAGES.index(stage) >= STAGES.index(target)
+
+
+class JobStore:
+    """
+    Jobs de ingestão persistidos em SQLite: o pedido, o status, o checkpoint de
+    cada arquivo (última etapa concluída) e os contadores de cada etapa, usados
+    para o progresso (contagens, throughput e ETA). Os artefatos intermediários
+    (arquivos baixados, páginas, chunks e embeddings) ficam em `artifacts_dir/<job_id>`.
+
+    É também a fila dos workers: cada operação abre a própria conexão (WAL), então
+    a API enfileira e vários processos de worker disputam os jobs com `claim`
+    (transação IMMEDIATE). O worker renova um lease (heartbeat) enquanto executa;
+    um job em execução com o lease vencido (worker morto) volta a ser reivindicável
+    e continua dos checkpoints.
+    """
+
+    def __init__(self, path: str, artifacts_dir: str):
+        self.path = path
+        self.artifacts_dir = artifacts_dir
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, definition in _JOB_COLUMNS.items():
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+            conn.executescript(_INDEXES)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.artifacts_dir, job_id)
+
+    def create(self, request: Dict[str, Any], links: List[str], kind: JobKind = JobKind.INGESTION) -> str:
+        """Enfileira um job; `links` são os arquivos com checkpoint por etapa."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, request, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind.value, JobStatus.QUEUED.value, json.dumps(request, ensure_ascii=False), now, now),
+            )
+            conn.executemany(
+                "INSERT INTO job_files (job_id, position, link, updated_at) VALUES (?, ?, ?, ?)",
+                [(job_id, position, link, now) for position, link in enumerate(links)],
+            )
+            conn.executemany(
+                "INSERT INTO job_stages (job_id, stage, total) VALUES (?, ?, ?)",
+                [(job_id, stage, len(links) if stage in FILE_STAGES else None) for stage in STAGES],
+            )
+        return job_id
+
+    def request(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT request FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row["request"]) if row else None
+
+    def claim(
+        self,
+        worker_id: str,
+        kinds: Iterable[str] = tuple(kind.value for kind in JobKind),
+        lease_seconds: float = settings.INGEST_WORKER_LEASE_SECONDS,
+        job_id: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Reivindica o job mais antigo na fila (ou em execução com o lease vencido),
+        ou o job `job_id`, e o marca como em execução por `worker_id`. Retorna
+        {"id", "kind", "attempts"} (attempts > 1 ao retomar) ou None.
+
+        Os contadores das etapas guardam o ponto de partida desta tentativa, para o
+        throughput não contar o trabalho de tentativas anteriores.
+        """
+        kinds = list(kinds)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            query = (
+                f"SELECT id, kind FROM jobs WHERE kind IN ({','.join('?' * len(kinds))}) AND "
+                "(status = ? OR (status = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?)))"
+            )
+            params: List[Any] = [*kinds, JobStatus.QUEUED.value, JobStatus.RUNNING.value, now - lease_seconds]
+            if job_id is not None:
+                query += " AND id = ?"
+                params.append(job_id)
+            row = conn.execute(query + " ORDER BY created_at LIMIT 1", params).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, heartbeat_at = ?, attempts = attempts + 1, "
+                "started_at = ?, updated_at = ?, error = NULL WHERE id = ?",
+                (JobStatus.RUNNING.value, worker_id, now, now, now, row["id"]),
+            )
+            # as etapas por arquivo começam junto com o job; as por chunk, em set_stage
+            conn.execute(
+                "UPDATE job_stages SET baseline = done, "
+                f"started_at = CASE WHEN stage IN ({','.join('?' * len(FILE_STAGES))}) THEN ? ELSE NULL END, "
+                "updated_at = NULL WHERE job_id = ?",
+                (*FILE_STAGES, now, row["id"]),
+            )
+            attempts = conn.execute("SELECT attempts FROM jobs WHERE id = ?", (row["id"],)).fetchone()["attempts"]
+        return {"id": row["id"], "kind": row["kind"], "attempts": attempts}
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """Renova o lease; False se o job não é mais deste worker (lease vencido e reivindicado por outro)."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND worker = ? AND status = ?",
+                (time.time(), job_id, worker_id, JobStatus.RUNNING.value),
+            )
+        return cursor.rowcount > 0
+
+    @contextmanager
+    def lease(
+        self,
+        job_id: str,
+        worker_id: str,
+        interval: float = settings.INGEST_WORKER_HEARTBEAT_INTERVAL,
+    ) -> Iterator[None]:
+        """
+        Renova o lease do job a cada `interval` segundos enquanto o bloco executa.
+        O heartbeat roda numa thread, então continua mesmo com o event loop ocupado.
+        """
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(interval):
+                try:
+                    if not self.heartbeat(job_id, worker_id):
+                        logger.warning(f"Job {job_id} não pertence mais ao worker {worker_id}")
+                        return
+                except sqlite3.Error as e:
+                    logger.warning(f"Falha no heartbeat do job {job_id}: {e}")
+
+        thread = threading.Thread(target=beat, name=f"lease-{job_id}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def release(self, job_id: str, worker_id: str) -> None:
+        """Devolve à fila um job interrompido (ex.: worker encerrado), para outro worker retomar."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, heartbeat_at = NULL, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (JobStatus.QUEUED.value, time.time(), job_id, worker_id, JobStatus.RUNNING.value),
+            )
+
+    def requeue(self, job_id: str) -> bool:
+        """Recoloca na fila um job que falhou; False se ele não está com falha."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (JobStatus.QUEUED.value, time.time(), job_id, JobStatus.FAILED.value),
+            )
+        return cursor.rowcount > 0
+
+    def finish(self, job_id: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> None:
+        now = time.time()
+        status = JobStatus.FAILED if error is not None else JobStatus.SUCCEEDED
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, updated_at = ?, "
+                "worker = NULL, heartbeat_at = NULL WHERE id = ?",
+                (
+                    status.value,
+                    json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+                    error, now, now, job_id,
+                ),
+            )
+        if status == JobStatus.SUCCEEDED:
+            # os artefatos só servem para retomar
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def files(self, job_id: str) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT position, link, file_name, stage, error FROM job_files WHERE job_id = ? ORDER BY position",
+                (job_id,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def checkpoint(self, job_id: str, position: int, stage: str, file_name: Optional[str] = None) -> None:
+        """Registra que o arquivo concluiu `stage` (e conta um arquivo nas etapas por arquivo)."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE job_files SET stage = ?, file_name = COALESCE(?, file_name), updated_at = ? "
+                "WHERE job_id = ? AND position = ?",
+                (stage, file_name, now, job_id, position),
+            )
+            if stage in FILE_STAGES:
+                self._advance(conn, job_id, stage, 1, now)
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (now, job_id))
+
+    def fail_file(self, job_id: str, position: int, error: str) -> None:
+        """
+        Arquivo descartado (ex.: download falhou, tipo não suportado): não é retomado
+        e sai do total das etapas por arquivo que ainda não tinha concluído.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT stage FROM job_files WHERE job_id = ? AND position = ?", (job_id, position)
+            ).fetchone()
+            conn.execute(
+                "UPDATE job_files SET error = ?, updated_at = ? WHERE job_id = ? AND position = ?",
+                (error, now, job_id, position),
+            )
+            for stage in FILE_STAGES:
+                if not stage_reached(row["stage"], stage):
+                    conn.execute(
+                        "UPDATE job_stages SET total = total - 1 WHERE job_id = ? AND stage = ?", (job_id, stage)
+                    )
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (now, job_id))
+
+    def set_stage(self, job_id: str, stage: str, done: int, total: int) -> None:
+        """Início de uma etapa medida em chunks: total e ponto de partida (trabalho já salvo não conta no throughput)."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE job_stages SET done = ?, total = ?, baseline = ?, started_at = ?, updated_at = ? "
+                "WHERE job_id = ? AND stage = ?",
+                (done, total, done, now, now, job_id, stage),
+            )
+
+    def advance(self, job_id: str, stage: str, count: int) -> None:
+        with self._connect() as conn:
+            self._advance(conn, job_id, stage, count, time.time())
+
+    @staticmethod
+    def _advance(conn: sqlite3.Connection, job_id: str, stage: str, count: int, now: float) -> None:
+        conn.execute(
+            "UPDATE job_stages SET done = done + ?, started_at = COALESCE(started_at, ?), updated_at = ? "
+            "WHERE job_id = ? AND stage = ?",
+            (count, now, now, job_id, stage),
+        )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status, resultado, arquivos e progresso do job."""
+        with self._connect() as conn:
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            stages = conn.execute(
+                "SELECT stage, done, total, baseline, started_at, updated_at FROM job_stages WHERE job_id = ?",
+                (job_id,),
+            ).fetchall()
+        return {
+            "id": job["id"],
+            "kind": job["kind"],
+            "status": job["status"],
+            "worker": job["worker"],
+            "attempts": job["attempts"],
+            "created_at": job["created_at"],
+            "started_at": job["started_at"],
+            "finished_at": job["finished_at"],
+            "error": job["error"],
+            "result": json.loads(job["result"]) if job["result"] else None,
+            "progress": self._progress({row["stage"]: row for row in stages}, job["status"]),
+            "files": self.files(job_id),
+        }
+
+    @staticmethod
+    def _progress(stages: Dict[str, sqlite3.Row], status: str) -> Dict[str, Any]:
+        """
+        Contagem, throughput e ETA por etapa. O throughput é medido desde o
+        início da etapa na tentativa atual até o último avanço; o ETA do job é o da
+        etapa atual somado ao das seguintes que já têm throughput medido (None se a
+        etapa atual ainda não tem).
+        """
+        now = time.time()
+        report: Dict[str, Any] = {}
+        current = None
+        eta_total: Optional[float] = None
+        for stage in STAGES:
+            row = stages[stage]
+            done, total = row["done"], row["total"]
+            per_sec = None
+            if row["started_at"] is not None and row["updated_at"] and row["updated_at"] > row["started_at"]:
+                per_sec = (done - row["baseline"]) / (row["updated_at"] - row["started_at"])
+            eta = None
+            finished = total is not None and done >= total
+            if not finished and per_sec and total is not None:
+                # o tempo desde o último avanço já conta como parte do restante
+                eta = max(0.0, (total - done) / per_sec - (now - row["updated_at"]))
+            if not finished and current is None:
+                current = stage
+                eta_total = eta
+            elif eta is not None and eta_total is not None:
+                eta_total += eta
+            report[stage] = {
+                "done": done,
+                "total": total,
+                "unit": "files" if stage in FILE_STAGES else "chunks",
+                "per_sec": round(per_sec, 2) if per_sec is not None else None,
+                "eta_seconds": round(eta, 1) if eta is not None else None,
+            }
+        running = status == JobStatus.RUNNING.value
+        return {
+            "stages": report,
+            "current_stage": current if running else None,
+            "eta_seconds": round(eta_total, 1) if running and eta_total is not None else None,
+        }
+
+    def bump_collection_version(self, name: str) -> int:
+        """
+        Marca que a coleção (ou o tenant) foi reingerida. A API compara a versão
+        antes de servir uma resposta do cache semântico, gerada com o conteúdo antigo.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO collection_versions (name, version, updated_at) VALUES (?, 1, ?) "
+                "ON CONFLICT(name) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at",
+                (name, time.time()),
+            )
+            row = conn.execute("SELECT version FROM collection_versions WHERE name = ?", (name,)).fetchone()
+        return row["version"]
+
+    def collection_versions(self, names: Iterable[str]) -> Dict[str, int]:
+        """Versão de ingestão de cada coleção (0 se nunca reingerida desde a criação do store)."""
+        names = sorted(set(names))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT name, version FROM collection_versions WHERE name IN ({','.join('?' * len(names))})",
+                names,
+            ).fetchall()
+        versions = {row["name"]: row["version"] for row in rows}
+        return {name: versions.get(name, 0) for name in names}
+
+    def queue_depth(self) -> Dict[str, int]:
+        """Jobs na fila e em execução, por tipo."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT kind, status, COUNT(*) AS total FROM jobs WHERE status IN (?, ?) GROUP BY kind, status",
+                (JobStatus.QUEUED.value, JobStatus.RUNNING.value),
+            ).fetchall()
+        return {f"{row['kind']}_{row['status']}": row["total"] for row in rows}
+
+
+job_store = JobStore(settings.INGEST_JOBS_DB_PATH, settings.INGEST_JOBS_DIR)
@@ -0,0 +1,136 @@
+import os
+import json
+import fcntl
+import threading
+from contextlib import contextmanager
+from typing import List, NamedTuple, Optional
+from app.core.logging import logging
+from app.config.settings import settings
+from app.modules.milvus.utils.milvus import quote_expr_value
+
+logger = logging.getLogger(__name__)
+
+# Layouts de armazenamento suportados (settings.MILVUS_STORAGE_LAYOUT)
+LAYOUT_COLLECTION = "collection"    # uma coleção por pasta: _<pasta>_
+LAYOUT_PARTITIONED = "partitioned"  # uma coleção compartilhada com partition key `tenant`
+
+
+class StorageTarget(NamedTuple):
+    """Onde os chunks de uma pasta moram: a coleção física e, no layout particionado, o tenant."""
+    collection_name: str
+    tenant: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        """Nome lógico exibido ao usuário e usado em /chat/ask."""
+        return self.tenant or self.collection_name
+
+    @property
+    def filter(self) -> Optional[str]:
+        """Expressão de filtro que restringe buscas/queries ao tenant."""
+        if self.tenant is None:
+            return None
+        return f"tenant == {quote_expr_value(self.tenant)}"
+
+
+def is_partitioned() -> bool:
+    return settings.MILVUS_STORAGE_LAYOUT == LAYOUT_PARTITIONED
+
+
+def tenant_key(folder_name: str, company_id: Optional[int] = None, group_id: Optional[int] = None) -> str:
+    """Chave do tenant: `_<pasta>_`, prefixada por empresa/grupo quando informados."""
+    collection = f"_{folder_name}_"
+    if company_id is None and group_id is None:
+        return collection
+    return f"{company_id}/{group_id}/{collection}"
+
+
+class TenantRegistry:
+    """
+    Lista persistida (JSON) dos tenants gravados na coleção compartilhada,
+    para listar as "coleções" lógicas sem varrer o Milvus.
+
+    O arquivo é compartilhado entre a API e os workers: `add`/`remove` relêem e
+    regravam sob um lock de arquivo (`<path>.lock`), sem perder entradas de outro
+    processo, e as leituras recarregam a lista quando o mtime do arquivo muda.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._tenants = set()
+        self._mtime = None
+
+    def __contains__(self, tenant: str) -> bool:
+        self._reload()
+        return tenant in self._tenants
+
+    def list(self) -> List[str]:
+        self._reload()
+        return sorted(self._tenants)
+
+    def add(self, tenant: str) -> None:
+        with self._lock, self._file_lock():
+            self._reload(force=True)
+            if tenant in self._tenants:
+                return
+            self._tenants.add(tenant)
+            self._save()
+
+    def remove(self, tenant: str) -> None:
+        with self._lock, self._file_lock():
+            self._reload(force=True)
+            if tenant not in self._tenants:
+                return
+            self._tenants.discard(tenant)
+            self._save()
+
+    @contextmanager
+    def _file_lock(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _reload(self, force: bool = False) -> None:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if not force and mtime == self._mtime:
+            return
+        with open(self.path, encoding="utf-8") as f:
+            self._tenants = set(json.load(f))
+        self._mtime = mtime
+
+    def _save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(sorted(self._tenants), f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+
+tenant_registry = TenantRegistry(settings.MILVUS_TENANT_REGISTRY_PATH)
+
+
+def resolve_insert_target(folder_name: str, company_id: Optional[int] = None, group_id: Optional[int] = None) -> StorageTarget:
+    """Destino de uma ingestão conforme o layout configurado."""
+    if is_partitioned():
+        return StorageTarget(settings.MILVUS_SHARED_COLLECTION, tenant_key(folder_name, company_id, group_id))
+    return StorageTarget(f"_{folder_name}_")
+
+
+def resolve_search_target(name: str) -> StorageTarget:
+    """
+    Resolve o nome recebido em /chat/ask: tenants registrados vão para a coleção
+    compartilhada (filtrando pelo tenant); os demais são coleções por pasta.
+    """
+    if name in tenant_registry:
+        return StorageTarget(settings.MILVUS_SHARED_COLLECTION, name)
+    return StorageTarget(name)
@@ -1,23 +1,80 @@
 import asyncio
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set, Tuple
 from app.core.logging import logging
-from pymilvus import FieldSchema, CollectionSchema, DataType, Collection, utility
+from pymilvus import FieldSchema, CollectionSchema, DataType, Collection, Function, FunctionType, utility
 import json
+from app.config.settings import settings
+from app.core.metrics import MILVUS_INSERT_ROWS, MILVUS_INSERT_SECONDS, timed
+from app.modules.milvus.utils.residency import residency_manager
 logger = logging.getLogger(__name__)
 
 
 BATCH_SIZE = 500
+
+# Tokenização do campo `text` para o BM25: sem acentos e minúsculas, para que
+# "licitação"/"LICITACAO" casem; números de processo e CNPJ viram termos próprios.
+TEXT_ANALYZER_PARAMS = {"tokenizer": "standard", "filter": ["lowercase", "asciifolding"]}
+SPARSE_FIELD = "sparse"
+
+
+def is_milvus_lite() -> bool:
+    return settings.MILVUS_URL.endswith(".db")
+
+
+def full_text_search_enabled() -> bool:
+    """BM25 no servidor exige Milvus 2.5+ standalone/cluster; o Milvus Lite (URI .db) não suporta."""
+    return settings.MILVUS_FULL_TEXT_SEARCH and not is_milvus_lite()
+
+
+def scalar_index_type(field_name: str) -> str:
+    """
+    Tipo do índice escalar de cada campo filtrável: INVERTED para texto (file_name, tenant)
+    e STL_SORT (ordenado, bom para intervalos) para os numéricos; o Milvus Lite só tem INVERTED.
+    """
+    if field_name in ("page", "ingested_at") and not is_milvus_lite():
+        return "STL_SORT"
+    return "INVERTED"
+
+
+def mmap_params(field_name: str) -> Dict[str, Any]:
+    """
+    mmap no campo (settings.MILVUS_MMAP_FIELDS): os dados brutos ficam em arquivos mapeados
+    em memória no query node, em vez de inteiramente na RAM. Só vale para coleções novas.
+    """
+    return {"mmap_enabled": True} if field_name in settings.MILVUS_MMAP_FIELDS else {}
+
+
+_collection_fields: Dict[str, Set[str]] = {}
+
+
+async def get_collection_fields(milvus_client, collection_name: str) -> Set[str]:
+    """Campos do schema da coleção (em cache): coleções antigas não têm os campos mais novos."""
+    if collection_name not in _collection_fields:
+        description = await asyncio.to_thread(milvus_client.describe_collection, collection_name)
+        _collection_fields[collection_name] = {field["name"] for field in description["fields"]}
+    return _collection_fields[collection_name]
+
+
 # Milvus operations
 async def prepare_milvus_collection(
     milvus_client,
     collection_name: str,
     shard_num: int = 2,
+    build_index: bool = True,
+    partition_key: bool = False,
 ) -> bool:
     """
     Garante que exista uma coleção Milvus pronta para uso:
       - cria esquema (com auto_id se desejado)
       - cria índice vetor
-      - carrega a coleção na memória
+    Com a busca full-text habilitada, o campo `sparse` é preenchido pelo próprio
+    Milvus (função BM25 sobre `text`) e permite a busca híbrida no chat.
+    Os campos listados em MILVUS_MMAP_FIELDS (text, vector) são criados com mmap.
+    Com partition_key=True a coleção é compartilhada entre pastas/empresas:
+    ganha o campo `tenant` como partition key e as buscas filtram por ele.
+    A coleção é carregada na memória sob demanda, pelo residency_manager.
+    Com build_index=False (carga em massa) os índices ficam para
+    build_collection_indexes, chamado depois que a carga terminar.
     Retorna True se criou a coleção do zero; False se ela já existia.
     """
     exists = await asyncio.to_thread(
@@ -29,15 +86,38 @@ async def prepare_milvus_collection(
     logger.info(f"Collection '{collection_name}' não existe. Criando...")
 
     # 1) Define o schema
+    full_text = full_text_search_enabled()
+    text_params = {"enable_analyzer": True, "analyzer_params": TEXT_ANALYZER_PARAMS} if full_text else {}
     fields = [
         FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
-        FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=3072),
-        FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=65535),
+        FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=3072, **mmap_params("vector")),
+        FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=65535, **text_params, **mmap_params("text")),
         FieldSchema(name="doc_id", dtype=DataType.VARCHAR, max_length=512),
         FieldSchema(name="file_name", dtype=DataType.VARCHAR, max_length=512),
         FieldSchema(name="page", dtype=DataType.INT64),
+        # última página do chunk (chunks podem atravessar páginas; `page` é a primeira)
+        FieldSchema(name="page_end", dtype=DataType.INT64),
+        # momento da ingestão (epoch em segundos), para filtrar por data em /chat/ask
+        FieldSchema(name="ingested_at", dtype=DataType.INT64),
+        # arquivo/página das quase-duplicatas descartadas na ingestão (lista vazia se não houver)
+        FieldSchema(name="occurrences", dtype=DataType.JSON),
     ]
-    schema = CollectionSchema(fields, description="Chat embeddings com metadata")
+    functions = []
+    if full_text:
+        fields.append(FieldSchema(name=SPARSE_FIELD, dtype=DataType.SPARSE_FLOAT_VECTOR))
+        functions.append(Function(
+            name="text_bm25",
+            function_type=FunctionType.BM25,
+            input_field_names=["text"],
+            output_field_names=[SPARSE_FIELD],
+        ))
+    extra = {}
+    if partition_key:
+        fields.append(
+            FieldSchema(name="tenant", dtype=DataType.VARCHAR, max_length=512, is_partition_key=True)
+        )
+        extra["num_partitions"] = settings.MILVUS_PARTITION_KEY_PARTITIONS
+    schema = CollectionSchema(fields, description="Chat embeddings com metadata", functions=functions)
 
     # 2) Cria a collection
     await asyncio.to_thread(
@@ -46,9 +126,21 @@ async def prepare_milvus_collection(
         schema =schema,
         shard_num =shard_num,
         consistency_level="Strong",
+        **extra,
     )
+    _collection_fields.pop(collection_name, None)
     logger.info(f"Collection '{collection_name}' criada com sucesso.")
 
+    if build_index:
+        await build_collection_indexes(collection_name, partition_key=partition_key)
+    else:
+        logger.info(f"Criação de índices adiada em '{collection_name}'.")
+
+    return True
+
+
+async def build_collection_indexes(collection_name: str, partition_key: bool = False) -> None:
+    """Cria o índice vetorial, o índice BM25 (se houver o campo esparso) e os índices escalares."""
     # 3) Cria o índice vetorial
     col = Collection(name=collection_name)
     await asyncio.to_thread(
@@ -63,110 +155,251 @@ async def prepare_milvus_collection(
     )
     logger.info(f"Índice 'vector_idx' criado em '{collection_name}'.")
 
-    # 4) Carrega a coleção na memória
-    await asyncio.to_thread(col.load)
-    logger.info(f"Collection '{collection_name}' carregada na memória.")
+    # 3a) Índice do campo esparso BM25 (busca full-text / híbrida)
+    if any(field.name == SPARSE_FIELD for field in col.schema.fields):
+        await asyncio.to_thread(
+            col.create_index,
+            field_name=SPARSE_FIELD,
+            index_params={
+                "index_type": "SPARSE_INVERTED_INDEX",
+                "metric_type": "BM25",
+                "params": {"inverted_index_algo": "DAAT_MAXSCORE"},
+            },
+            index_name="sparse_idx",
+        )
+        logger.info(f"Índice 'sparse_idx' criado em '{collection_name}'.")
+
+    # 3b) Índices escalares (deleções e filtros por arquivo, página, data e tenant)
+    fields = {field.name for field in col.schema.fields}
+    for field_name in ("file_name", "page", "ingested_at"):
+        if field_name in fields:
+            await ensure_scalar_index(collection_name, field_name)
+    if partition_key:
+        await ensure_scalar_index(collection_name, "tenant")
+
+
+def quote_expr_value(value: str) -> str:
+    """Escapa uma string para uso como literal em expressões de filtro do Milvus."""
+    return json.dumps(value, ensure_ascii=False)
+
+
+_indexed_fields: Set[Tuple[str, str]] = set()
+
+
+async def ensure_scalar_index(collection_name: str, field_name: str) -> None:
+    """
+    Garante um índice escalar em `field_name` (ver scalar_index_type), para que
+    filtros como `file_name in [...]` ou `page >= 3` não precisem varrer a coleção inteira.
+    Coleções antigas, criadas sem o índice, recebem o índice na primeira chamada.
+    """
+    if (collection_name, field_name) in _indexed_fields:
+        return
+
+    index_name = f"{field_name}_idx"
+    col = Collection(name=collection_name)
+    has_index = await asyncio.to_thread(col.has_index, index_name=index_name)
+    if not has_index:
+        await asyncio.to_thread(
+            col.create_index,
+            field_name=field_name,
+            index_params={"index_type": scalar_index_type(field_name)},
+            index_name=index_name,
+        )
+        logger.info(f"Índice '{index_name}' criado em '{collection_name}'.")
+    _indexed_fields.add((collection_name, field_name))
+
 
-    return True
-    
 async def get_existing_documents(
     milvus_client,
-    collection_name: str
-) -> Dict[str, List[str]]:
+    collection_name: str,
+    expr: Optional[str] = None,
+) -> Dict[str, Dict[str, List[int]]]:
     """
-    Recupera todos os chunks existentes na coleção e agrupa por file_name,
-    retornando file_name -> lista de id (seu MD5).
+    Recupera todos os chunks existentes na coleção (opcionalmente restritos por `expr`,
+    ex.: o tenant) e agrupa por file_name, retornando file_name -> {doc_id: [ids]}
+    (doc_id é o MD5 do chunk + ocorrência; mais de um id indica linhas duplicadas).
     """
     col = Collection(name=collection_name)
-    await asyncio.to_thread(col.load)
+    await residency_manager.ensure_loaded(milvus_client, collection_name)
 
-    # iterator buscando id e file_name
+    # iterator buscando id, doc_id e file_name
     it = col.query_iterator(
         batch_size=BATCH_SIZE,
         limit=-1,
-        expr=None,
-        output_fields=["id", "file_name"]
+        expr=expr,
+        output_fields=["id", "doc_id", "file_name"]
     )
 
-    existing_doc_map: Dict[str, List[str]] = {}
+    existing_doc_map: Dict[str, Dict[str, List[int]]] = {}
     while True:
         batch = await asyncio.to_thread(it.next)
         if not batch:
+            it.close()
             break
         for hit in batch:
             fn = hit.get("file_name")
             mid = hit.get("id")
             if fn and mid:
-                existing_doc_map.setdefault(fn, []).append(mid)
+                existing_doc_map.setdefault(fn, {}).setdefault(hit.get("doc_id"), []).append(mid)
 
     return existing_doc_map
 
 
+def diff_documents(
+    existing_doc_map: Dict[str, Dict[str, List[int]]],
+    incoming_doc_map: Dict[str, List[str]],
+) -> Dict[str, Any]:
+    """
+    Compara os chunks recebidos (file_name -> doc_ids) com os já armazenados.
+    Retorna os doc_ids a inserir por arquivo, os ids (PK) obsoletos a remover
+    (inclusive as linhas duplicadas de um mesmo doc_id, mantendo a primeira)
+    e o status de cada arquivo: "new", "changed" ou "unchanged".
+    """
+    to_insert: Dict[str, Set[str]] = {}
+    stale_ids: List[int] = []
+    files: Dict[str, str] = {}
+
+    for fname, doc_ids in incoming_doc_map.items():
+        stored = existing_doc_map.get(fname)
+        incoming = set(doc_ids)
+        if stored is None:
+            files[fname] = "new"
+            to_insert[fname] = incoming
+            continue
+
+        missing = incoming - stored.keys()
+        obsolete = stored.keys() - incoming
+        duplicates = [
+            mid
+            for doc_id, ids in stored.items()
+            if doc_id not in obsolete
+            for mid in ids[1:]
+        ]
+        stale_ids.extend(duplicates)
+        if not missing and not obsolete:
+            files[fname] = "unchanged"
+            continue
+
+        files[fname] = "changed"
+        to_insert[fname] = missing
+        stale_ids.extend(mid for doc_id in obsolete for mid in stored[doc_id])
+
+    return {"to_insert": to_insert, "stale_ids": stale_ids, "files": files}
+
+
+async def delete_chunks_by_ids(
+    milvus_client,
+    collection_name: str,
+    ids: List[int],
+) -> int:
+    """Deleta chunks pelo id inteiro (PK INT64), em batches. Retorna a quantidade removida."""
+    if not ids:
+        return 0
+    await residency_manager.ensure_loaded(milvus_client, collection_name)
+    for i in range(0, len(ids), BATCH_SIZE):
+        ids_list = ", ".join(str(mid) for mid in ids[i : i + BATCH_SIZE])
+        await asyncio.to_thread(
+            milvus_client.delete,
+            collection_name=collection_name,
+            filter=f'id in [{ids_list}]'
+        )
+    return len(ids)
+
+
 async def delete_removed_documents(
     milvus_client,
     collection_name: str,
-    existing_doc_map: Dict[str, List[int]],
+    existing_doc_map: Dict[str, Dict[str, List[int]]],
     vetorizados: List[str],
+    expr: Optional[str] = None,
 ) -> Dict[str, int]:
     """
-    Deleta por id inteiro (PK INT64) os chunks cujos arquivos
-    não estejam mais em 'vetorizados'. Retorna mapping file_name -> quantidade removida.
+    Deleta, por filtro `file_name in [...]` (apoiado no índice INVERTED),
+    todos os chunks dos arquivos que não estejam mais em 'vetorizados'.
+    `expr` restringe a deleção (ex.: ao tenant na coleção compartilhada).
+    Cada delete cobre até BATCH_SIZE arquivos. Retorna mapping file_name -> quantidade removida.
     """
     vetorizados_set = set(vetorizados or [])
-    removed_files = set(existing_doc_map) - vetorizados_set
+    removed_files = sorted(set(existing_doc_map) - vetorizados_set)
     if not removed_files:
         logger.info("Nenhum Arquivo para remoção")
         return {}
 
-    # prepara a coleção para deletes por filtro
-    col = Collection(name=collection_name)
-    await asyncio.to_thread(col.load)
-
-    results: Dict[str, int] = {}
-    for fname in removed_files:
-
-        logger.info(f"Arquivo :{fname} Removido do milvus ")
-        # 1) coleta todos os ids INT de cada file_name
-        it = col.query_iterator(
-            batch_size=BATCH_SIZE,
-            limit=-1,
-            expr=f'file_name == "{fname}"',
-            output_fields=["id"]
+    await ensure_scalar_index(collection_name, "file_name")
+    await residency_manager.ensure_loaded(milvus_client, collection_name)
+
+    for i in range(0, len(removed_files), BATCH_SIZE):
+        batch_files = removed_files[i : i + BATCH_SIZE]
+        names_list = ", ".join(quote_expr_value(fname) for fname in batch_files)
+        file_filter = f"file_name in [{names_list}]"
+        await asyncio.to_thread(
+            milvus_client.delete,
+            collection_name=collection_name,
+            filter=f"({expr}) and {file_filter}" if expr else file_filter
         )
+        logger.info(f"Arquivos removidos do milvus: {batch_files}")
+
+    return {
+        fname: sum(len(ids) for ids in existing_doc_map[fname].values())
+        for fname in removed_files
+    }
+
+async def update_occurrences(
+    milvus_client,
+    collection_name: str,
+    occurrences_by_id: Dict[int, List[Dict[str, Any]]],
+    fields: Set[str],
+) -> int:
+    """
+    Atualiza o campo `occurrences` de chunks já armazenados (id -> ocorrências novas)
+    onde ele difere do gravado. Sem update parcial (e com o id auto_id), cada linha
+    alterada é relida inteira, reinserida com as ocorrências novas (reaproveitando o
+    vetor, sem embeddings novos) e a antiga é removida. Retorna a quantidade atualizada.
+    """
+    if not occurrences_by_id:
+        return 0
+    await residency_manager.ensure_loaded(milvus_client, collection_name)
+
+    ids = list(occurrences_by_id)
+    changed: List[int] = []
+    for i in range(0, len(ids), BATCH_SIZE):
+        ids_list = ", ".join(str(mid) for mid in ids[i : i + BATCH_SIZE])
+        rows = await asyncio.to_thread(
+            milvus_client.query,
+            collection_name=collection_name,
+            filter=f"id in [{ids_list}]",
+            output_fields=["occurrences"],
+        )
+        changed.extend(row["id"] for row in rows if row.get("occurrences") != occurrences_by_id[row["id"]])
+
+    # o campo esparso do BM25 é gerado pelo Milvus e não entra no insert
+    output_fields = sorted(fields - {"id", SPARSE_FIELD})
+    for i in range(0, len(changed), BATCH_SIZE):
+        batch_ids = changed[i : i + BATCH_SIZE]
+        ids_list = ", ".join(str(mid) for mid in batch_ids)
+        rows = await asyncio.to_thread(
+            milvus_client.query,
+            collection_name=collection_name,
+            filter=f"id in [{ids_list}]",
+            output_fields=output_fields,
+        )
+        for row in rows:
+            row["occurrences"] = occurrences_by_id[row.pop("id")]
+        if not await insert_batch_to_milvus(milvus_client, collection_name, rows):
+            raise RuntimeError(f"Falha ao atualizar as ocorrências de {len(rows)} chunks em '{collection_name}'")
+        await delete_chunks_by_ids(milvus_client, collection_name, batch_ids)
+
+    if changed:
+        logger.info(f"Ocorrências atualizadas em {len(changed)} chunks de '{collection_name}'.")
+    return len(changed)
 
-        all_ids: List[int] = []
-        while True:
-            batch = await asyncio.to_thread(it.next)
-            if not batch:
-                break
-            for hit in batch:
-                id_val = hit.get("id")
-                if isinstance(id_val, int):
-                    all_ids.append(id_val)
-
-        count = len(all_ids)
-        if count == 0:
-            continue
-        
-        # 2) delete em batches, sem aspas nos números
-        for i in range(0, count, BATCH_SIZE):
-            batch_ids = all_ids[i : i + BATCH_SIZE]
-            ids_list = ", ".join(str(mid) for mid in batch_ids)
-            expr = f'id in [{ids_list}]'
-            await asyncio.to_thread(
-                milvus_client.delete,
-                collection_name=collection_name,
-                filter=expr
-            )
-
-        results[fname] = count
-
-    return results
 
 async def insert_batch_to_milvus(milvus_client, collection_name: str, batch: List[Dict[str, Any]]):
     """Inserts a batch of data into a Milvus collection"""
     try:
-        await asyncio.to_thread(milvus_client.insert, collection_name=collection_name, data=batch)
+        with timed(MILVUS_INSERT_SECONDS, mode="batch"):
+            await asyncio.to_thread(milvus_client.insert, collection_name=collection_name, data=batch)
+        MILVUS_INSERT_ROWS.labels("batch").inc(len(batch))
         return True
     except Exception as e:
         logger.error(f"Error inserting batch: {e}")
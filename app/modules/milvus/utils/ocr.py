@@ -4,48 +4,44 @@ import docx
 from docx.table import Table
 import fitz  # PyMuPDF
 from pathlib import Path
-import re
 from datetime import datetime
 import logging
 import json
 from fastapi.exceptions import HTTPException
-from openai import OpenAI
 import pytesseract
 from pdf2image import convert_from_path
 import tempfile
 from mistralai import Mistral
 from app.config.settings import settings
+from app.core.admission import Priority
+from app.core.metrics import observe_extraction
+from app.core.providers import MISTRAL, CircuitOpenError, provider_gateway
+from app.modules.milvus.utils.docx_reader import read_docx_pages
+from app.modules.milvus.utils.pdf_reader import iter_pdf_pages
+from app.modules.milvus.utils.text_cleaning import clean_text, clean_sheet_text
 import base64
 import os
 
 from mistralai import Mistral
 import uuid
 from typing import Optional, Tuple
-mistral_client = Mistral(api_key=settings.MISTRAL_API_KEY)
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+MISTRAL_OCR_MODEL = "mistral-ocr-latest"
 logger = logging.getLogger(__name__)
 class OCRService:
     TEXT_EXTENSIONS = {'.txt', '.md'}
     DOCUMENT_EXTENSIONS = {'.pdf', '.docx', '.doc', '.xlsx', '.csv', '.xls'}
+    # páginas sem camada de texto a partir das quais o PDF vai para o OCR
+    OCR_EMPTY_PAGES = 2
     def __init__(self):
-        self.mistral_client = mistral_client
+        # chamadas à OpenAI e à Mistral passam pelo gateway (pool, limites, retry)
+        self.gateway = provider_gateway
     def _clean_text(self, text: str) -> str:
-        text = re.sub(r'\s+', ' ', text)
-        text = re.sub(r'[^\w\s.,!?;:()\[\]{}@#$%&*\-+=/\\]', '', text)
-        text = text.replace('\r\n', '\n').replace('\r', '\n')
-        return text.strip()
+        return clean_text(text)
     def _get_file_extension(self, file_path: Union[str, Path]) -> str:
         """Obtém a extensão do arquivo em minúsculas."""
         return Path(file_path).suffix.lower()
     def _clean_sheet_text(self, text: str) -> str:
-        text = text.replace('\r\n', '\n').replace('\r', '\n')
-        text = re.sub(r'([^\n])\n## Aba:', r'\1\n\n## Aba:', text)
-        text = re.sub(r'([^\n])\n### Linha:', r'\1\n\n### Linha:', text)
-        text = re.sub(r'\n{4,}', '\n\n\n', text)
-        text = re.sub(r'(#+)([^ #])', r'\1 \2', text)
-        text = re.sub(r'[ \t]+', ' ', text)
-        text = re.sub(r'[^\w\s.,!?;:()\[\]{}@#$%&*\-+=/\\]', '', text)
-        return text.strip()
+        return clean_sheet_text(text)
     def _format_as_markdown(self, text: str) -> str:
         title_candidate = text.split('\n')[0].strip()
         md_content = [
@@ -54,36 +50,33 @@ class OCRService:
         return "\n".join(md_content)
     
 
-    def _extract_text_from_pdf(self, file_path: Union[str, Path]) -> List[Dict]:
+    @observe_extraction("pdf_text")
+    def _extract_text_from_pdf(self, file_path: Union[str, Path], max_empty_pages: Optional[int] = None) -> List[Dict]:
         """
-        Extrai texto corrido de um PDF, página por página.
+        Extrai texto corrido de um PDF, página por página, com faixas de páginas
+        em paralelo (INGEST_PDF_WORKERS processos). Com `max_empty_pages`, para de
+        extrair ao encontrar essa quantidade de páginas sem texto: o arquivo vai
+        para o OCR de qualquer forma.
         """
-        doc = fitz.open(file_path)
         pages_content: List[Dict] = []
-
-        try:
-            for page_idx, page in enumerate(doc):
-                page_num = page_idx + 1
-
-                # 1. Extração de texto com fitz
-                text = page.get_text("text")
-                clean = self._clean_text(text)
-
-                # 2. Armazena conteúdo
-                pages_content.append({
-                    "page_number": page_num,
-                    "content": clean.strip()
-                })
-
-            return pages_content
-
-        finally:
-            doc.close()
+        empty_pages = 0
+        for page in iter_pdf_pages(
+            file_path,
+            workers=settings.INGEST_PDF_WORKERS,
+            pages_per_task=settings.INGEST_PDF_PAGES_PER_TASK,
+        ):
+            pages_content.append(page)
+            if not page["content"]:
+                empty_pages += 1
+                if max_empty_pages is not None and empty_pages >= max_empty_pages:
+                    break
+        return pages_content
 
     def _ocr_with_openai(self, item):
         # Convert image byte data into a base64-encoded string
         item = base64.b64encode(item).decode("utf-8")
-        response = client.chat.completions.create(
+        response = self.gateway.complete(
+            Priority.BATCH,
             model="gpt-4o-mini-2024-07-18",
             messages=[
                 {
@@ -107,6 +100,7 @@ class OCRService:
             temperature=0.0,
         )
         return response.choices[0].message.content
+    @observe_extraction("openai")
     def _extract_text_from_pdf_openai(self, file_path: Union[str, Path]) -> List[Dict]:
         
         
@@ -148,6 +142,7 @@ class OCRService:
                         logger.warning(f"Failed to remove temporary file {tmp_file_path}: {str(e)}")
         
         return results
+    @observe_extraction("tesseract")
     def _extract_text_from_pdf_ocr(self, file_path: Union[str, Path]) -> List[Dict]:
         pages = convert_from_path(file_path, dpi=300)
         results = []
@@ -178,9 +173,23 @@ class OCRService:
         
         return "\n".join(rows)
     
+    @observe_extraction("docx")
     def _extract_text_from_docx(self, file_path: Union[str, Path]) -> List[Dict]:
         """
-        Extract text and tables from a Word document.
+        Extract text and tables from a Word document, streaming word/document.xml.
+        Pages follow explicit page breaks and section breaks.
+        Falls back to python-docx (single page) if the streaming reader fails.
+        """
+        try:
+            pages = read_docx_pages(file_path)
+        except Exception as e:
+            logger.warning(f"Erro na leitura em streaming de {Path(file_path).name}: {e}. Tentando com python-docx")
+            return self._extract_text_from_docx_legacy(file_path)
+        return [{"page_number": p["page_number"], "content": self._clean_text(p["content"])} for p in pages]
+
+    def _extract_text_from_docx_legacy(self, file_path: Union[str, Path]) -> List[Dict]:
+        """
+        Extract text and tables from a Word document with python-docx.
         Returns a list of dictionaries with page number and content.
         """
         doc = docx.Document(file_path)
@@ -208,6 +217,7 @@ class OCRService:
         
         text = self._clean_text("\n\n".join(content_parts))
         return [{"page_number": 1, "content": text}]
+    @observe_extraction("excel")
     def _extract_text_from_excel(self, file_path: Union[str, Path]) -> List[Dict]:
         xls = pd.ExcelFile(file_path)
         pages = []
@@ -235,6 +245,7 @@ class OCRService:
             text = self._clean_sheet_text("\n\n".join(sections))
             pages.append({"page_number": i + 1, "content": text})
         return pages
+    @observe_extraction("csv")
     def _extract_text_from_csv(self, file_path: Union[str, Path]) -> List[Dict]:
         df = pd.read_csv(file_path).fillna('')
         lines = ["# CSV Extraído"]
@@ -257,6 +268,7 @@ class OCRService:
                 lines.append("\n".join(row_str))
         text = self._clean_sheet_text("\n\n".join(lines))
         return [{"page_number": 1, "content": text}]
+    @observe_extraction("mistral")
     def _extract_text_from_pdf_mistral(
         self,
         file_path: Union[str, Path]
@@ -265,14 +277,16 @@ class OCRService:
         Extract text from PDF using Mistral AI's OCR service,
         writing each chunk to a temporary file that is auto-deleted.
         """
+        # Mistral fora do ar (circuito aberto): o process_file segue direto para o OCR local
+        for model in ("files", MISTRAL_OCR_MODEL):
+            retry_after = self.gateway.breaker(MISTRAL, model).retry_after()
+            if retry_after:
+                raise CircuitOpenError(f"{MISTRAL}/{model}", retry_after)
         # Abre o PDF original
         try:
             doc = fitz.open(file_path)
             total_pages = doc.page_count
 
-            # Inicializa o cliente Mistral
-            mistral_client = self.mistral_client
-
             all_pages: List[Dict] = []
             chunk_size = 500
 
@@ -292,18 +306,19 @@ class OCRService:
 
                     # Faz upload e processa OCR
                     with open(tmp.name, "rb") as f:
-                        uploaded = mistral_client.files.upload(
-                            file={"file_name": Path(tmp.name).name, "content": f},
-                            purpose="ocr"
-                        )
-                    signed = mistral_client.files.get_signed_url(
+                        content = f.read()
+                    uploaded = self.gateway.mistral_call("files", lambda client: client.files.upload(
+                        file={"file_name": Path(tmp.name).name, "content": content},
+                        purpose="ocr"
+                    ))
+                    signed = self.gateway.mistral_call("files", lambda client: client.files.get_signed_url(
                         file_id=uploaded.id,
                         expiry=1
-                    )
-                    resp = mistral_client.ocr.process(
-                        model="mistral-ocr-latest",
+                    ))
+                    resp = self.gateway.mistral_call(MISTRAL_OCR_MODEL, lambda client: client.ocr.process(
+                        model=MISTRAL_OCR_MODEL,
                         document={"type": "document_url", "document_url": signed.url}
-                    )
+                    ))
 
                     # Extrai páginas e marca números
                     pages = json.loads(resp.json())["pages"]
@@ -320,6 +335,9 @@ class OCRService:
                 len(all_pages)
             )
             return all_pages
+        except CircuitOpenError as e:
+            logger.warning(f"Mistral OCR indisponível para {Path(file_path).name}: {e}")
+            raise
         except Exception as e:
             logger.error(f"Error processing {Path(file_path).name} with Mistral OCR: {e}")
             raise
@@ -349,11 +367,11 @@ class OCRService:
         if file_path.suffix == '.pdf':
             try:
                 # Tenta primeiro a extração direta de texto
-                pages = self._extract_text_from_pdf(file_path)
-                
+                pages = self._extract_text_from_pdf(file_path, max_empty_pages=self.OCR_EMPTY_PAGES)
+
                 empty_pages = sum(1 for p in pages if not p["content"].strip())
                 # Se não houver conteúdo ou as páginas estiverem vazias, tenta o Mistral OCR primeiro
-                if  empty_pages >=2:
+                if empty_pages >= self.OCR_EMPTY_PAGES:
                     logger.info(f"Conteúdo insuficiente com extração direta para {file_path.name}, tentando Mistral OCR")
                     try:
                         # Try Mistral OCR first as fallback
@@ -0,0 +1,80 @@
+import os
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from pathlib import Path
+from typing import Deque, Dict, Iterator, List, Optional, Union
+import fitz  # PyMuPDF
+from app.modules.milvus.utils.text_cleaning import clean_text
+
+logger = logging.getLogger(__name__)
+
+
+def extract_page_range(file_path: str, start: int, end: int) -> List[Dict]:
+    """
+    Extrai e limpa as páginas [start, end) do PDF. Roda nos workers: cada chamada
+    abre o documento por conta própria (o fitz.Document não é compartilhável entre processos).
+    Páginas sem camada de texto saem com content vazio sem passar pelas regex.
+    """
+    pages: List[Dict] = []
+    with fitz.open(file_path) as doc:
+        for page_idx in range(start, end):
+            text = doc[page_idx].get_text("text")
+            pages.append({
+                "page_number": page_idx + 1,
+                "content": clean_text(text) if text and not text.isspace() else "",
+            })
+    return pages
+
+
+@lru_cache(maxsize=None)
+def _executor(workers: int) -> ProcessPoolExecutor:
+    """Pool de processos reaproveitado entre arquivos (spawn: o processo da API tem threads)."""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def iter_pdf_pages(
+    file_path: Union[str, Path],
+    workers: Optional[int] = None,
+    pages_per_task: int = 50,
+) -> Iterator[Dict]:
+    """
+    Gera {"page_number", "content"} de cada página do PDF, em ordem.
+
+    O documento é dividido em faixas de `pages_per_task` páginas processadas em
+    paralelo por `workers` processos (padrão: número de CPUs). No máximo duas faixas
+    por worker ficam em andamento, e as páginas são entregues assim que a faixa
+    seguinte da ordem termina. Se o consumidor parar antes do fim (ex.: o PDF já se
+    mostrou escaneado), as faixas pendentes são canceladas. PDFs com até uma faixa,
+    ou com um worker só, são extraídos no próprio processo.
+    """
+    file_path = str(file_path)
+    workers = workers or os.cpu_count() or 1
+    with fitz.open(file_path) as doc:
+        page_count = doc.page_count
+
+    if workers <= 1 or page_count <= pages_per_task:
+        for start in range(0, page_count, pages_per_task):
+            yield from extract_page_range(file_path, start, min(start + pages_per_task, page_count))
+        return
+
+    executor = _executor(workers)
+    ranges = deque((start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task))
+    pending: Deque = deque()
+    try:
+        while ranges or pending:
+            while ranges and len(pending) < workers * 2:
+                start, end = ranges.popleft()
+                pending.append(executor.submit(extract_page_range, file_path, start, end))
+            yield from pending.popleft().result()
+    except BrokenProcessPool:
+        # um worker morreu (ex.: PDF malformado derrubou o MuPDF); o próximo arquivo usa um pool novo
+        logger.warning(f"Pool de extração de PDF quebrado ao processar {Path(file_path).name}; recriando")
+        _executor.cache_clear()
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,189 @@
+import time
+import asyncio
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict, Any, Iterable, Iterator, Optional
+from pymilvus.client.types import LoadState
+from app.core.logging import logging
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CollectionResidencyManager:
+    """
+    Controla quais coleções ficam carregadas na memória dos query nodes.
+
+    Carrega sob demanda (primeira busca/consulta), mantém a memória estimada
+    das coleções carregadas abaixo de `budget_mb` liberando as menos usadas
+    recentemente (LRU) e nunca libera as coleções fixadas (pinned) nem as que estão
+    em uso por uma busca em andamento (`use`/`hold`).
+
+    Só a API gerencia a residência (`configure(evict=True)` na partida). Nos demais
+    processos (worker, CLIs), o padrão `evict=False` só carrega a coleção que falta
+    no servidor, sem liberar as outras nem guardar estado que a API não enxerga.
+    """
+
+    def __init__(self, budget_mb: float, row_size_bytes: int, pinned: Iterable[str] = (), evict: bool = False):
+        self.budget_mb = budget_mb
+        self.row_size_bytes = row_size_bytes
+        self.evict = evict
+        self._pinned = set(pinned)
+        # nome -> buscas em andamento
+        self._in_use: Counter = Counter()
+        # nome -> {"size_mb", "last_access", "load_seconds"}, do menos para o mais recente
+        self._loaded: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = asyncio.Lock()
+        self._loads = 0
+        self._load_seconds_total = 0.0
+        self._load_seconds_max = 0.0
+        self._evictions = 0
+
+    @property
+    def used_mb(self) -> float:
+        return sum(entry["size_mb"] for entry in self._loaded.values())
+
+    def configure(self, evict: bool) -> None:
+        self.evict = evict
+
+    async def refresh(self, milvus_client) -> None:
+        """Sincroniza o estado com o servidor e pré-carrega as coleções fixadas."""
+        collections = await asyncio.to_thread(milvus_client.list_collections)
+        for name in collections:
+            state = await asyncio.to_thread(milvus_client.get_load_state, name)
+            if state["state"] == LoadState.Loaded and name not in self._loaded:
+                self._loaded[name] = {
+                    "size_mb": await self._estimate_size_mb(milvus_client, name),
+                    "last_access": None,
+                    "load_seconds": None,
+                }
+
+        for name in self._pinned & set(collections):
+            await self.ensure_loaded(milvus_client, name)
+        logger.info(
+            "Residência de coleções: %d carregadas, %.1f/%.1f MB",
+            len(self._loaded), self.used_mb, self.budget_mb,
+        )
+
+    async def ensure_loaded(self, milvus_client, collection_name: str) -> None:
+        """Garante que a coleção esteja carregada, liberando outras se o orçamento estourar."""
+        if not self.evict:
+            await self._load_if_released(milvus_client, collection_name)
+            return
+        if self._touch(collection_name):
+            return
+
+        async with self._lock:
+            if self._touch(collection_name):
+                return
+
+            size_mb = await self._estimate_size_mb(milvus_client, collection_name)
+            await self._evict_for(milvus_client, size_mb)
+
+            started = time.perf_counter()
+            await asyncio.to_thread(milvus_client.load_collection, collection_name)
+            load_seconds = time.perf_counter() - started
+
+            self._loaded[collection_name] = {
+                "size_mb": size_mb,
+                "last_access": time.time(),
+                "load_seconds": round(load_seconds, 3),
+            }
+            self._loads += 1
+            self._load_seconds_total += load_seconds
+            self._load_seconds_max = max(self._load_seconds_max, load_seconds)
+            logger.info(
+                "Collection '%s' carregada em %.2fs (%.1f MB estimados, %.1f/%.1f MB em uso)",
+                collection_name, load_seconds, size_mb, self.used_mb, self.budget_mb,
+            )
+
+    @contextmanager
+    def hold(self, *collection_names: str) -> Iterator[None]:
+        """Marca as coleções como em uso enquanto o bloco executa: nenhuma é liberada para dar lugar a outra."""
+        self._in_use.update(collection_names)
+        try:
+            yield
+        finally:
+            self._in_use.subtract(collection_names)
+            for name in set(collection_names):
+                if self._in_use[name] <= 0:
+                    del self._in_use[name]
+
+    @asynccontextmanager
+    async def use(self, milvus_client, collection_name: str) -> AsyncIterator[None]:
+        """Carrega a coleção e a mantém carregada até o fim do bloco (ex.: a busca do chat)."""
+        with self.hold(collection_name):
+            await self.ensure_loaded(milvus_client, collection_name)
+            yield
+
+    async def release(self, milvus_client, collection_name: str) -> None:
+        async with self._lock:
+            await self._release(milvus_client, collection_name)
+
+    def pin(self, collection_name: str) -> None:
+        self._pinned.add(collection_name)
+
+    def unpin(self, collection_name: str) -> None:
+        self._pinned.discard(collection_name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "budget_mb": self.budget_mb,
+            "used_mb": round(self.used_mb, 1),
+            "loads": self._loads,
+            "evictions": self._evictions,
+            "load_seconds_avg": round(self._load_seconds_total / self._loads, 3) if self._loads else None,
+            "load_seconds_max": round(self._load_seconds_max, 3),
+            "pinned": sorted(self._pinned),
+            "collections": [
+                {"name": name, "pinned": name in self._pinned, "in_use": self._in_use[name], **entry}
+                for name, entry in reversed(self._loaded.items())
+            ],
+        }
+
+    def _touch(self, collection_name: str) -> bool:
+        entry: Optional[Dict[str, Any]] = self._loaded.get(collection_name)
+        if entry is None:
+            return False
+        entry["last_access"] = time.time()
+        self._loaded.move_to_end(collection_name)
+        return True
+
+    async def _load_if_released(self, milvus_client, collection_name: str) -> None:
+        # consulta o servidor a cada vez: a API pode ter liberado a coleção
+        state = await asyncio.to_thread(milvus_client.get_load_state, collection_name)
+        if state["state"] == LoadState.Loaded:
+            return
+        await asyncio.to_thread(milvus_client.load_collection, collection_name)
+        logger.info("Collection '%s' carregada (sem liberar outras)", collection_name)
+
+    async def _estimate_size_mb(self, milvus_client, collection_name: str) -> float:
+        stats = await asyncio.to_thread(milvus_client.get_collection_stats, collection_name)
+        return int(stats.get("row_count", 0)) * self.row_size_bytes / (1024 * 1024)
+
+    async def _evict_for(self, milvus_client, size_mb: float) -> None:
+        for name in list(self._loaded):
+            if self.used_mb + size_mb <= self.budget_mb:
+                return
+            if name in self._pinned or self._in_use[name]:
+                continue
+            await self._release(milvus_client, name)
+            self._evictions += 1
+
+        if self.used_mb + size_mb > self.budget_mb:
+            logger.warning(
+                "Orçamento de memória excedido: %.1f MB em uso + %.1f MB novos > %.1f MB",
+                self.used_mb, size_mb, self.budget_mb,
+            )
+
+    async def _release(self, milvus_client, collection_name: str) -> None:
+        await asyncio.to_thread(milvus_client.release_collection, collection_name)
+        self._loaded.pop(collection_name, None)
+        logger.info("Collection '%s' liberada da memória", collection_name)
+
+
+residency_manager = CollectionResidencyManager(
+    budget_mb=settings.MILVUS_LOAD_BUDGET_MB,
+    row_size_bytes=settings.MILVUS_ROW_SIZE_BYTES,
+    pinned=settings.MILVUS_PINNED_COLLECTIONS,
+)
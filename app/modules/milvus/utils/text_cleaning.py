@@ -0,0 +1,29 @@
+import re
+
+# padrões compilados uma vez por processo (também nos workers da extração de PDF)
+_whitespace_re = re.compile(r'\s+')
+_disallowed_re = re.compile(r'[^\w\s.,!?;:()\[\]{}@#$%&*\-+=/\\]')
+_sheet_tab_re = re.compile(r'([^\n])\n## Aba:')
+_sheet_row_re = re.compile(r'([^\n])\n### Linha:')
+_blank_lines_re = re.compile(r'\n{4,}')
+_heading_space_re = re.compile(r'(#+)([^ #])')
+_horizontal_space_re = re.compile(r'[ \t]+')
+
+
+def clean_text(text: str) -> str:
+    """Junta todo espaço em branco em um espaço só e remove caracteres fora do conjunto permitido."""
+    text = _whitespace_re.sub(' ', text)
+    text = _disallowed_re.sub('', text)
+    return text.strip()
+
+
+def clean_sheet_text(text: str) -> str:
+    """Limpeza das planilhas/CSV: mantém as quebras de linha do markdown de abas e linhas."""
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    text = _sheet_tab_re.sub(r'\1\n\n## Aba:', text)
+    text = _sheet_row_re.sub(r'\1\n\n### Linha:', text)
+    text = _blank_lines_re.sub('\n\n\n', text)
+    text = _heading_space_re.sub(r'\1 \2', text)
+    text = _horizontal_space_re.sub(' ', text)
+    text = _disallowed_re.sub('', text)
+    return text.strip()
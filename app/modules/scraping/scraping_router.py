@@ -28,10 +28,10 @@ async def scraping(msg: ScrapingDto):
 def download_files(dto: DownloadFilesDto):
   logger.info("Received download files request with the follow urls: %s", dto.links)
   try:
-    # Executa a tarefa de download em thread separada para não bloquear
-    download_files_service.download_files(dto.downloadPage, dto.links, dto.companyId, dto.groupId)
-    
-    return {"message": "Started downloading files"}
+    # Enfileira o download; os workers (python -m app.worker) executam e o status fica em /milvus/jobs/{job_id}
+    job_id = download_files_service.submit(dto)
+
+    return {"message": "Download files job queued", "job_id": job_id}
   except Exception as e:
     logger.error("Error initializing download task: %s", e, exc_info=True)
     return {"error": str(e)}
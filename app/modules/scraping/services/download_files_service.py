@@ -1,4 +1,5 @@
 import os
+import time
 import uuid
 import base64
 import requests
@@ -7,6 +8,9 @@ from urllib.parse import urlparse, unquote
 
 from app.core.logging import logging
 from app.config.settings import settings
+from app.core.metrics import DOWNLOAD_SECONDS, observe_download, timed
+from app.modules.milvus.utils.jobs import JobKind, JobStore, job_store
+from app.modules.scraping.dtos.download_files_dto import DownloadFilesDto
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +18,24 @@ OUT_DIR = "/tmp/out"
 os.makedirs(OUT_DIR, exist_ok=True)
 
 class DownloadFilesService:
+  def __init__(self, store: JobStore = job_store):
+    self.store = store
+
+  def submit(self, dto: DownloadFilesDto) -> str:
+    """Enfileira o download; quem executa são os workers (python -m app.worker)."""
+    return self.store.create(dto.model_dump(), [], JobKind.DOWNLOAD)
+
+  async def run_job(self, job_id: str) -> None:
+    """Executa um job de download já reivindicado (`claim`) e registra o resultado ou o erro."""
+    dto = DownloadFilesDto.model_validate(self.store.request(job_id))
+    try:
+      await self.download_files(dto.downloadPage, dto.links, dto.companyId, dto.groupId)
+    except Exception as e:
+      logger.error("Job de download %s falhou: %s", job_id, e, exc_info=True)
+      self.store.finish(job_id, error=str(e) or type(e).__name__)
+      raise
+    self.store.finish(job_id, result={"links": len(dto.links)})
+
   async def download_files(
     self,
     downloadPage: str ,
@@ -114,17 +136,21 @@ class DownloadFilesService:
 
         # Request file base64 from external service
         logger.info("Solicitando download de arquivo para %s", link)
-        resp = requests.post(
-          settings.SCRAPING_API_URL + "/download",
-          json={"url": link},
-          headers=download_headers,
-          timeout=30
-        )
-        resp.raise_for_status()
-        result = resp.json()
-        file_base64 = result.get("base64_encoded")
-        if not file_base64:
-          raise ValueError("Nenhum arquivo retornado pela API de download")
+        started = time.perf_counter()
+        with timed(DOWNLOAD_SECONDS, source="scraping_api"):
+          resp = requests.post(
+            settings.SCRAPING_API_URL + "/download",
+            json={"url": link},
+            headers=download_headers,
+            timeout=30
+          )
+          resp.raise_for_status()
+          result = resp.json()
+          file_base64 = result.get("base64_encoded")
+          if not file_base64:
+            raise ValueError("Nenhum arquivo retornado pela API de download")
+        # tamanho do arquivo decodificado, sem decodificar o base64
+        observe_download("scraping_api", len(file_base64) * 3 // 4 - file_base64.count("=", -2), time.perf_counter() - started)
         logger.debug("Conteúdo recebido em base64, tamanho: %d", len(file_base64))
 
         # Upload file
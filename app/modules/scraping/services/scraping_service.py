@@ -3,6 +3,7 @@ from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
 from app.core.logging import logging
 from app.config.settings import settings
+from app.core.metrics import SCRAPE_FETCH_SECONDS, SCRAPE_LINKS, SCRAPE_VERIFY_SECONDS, timed
 
 logger = logging.getLogger(__name__)
 
@@ -47,7 +48,8 @@ class ScrapingService:
     def _has_file_content_type(self, link: str) -> bool:
         """Faz HEAD e checa Content-Type antes de aceitar o link."""
         try:
-            head = requests.head(link, allow_redirects=True, timeout=10)
+            with timed(SCRAPE_VERIFY_SECONDS):
+                head = requests.head(link, allow_redirects=True, timeout=10)
             return self.is_content_type_file(head.headers.get("Content-Type", ""))
         except Exception:
             return False
@@ -61,18 +63,24 @@ class ScrapingService:
         Retorna: lista de URLs de arquivos
         """
         logger.info("Iniciando scraping: %s", url)
-        resp = requests.get(url, headers={"User-Agent": "ScrapingService/1.0"}, timeout=60)
-        resp.raise_for_status()
+        with timed(SCRAPE_FETCH_SECONDS):
+            resp = requests.get(url, headers={"User-Agent": "ScrapingService/1.0"}, timeout=60)
+            resp.raise_for_status()
 
         raw_links = self.extract_links(resp.text, url)
         files = []
         for link in raw_links:
             if not self.is_possible_download_link(link):
+                SCRAPE_LINKS.labels("ignored").inc()
                 continue
             if verify_head:
                 if self._has_file_content_type(link):
+                    SCRAPE_LINKS.labels("file").inc()
                     files.append(link)
+                else:
+                    SCRAPE_LINKS.labels("rejected").inc()
             else:
+                SCRAPE_LINKS.labels("file").inc()
                 files.append(link)
 
         # remove duplicatas e retorna
@@ -0,0 +1,162 @@
+"""
+Worker dos jobs enfileirados pela API (ingestão e download de arquivos).
+
+A API só enfileira (POST /milvus/insert, POST /download_files) e informa o status;
+download, OCR, pandas, embeddings e inserções rodam aqui, em processos separados
+do /chat/ask. Os workers disputam a mesma fila (o JobStore em SQLite), então
+escalam independentemente da API:
+
+    python -m app.worker --processes 4
+    python -m app.worker --kinds download
+    python -m app.worker --metrics-port 9100
+
+Com --metrics-port, as métricas Prometheus das etapas (download, extração de texto,
+embeddings, inserts no Milvus) ficam em http://host:porta/metrics. Com mais de um
+processo, defina PROMETHEUS_MULTIPROC_DIR para o processo principal somar as de todos.
+
+Com SIGTERM/SIGINT o job em andamento é devolvido à fila e continua dos checkpoints
+no próximo worker. Se o processo morrer sem devolver, o job volta a ser reivindicável
+quando o lease vencer (INGEST_WORKER_LEASE_SECONDS).
+"""
+import os
+import signal
+import socket
+import asyncio
+import argparse
+import multiprocessing
+from typing import Any, Dict, List, Optional
+from app.core.logging import configure_logging, logging
+from app.config.settings import settings
+from app.core.metrics import serve_metrics
+from app.core.milvus_connection import milvus_manager
+from app.modules.milvus.utils.jobs import JobKind, job_store
+from app.modules.milvus.services.ingestion_service import IngestionService
+from app.modules.scraping.services.download_files_service import DownloadFilesService
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    """Consome a fila de jobs, um job por vez, renovando o lease enquanto executa."""
+
+    def __init__(self, worker_id: str, kinds: List[str]):
+        self.worker_id = worker_id
+        self.kinds = kinds
+        self.ingestion = IngestionService()
+        self.downloads = DownloadFilesService()
+
+    async def run(self) -> None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+
+        # só a ingestão usa o Milvus
+        needs_milvus = JobKind.INGESTION.value in self.kinds
+        if needs_milvus:
+            await milvus_manager.start()
+        logger.info(f"Worker {self.worker_id} aguardando jobs ({', '.join(self.kinds)})")
+        try:
+            while not stop.is_set():
+                claimed = await asyncio.to_thread(job_store.claim, self.worker_id, self.kinds)
+                if claimed is None:
+                    try:
+                        await asyncio.wait_for(stop.wait(), timeout=settings.INGEST_WORKER_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._execute(claimed, stop)
+        finally:
+            if needs_milvus:
+                await milvus_manager.close()
+            logger.info(f"Worker {self.worker_id} encerrado")
+
+    async def _execute(self, claimed: Dict[str, Any], stop: asyncio.Event) -> None:
+        job_id = claimed["id"]
+        logger.info(f"Worker {self.worker_id} executando o job {job_id} ({claimed['kind']})")
+        with job_store.lease(job_id, self.worker_id):
+            task = asyncio.create_task(self._handle(claimed))
+            stopping = asyncio.create_task(stop.wait())
+            await asyncio.wait({task, stopping}, return_when=asyncio.FIRST_COMPLETED)
+            stopping.cancel()
+
+            if not task.done():
+                # encerramento: interrompe o job e o devolve à fila (os checkpoints ficam)
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+                await asyncio.to_thread(job_store.release, job_id, self.worker_id)
+                logger.info(f"Job {job_id} devolvido à fila")
+                return
+
+        if not task.cancelled() and task.exception() is not None:
+            # o erro já foi registrado no job pelo serviço
+            logger.debug(f"Job {job_id} terminou com erro: {task.exception()}")
+
+    async def _handle(self, claimed: Dict[str, Any]) -> None:
+        if claimed["kind"] == JobKind.INGESTION.value:
+            await self.ingestion.run_job(milvus_manager.client, claimed["id"], claimed["attempts"])
+        elif claimed["kind"] == JobKind.DOWNLOAD.value:
+            await self.downloads.run_job(claimed["id"])
+
+
+def run_worker(kinds: List[str], metrics_port: Optional[int] = None) -> None:
+    """Ponto de entrada de cada processo de worker."""
+    configure_logging()
+    if metrics_port:
+        serve_metrics(metrics_port)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    asyncio.run(Worker(worker_id, kinds).run())
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Executa os jobs de ingestão e download enfileirados pela API.")
+    parser.add_argument("--processes", type=int, default=1, help="Processos de worker (padrão: 1)")
+    parser.add_argument(
+        "--kinds",
+        nargs="+",
+        choices=[kind.value for kind in JobKind],
+        default=[kind.value for kind in JobKind],
+        help="Tipos de job consumidos (padrão: todos)",
+    )
+    parser.add_argument("--metrics-port", type=int, default=None, help="Porta das métricas Prometheus (padrão: desligado)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.processes <= 1:
+        run_worker(args.kinds, args.metrics_port)
+        return
+
+    if args.metrics_port:
+        # o processo principal expõe a soma dos workers (arquivos em PROMETHEUS_MULTIPROC_DIR)
+        configure_logging()
+        if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            logger.warning("PROMETHEUS_MULTIPROC_DIR não definido: /metrics não inclui os processos de worker")
+        serve_metrics(args.metrics_port)
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_worker, args=(args.kinds,), name=f"worker-{index}")
+        for index in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+
+    def forward(signum, frame):
+        # cada worker devolve o job em andamento à fila antes de sair
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()